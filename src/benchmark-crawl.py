@@ -0,0 +1,154 @@
+"""End-to-end benchmark of the crawl against a local synthetic marketplace.
+
+Reports car advertisments per minute, memory growth and the share of cars in the
+saved data set whose values match the marketplace.
+"""
+import resource
+import tempfile
+import time
+import tracemalloc
+from os.path import join
+
+import pandas as pd
+from selenium import webdriver
+
+from utils_car_characteristic_extraction import initialize_or_import_dataset
+from utils_crawl import crawl_search_query, initialize_crawl
+from utils_synthetic_marketplace import (
+    create_marketplace,
+    get_expected_car,
+    start_marketplace_server,
+)
+
+number_of_listings = 100000
+number_of_result_webpages = 20
+result_webpages_per_step = 5
+latency_s = 0.05
+new_listings_per_hour = 2000
+reuploads_per_hour = 500
+price_changes_per_hour = 500
+sales_per_hour = 1000
+missing_field_rate = 0.05
+headless = True
+
+compared_columns = ["manufacturer", "model", "price_sek", "entry_year", "mileage_km"]
+
+
+def get_memory_usage():
+    """Get memory usage of the crawler process.
+
+    Returns
+    -------
+    rss_mb : float
+        peak resident set size in MB
+    python_mb : float
+        memory currently allocated by Python objects in MB
+    """
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    python_mb = tracemalloc.get_traced_memory()[0] / 1024**2
+
+    return rss_mb, python_mb
+
+
+def values_match(value, expected_value):
+    """Check whether a value of the data set matches the value of the marketplace.
+
+    Parameters
+    ----------
+    value : object
+        value of data set
+    expected_value : object
+        value of marketplace
+
+    Returns
+    -------
+     : bool
+        True if both are missing or equal
+    """
+    if pd.isna(value) or pd.isna(expected_value):
+        return pd.isna(value) and pd.isna(expected_value)
+
+    return str(value) == str(expected_value)
+
+
+print(f"generating marketplace with {number_of_listings} listings.")
+marketplace = create_marketplace(
+    number_of_listings,
+    new_listings_per_hour,
+    reuploads_per_hour,
+    price_changes_per_hour,
+    sales_per_hour,
+    missing_field_rate,
+    latency_s,
+)
+server, urlpage = start_marketplace_server(marketplace)
+
+options = webdriver.FirefoxOptions()
+if headless:
+    options.add_argument("-headless")
+driver_search_result_overview = webdriver.Firefox(options=options)
+driver_detailed_car_result = webdriver.Firefox(options=options)
+
+tracemalloc.start()
+crawl = initialize_crawl(join(tempfile.mkdtemp(), "used_car_dataset.csv"))
+memory_at_start = get_memory_usage()
+
+statistics = {"pages": 0, "new": 0, "updated": 0, "known": 0, "failed": 0}
+start = time.perf_counter()
+for first_result_webpage in range(
+    1, number_of_result_webpages + 1, result_webpages_per_step
+):
+    step_statistics = crawl_search_query(
+        crawl,
+        driver_search_result_overview,
+        driver_detailed_car_result,
+        urlpage,
+        maximum_number_of_pages=result_webpages_per_step,
+        first_result_webpage=first_result_webpage,
+    )
+    for outcome in statistics:
+        statistics[outcome] = statistics[outcome] + step_statistics[outcome]
+
+    minutes = (time.perf_counter() - start) / 60
+    number_of_car_advertisements = sum(statistics.values()) - statistics["pages"]
+    rss_mb, python_mb = get_memory_usage()
+    print(
+        f"{statistics['pages']} result webpages,",
+        f"{number_of_car_advertisements / minutes:.0f} car advertisments per minute,",
+        f"peak RSS {rss_mb:.0f} MB, Python objects {python_mb:.1f} MB.",
+    )
+duration_min = (time.perf_counter() - start) / 60
+
+driver_search_result_overview.quit()
+driver_detailed_car_result.quit()
+server.shutdown()
+
+# the saved data set is compared, so values which do not survive saving and
+# importing it count as mismatches
+used_car_data = initialize_or_import_dataset(crawl["path_to_dataset"])
+matching_values = {column: 0 for column in compared_columns}
+number_of_compared_cars = 0
+with marketplace["lock"]:
+    for car in used_car_data.to_dict(orient="records"):
+        listing = marketplace["listings"][int(car["url"].rsplit("/", 1)[-1])]
+        expected_car = get_expected_car(listing)
+        number_of_compared_cars = number_of_compared_cars + 1
+        for column in compared_columns:
+            if values_match(car[column], expected_car[column]):
+                matching_values[column] = matching_values[column] + 1
+
+rss_mb, python_mb = get_memory_usage()
+number_of_car_advertisements = sum(statistics.values()) - statistics["pages"]
+print(f"statistics: {statistics}")
+print(
+    f"{number_of_car_advertisements / duration_min:.0f} car advertisments per minute."
+)
+print(
+    f"memory growth: peak RSS {rss_mb - memory_at_start[0]:.0f} MB,",
+    f"Python objects {python_mb - memory_at_start[1]:.1f} MB,",
+    f"{(python_mb - memory_at_start[1]) * 1024 / max(len(used_car_data), 1):.1f} kB",
+    "per car.",
+)
+print(f"compared {number_of_compared_cars} cars with the marketplace:")
+for column, number in matching_values.items():
+    print(f"    {column}: {number / max(number_of_compared_cars, 1):.1%} match")
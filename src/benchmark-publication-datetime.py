@@ -0,0 +1,64 @@
+"""Micro-benchmark of parsing publication timestamps."""
+import random
+import timeit
+from datetime import datetime
+
+import pandas as pd
+
+from utils_publication_datetime import (
+    MONTHS,
+    RELATIVE_DAYS,
+    WEEKDAYS,
+    extract_publication_datetime,
+    extract_publication_datetimes,
+    parse_publication_datetime,
+)
+
+number_of_timestamps = 100000
+reference_time = datetime(2023, 6, 15, 12, 0)
+
+random.seed(0)
+day_words = list(RELATIVE_DAYS) + list(WEEKDAYS)
+months = list(MONTHS)
+date_times = pd.Series(
+    [
+        f"{random.choice(day_words).capitalize()} {random.randrange(24):02d}:"
+        f"{random.randrange(60):02d}"
+        if random.random() < 0.5
+        else f"Publicerad {random.randrange(1, 29)} {random.choice(months)}. "
+        f"{random.randrange(24):02d}:{random.randrange(60):02d}"
+        for _ in range(number_of_timestamps)
+    ]
+)
+print(f"{date_times.nunique()} distinct of {number_of_timestamps} timestamps.")
+
+
+def parse_without_cache():
+    """Parse every timestamp with an empty cache."""
+    for date_time in date_times:
+        parse_publication_datetime.cache_clear()
+        extract_publication_datetime(date_time, reference_time)
+
+
+def parse_with_cache():
+    """Parse every timestamp one by one, e.g. during a crawl."""
+    for date_time in date_times:
+        extract_publication_datetime(date_time, reference_time)
+
+
+def parse_column():
+    """Parse the timestamps as a whole column."""
+    parse_publication_datetime.cache_clear()
+    extract_publication_datetimes(date_times, reference_time)
+
+
+for name, benchmark in [
+    ("without cache", parse_without_cache),
+    ("with cache", parse_with_cache),
+    ("column", parse_column),
+]:
+    duration = min(timeit.repeat(benchmark, number=1, repeat=3))
+    print(
+        f"{name}: {duration / number_of_timestamps * 1e6:.2f} µs per timestamp,",
+        f"{number_of_timestamps / duration:.0f} timestamps per s.",
+    )
@@ -0,0 +1,806 @@
+"""Command line interface to crawl and maintain the used car data set.
+
+Each subcommand imports the modules it needs when it runs, so commands which do not
+open a browser, like stats or compact, do not pay for importing selenium or pandas.
+"""
+import argparse
+from os.path import exists
+
+DEFAULT_PATH_TO_DATASET = "data/used_car_dataset.csv"
+
+
+def crawl(args):
+    """Crawl the website and attach new and updated cars to the data set.
+
+    With a daemon interval, the data set and the browsers are kept open and the
+    website is crawled again on every interval.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments of crawl subcommand
+    """
+    from utils_crawl import initialize_crawl
+    from utils_tracing import save_trace, start_tracing, stop_tracing
+
+    # a replay writes the data set and its sidecar files, so it must not touch the
+    # production data set
+    if args.replay is not None and args.dataset == DEFAULT_PATH_TO_DATASET:
+        raise SystemExit("A replay needs a scratch data set given with --dataset.")
+
+    if args.trace is not None:
+        start_tracing()
+
+    crawl = initialize_crawl(args.dataset, args.overwrite, args.alert_sink)
+
+    driver_search_result_overview, driver_detailed_car_result = open_drivers(args)
+
+    def run_crawl(crawl):
+        # relative publication times of a replay are resolved against the time of
+        # the recorded run, not the time of the replay
+        if args.record is not None:
+            from utils_driver_recording import record_reference_time
+
+            record_reference_time(
+                driver_search_result_overview.recording, crawl["reference_time"]
+            )
+        if args.replay is not None:
+            from utils_driver_recording import replay_reference_time
+
+            # replayed cars are not news, so no alerts are emitted for them
+            crawl["alert_rule_index"] = {}
+
+            crawl["reference_time"] = (
+                replay_reference_time(
+                    driver_search_result_overview.recording,
+                    driver_search_result_overview.replay_counters,
+                )
+                or crawl["reference_time"]
+            )
+
+        crawl_once(
+            args, crawl, driver_search_result_overview, driver_detailed_car_result
+        )
+
+    if args.daemon_interval_minutes is None:
+        run_crawl(crawl)
+    else:
+        from utils_crawl_daemon import run_crawl_daemon
+
+        run_crawl_daemon(crawl, run_crawl, args.daemon_interval_minutes)
+
+    print("closing firefox.")
+    driver_search_result_overview.quit()
+    driver_detailed_car_result.quit()
+
+    if args.record is not None:
+        from utils_driver_recording import save_recording
+
+        save_recording(driver_search_result_overview.recording, args.record)
+        print(f"Saved recording to: {args.record}")
+
+    if args.trace is not None:
+        save_trace(stop_tracing(), args.trace)
+        print(f"Saved trace to: {args.trace}")
+
+
+def crawl_once(args, crawl, driver_search_result_overview, driver_detailed_car_result):
+    """Run one crawl with open webdrivers and refresh what is derived from the data.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments of crawl subcommand
+    crawl : dict
+        state of crawl
+    driver_search_result_overview : selenium.Webdriver
+        webdriver for the result webpages
+    driver_detailed_car_result : selenium.Webdriver
+        webdriver for the webpages with car details
+    """
+    from utils_crawl import (
+        collect_frontier_results,
+        crawl_search_query,
+        discover_car_advertisements,
+        finish_crawl,
+        full_sweep_is_due,
+        record_full_sweep,
+        retry_failed_car_advertisements,
+        run_frontier_worker,
+    )
+    from utils_crawl_scheduler import (
+        initialize_or_import_schedule,
+        load_search_queries,
+        run_scheduled_crawl,
+        save_schedule,
+    )
+    from utils_url_frontier import connect_to_frontier
+
+    page_budget = args.page_budget
+    number_of_known_pages_to_stop = args.known_pages_to_stop
+
+    full_sweep = (
+        args.frontier_role is None
+        and not args.retry_failed_extractions
+        and args.sample_budget_minutes is None
+        and full_sweep_is_due(args.last_full_sweep, args.days_between_full_sweeps)
+    )
+    if full_sweep:
+        print("crawling all result webpages.")
+        page_budget = None
+        number_of_known_pages_to_stop = None
+
+    if args.frontier_role is not None:
+        frontier = connect_to_frontier(args.frontier)
+        if args.frontier_role == "discover":
+            discover_car_advertisements(
+                frontier, driver_search_result_overview, args.url
+            )
+        elif args.frontier_role == "work":
+            run_frontier_worker(crawl, frontier, driver_detailed_car_result)
+        elif args.frontier_role == "collect":
+            collect_frontier_results(crawl, frontier)
+    elif args.retry_failed_extractions:
+        retry_failed_car_advertisements(crawl, driver_detailed_car_result)
+    elif args.sample_budget_minutes is not None:
+        from utils_market_sampling import run_sampling_crawl
+
+        if exists(args.search_queries):
+            search_queries = load_search_queries(args.search_queries)
+        else:
+            search_queries = [{"name": "all", "url": args.url}]
+
+        run_sampling_crawl(
+            crawl,
+            driver_search_result_overview,
+            driver_detailed_car_result,
+            search_queries,
+            args.sample_budget_minutes * 60,
+            args.sample_ads_per_page,
+            args.sample_seed,
+        )
+    elif exists(args.search_queries):
+        search_queries = load_search_queries(args.search_queries)
+        schedule = initialize_or_import_schedule(args.schedule)
+
+        schedule = run_scheduled_crawl(
+            crawl,
+            driver_search_result_overview,
+            driver_detailed_car_result,
+            search_queries,
+            schedule,
+            page_budget,
+            number_of_known_pages_to_stop,
+        )
+        save_schedule(schedule, args.schedule)
+    else:
+        crawl_search_query(
+            crawl,
+            driver_search_result_overview,
+            driver_detailed_car_result,
+            args.url,
+            number_of_known_pages_to_stop=number_of_known_pages_to_stop,
+        )
+
+    if full_sweep:
+        record_full_sweep(args.last_full_sweep)
+
+    # discovering and working hosts only hold part of the crawled cars, the derived
+    # files are refreshed once by the host which collects the results
+    if args.frontier_role in [None, "collect"]:
+        finish_crawl(crawl)
+
+
+def open_drivers(args):
+    """Open the webdrivers of the result webpages and of the car details.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments of crawl subcommand
+
+    Returns
+    -------
+    driver_search_result_overview : selenium.Webdriver
+        webdriver for the result webpages
+    driver_detailed_car_result : selenium.Webdriver
+        webdriver for the webpages with car details
+    """
+    if args.replay is not None:
+        from utils_driver_recording import (
+            ReplayDriver,
+            create_replay_counters,
+            import_recording,
+        )
+
+        print(f"replaying recording: {args.replay}")
+        recording = import_recording(args.replay)
+        replay_counters = create_replay_counters()
+
+        return (
+            ReplayDriver(recording, replay_counters),
+            ReplayDriver(recording, replay_counters),
+        )
+
+    from functools import partial
+
+    from selenium import webdriver
+
+    from utils_page_watchdog import WatchdogDriver, create_firefox_options
+
+    open_firefox = partial(
+        webdriver.Firefox, options=create_firefox_options(args.page_load_strategy)
+    )
+    open_bounded_firefox = partial(
+        WatchdogDriver,
+        open_firefox,
+        args.page_time_budget_s,
+        args.restart_stuck_browsers,
+    )
+
+    print("opening firefox.")
+    if args.daemon_interval_minutes is None:
+        driver_search_result_overview = open_bounded_firefox()
+        driver_detailed_car_result = open_bounded_firefox()
+    else:
+        from utils_crawl_daemon import PooledDriver
+
+        driver_search_result_overview, driver_detailed_car_result = [
+            PooledDriver(
+                open_bounded_firefox,
+                args.recycle_after_pages,
+                args.recycle_above_memory_mb,
+            )
+            for _ in range(2)
+        ]
+
+    if args.record is not None:
+        from utils_driver_recording import RecordingDriver, create_empty_recording
+
+        recording = create_empty_recording()
+        driver_search_result_overview = RecordingDriver(
+            driver_search_result_overview, recording
+        )
+        driver_detailed_car_result = RecordingDriver(
+            driver_detailed_car_result, recording
+        )
+
+    return driver_search_result_overview, driver_detailed_car_result
+
+
+def refresh(args):
+    """Check whether known car advertisments with a stale check have been removed.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments of refresh subcommand
+    """
+    from utils_refresh import refresh_stale_car_advertisements
+
+    refresh_stale_car_advertisements(
+        args.dataset,
+        args.staleness_hours,
+        args.maximum_number_of_urls,
+        args.parallel_requests,
+    )
+
+
+def export(args):
+    """Export the feature store, market aggregates or depreciation curves.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments of export subcommand
+    """
+    if args.target == "feature-store":
+        from utils_feature_store import (
+            export_feature_store_in_chunks,
+            get_path_to_feature_store,
+        )
+
+        path_to_store = args.output or get_path_to_feature_store(args.dataset)
+        export_feature_store_in_chunks(args.dataset, path_to_store, args.chunksize)
+        print(f"Exported feature store to: {path_to_store}")
+    elif args.target == "aggregates":
+        from utils_market_aggregates import (
+            add_car_to_aggregates,
+            aggregates_to_dataframe,
+            create_empty_aggregates,
+            get_path_to_aggregates,
+            initialize_or_import_aggregates,
+        )
+
+        path_to_aggregates = get_path_to_aggregates(args.dataset)
+        if exists(path_to_aggregates):
+            aggregates = initialize_or_import_aggregates(path_to_aggregates, None)
+        else:
+            from utils_dataset_streaming import iter_dataset_chunks
+
+            print(f"Building aggregates from dataset: {args.dataset}")
+            aggregates = create_empty_aggregates()
+            for chunk in iter_dataset_chunks(args.dataset, args.chunksize):
+                for car in chunk.to_dict(orient="records"):
+                    add_car_to_aggregates(aggregates, car)
+        summary = aggregates_to_dataframe(aggregates, args.grouping)
+        path_to_summary = args.output or f"{args.grouping}_aggregates.csv"
+        summary.to_csv(path_to_summary, index=False)
+        print(f"Exported {len(summary)} market segments to: {path_to_summary}")
+    elif args.target == "depreciation":
+        from utils_depreciation import refresh_depreciation_curves
+
+        depreciation_curves = refresh_depreciation_curves(args.dataset, args.processes)
+        if args.output is not None:
+            depreciation_curves.to_csv(args.output)
+            print(f"Exported depreciation curves to: {args.output}")
+
+
+def comparables(args):
+    """Print the cars of the data set which are most similar to a car.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments of comparables subcommand
+    """
+    import pandas as pd
+
+    from utils_comparable_cars import (
+        COMPARABLE_CATEGORIES,
+        COMPARABLE_NUMERIC_FEATURES,
+        find_comparable_cars,
+        update_comparable_car_index_after_crawl,
+    )
+    from utils_dataset_streaming import iter_dataset_chunks
+
+    columns = [
+        "url",
+        "manufacturer",
+        "model",
+        "price_sek",
+        *COMPARABLE_NUMERIC_FEATURES,
+        *COMPARABLE_CATEGORIES,
+    ]
+    used_car_data = pd.concat(
+        iter_dataset_chunks(args.dataset, columns=columns), ignore_index=True
+    )
+    index = update_comparable_car_index_after_crawl(args.dataset, used_car_data)
+
+    car = {
+        "manufacturer": args.manufacturer,
+        "model": args.model,
+        "entry_year": args.entry_year,
+        "mileage_km": args.mileage_km,
+        "horse_power": args.horse_power,
+        "fuel": args.fuel,
+        "transmission": args.transmission,
+        "car_type": args.car_type,
+    }
+    if args.url is not None:
+        cars_of_url = used_car_data[used_car_data["url"].eq(args.url)]
+        if not len(cars_of_url):
+            print(f"No car with url: {args.url}")
+            return
+        car = {
+            key: cars_of_url.iloc[-1][key] if value is None else value
+            for key, value in car.items()
+        }
+
+    comparable_cars = find_comparable_cars(index, used_car_data, car, args.k)
+    print(
+        comparable_cars[
+            ["url", "price_sek", "entry_year", "mileage_km", "distance"]
+        ].to_string(index=False)
+    )
+
+
+def canonicalize(args):
+    """Map manufacturer and model of all cars of the data set to canonical names.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments of canonicalize subcommand
+    """
+    from utils_car_names import recanonicalize_dataset
+
+    recanonicalize_dataset(args.dataset)
+
+
+def alerts(args):
+    """Add, remove or list the alert rules of the data set.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments of alerts subcommand
+    """
+    from utils_alerts import (
+        create_alert_rule,
+        get_path_to_alert_rules,
+        initialize_or_import_alert_rules,
+        save_alert_rules,
+    )
+
+    path_to_alert_rules = get_path_to_alert_rules(args.dataset)
+    alert_rules = initialize_or_import_alert_rules(path_to_alert_rules)
+
+    if args.action != "list" and args.name is None:
+        print(f"The name of the rule to {args.action} is missing.")
+        return
+
+    if args.action == "add":
+        alert_rules = [rule for rule in alert_rules if rule["name"] != args.name]
+        alert_rules.append(
+            create_alert_rule(
+                args.name,
+                args.event,
+                args.manufacturer,
+                args.model,
+                minimum_entry_year=args.minimum_entry_year,
+                maximum_entry_year=args.maximum_entry_year,
+                maximum_price_sek=args.maximum_price_sek,
+                maximum_mileage_km=args.maximum_mileage_km,
+                fuel=args.fuel,
+                minimum_price_drop=args.minimum_price_drop,
+            )
+        )
+        save_alert_rules(alert_rules, path_to_alert_rules)
+        print(f"Added alert rule {args.name}.")
+    elif args.action == "remove":
+        alert_rules = [rule for rule in alert_rules if rule["name"] != args.name]
+        save_alert_rules(alert_rules, path_to_alert_rules)
+        print(f"Removed alert rule {args.name}.")
+    else:
+        for rule in alert_rules:
+            print(
+                f"{rule['name']}: {rule['event']} of",
+                f"{rule['manufacturer'] or 'any manufacturer'}",
+                f"{rule['model'] or 'any model'} {rule['conditions']}",
+            )
+
+
+def serve(args):
+    """Serve read queries over the data set as HTTP/JSON until interrupted.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments of serve subcommand
+    """
+    from utils_query_service import create_query_server
+
+    server = create_query_server(args.dataset, args.host, args.port)
+    print(f"Answering queries at: http://{args.host}:{server.server_address[1]}/cars")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("stopping query service.")
+    finally:
+        server.server_close()
+
+
+def stats(args):
+    """Print statistics of the data set, the dead-letter queue and the frontier.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments of stats subcommand
+    """
+    from utils_dead_letter_queue import (
+        get_path_to_dead_letter_queue,
+        initialize_or_import_dead_letter_queue,
+        summarize_failure_types,
+    )
+    from utils_market_aggregates import (
+        calculate_mean,
+        estimate_quantile,
+        get_path_to_aggregates,
+        initialize_or_import_aggregates,
+    )
+
+    path_to_aggregates = get_path_to_aggregates(args.dataset)
+    if exists(path_to_aggregates):
+        aggregates = initialize_or_import_aggregates(path_to_aggregates, None)
+        groups = sorted(
+            aggregates["groupings"]["manufacturer"]["groups"].values(),
+            key=lambda group: group["count"],
+            reverse=True,
+        )
+        print(f"{sum(group['count'] for group in groups)} cars in data set.")
+        for group in groups[: args.top]:
+            # a manufacturer without any priced car has neither mean nor median
+            mean_price = calculate_mean(group, "price_sek")
+            median_price = estimate_quantile(
+                group["sketches"].get("price_sek", {}), 0.5
+            )
+            print(
+                f"{group['values'][0]}: {group['count']} cars,",
+                "mean price",
+                "n/a," if mean_price is None else f"{mean_price:.0f} SEK,",
+                "median price",
+                "n/a." if median_price is None else f"{median_price:.0f} SEK.",
+            )
+    else:
+        print(f"No market aggregates at: {path_to_aggregates}")
+
+    dead_letter_queue = initialize_or_import_dead_letter_queue(
+        get_path_to_dead_letter_queue(args.dataset)
+    )
+    print(f"{len(dead_letter_queue)} car advertisment(s) in dead-letter queue.")
+    for exception_type, number in summarize_failure_types(dead_letter_queue):
+        print(f"{exception_type}: {number}")
+
+    if exists(args.frontier):
+        from utils_url_frontier import connect_to_frontier, get_frontier_statistics
+
+        print(
+            f"frontier: {get_frontier_statistics(connect_to_frontier(args.frontier))}"
+        )
+
+
+def compact(args):
+    """Remove collected results from the frontier and shrink its file.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments of compact subcommand
+    """
+    from utils_url_frontier import compact_frontier, connect_to_frontier
+
+    if not exists(args.frontier):
+        print(f"No frontier at: {args.frontier}")
+        return
+
+    number_of_removed_urls = compact_frontier(connect_to_frontier(args.frontier))
+    print(f"Removed {number_of_removed_urls} collected link(s) from frontier.")
+
+
+def create_argument_parser():
+    """Create the parser of the command line arguments.
+
+    Returns
+    -------
+    parser : argparse.ArgumentParser
+        parser with a subparser per subcommand
+    """
+    parser = argparse.ArgumentParser(
+        prog="used-car-data", description="Crawl and maintain the used car data set."
+    )
+    parser.add_argument(
+        "--dataset", default=DEFAULT_PATH_TO_DATASET, help="path to data set"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    crawl_parser = subparsers.add_parser("crawl", help="crawl the website")
+    crawl_parser.add_argument(
+        "--url", default="url_of_website", help="url of first result webpage"
+    )
+    crawl_parser.add_argument(
+        "--no-overwrite",
+        dest="overwrite",
+        action="store_false",
+        help="create a new data set instead of updating the existing one",
+    )
+    crawl_parser.add_argument(
+        "--search-queries",
+        default="data/search_queries.json",
+        help="search queries which are crawled instead of url, if the file exists",
+    )
+    crawl_parser.add_argument("--schedule", default="data/crawl_schedule.json")
+    crawl_parser.add_argument(
+        "--page-budget",
+        type=int,
+        default=50,
+        help="result webpages of a scheduled crawl",
+    )
+    crawl_parser.add_argument(
+        "--frontier-role",
+        choices=["discover", "work", "collect"],
+        help="role of this process in a crawl split between several processes",
+    )
+    crawl_parser.add_argument(
+        "--retry-failed-extractions",
+        action="store_true",
+        help="only process the car advertisments of the dead-letter queue",
+    )
+    crawl_parser.add_argument(
+        "--sample-budget-minutes",
+        type=float,
+        help="estimate median prices per search query from a stratified random "
+        "sample of car advertisments within this browser time instead of crawling all",
+    )
+    crawl_parser.add_argument(
+        "--sample-ads-per-page",
+        type=int,
+        default=4,
+        help="car advertisments sampled from each opened result webpage",
+    )
+    crawl_parser.add_argument("--sample-seed", type=int, help="seed of the sample")
+    crawl_parser.add_argument(
+        "--known-pages-to-stop",
+        type=int,
+        default=3,
+        help="consecutive result webpages with only known cars to stop paging",
+    )
+    crawl_parser.add_argument("--days-between-full-sweeps", type=float, default=7)
+    crawl_parser.add_argument("--last-full-sweep", default="data/last_full_sweep.txt")
+    crawl_parser.add_argument(
+        "--trace",
+        help="record spans of the crawl and save them as Chrome trace to this path",
+    )
+    crawl_parser.add_argument(
+        "--daemon-interval-minutes",
+        type=float,
+        help="keep data set and browsers open and crawl again on this interval",
+    )
+    crawl_parser.add_argument(
+        "--recycle-after-pages",
+        type=int,
+        default=500,
+        help="number of pages after which a browser of the daemon is reopened",
+    )
+    crawl_parser.add_argument(
+        "--recycle-above-memory-mb",
+        type=float,
+        default=2000,
+        help="memory above which a browser of the daemon is reopened, needs psutil",
+    )
+    crawl_parser.add_argument(
+        "--page-load-strategy",
+        choices=["normal", "eager", "none"],
+        default="eager",
+        help="how long loading a page waits: for all resources, until the document "
+        "is parsed or not at all",
+    )
+    crawl_parser.add_argument(
+        "--page-time-budget-s",
+        type=float,
+        default=20,
+        help="seconds after which a page load is stopped and its url is retried later",
+    )
+    crawl_parser.add_argument(
+        "--no-restart-stuck-browsers",
+        dest="restart_stuck_browsers",
+        action="store_false",
+        help="stop the crawl instead of reopening a browser stuck beyond its budget",
+    )
+    crawl_parser.add_argument(
+        "--alert-sink",
+        help="url of webhook or path to JSON Lines file alerts are emitted to, the "
+        "alerts file next to the data set if omitted",
+    )
+    recording_group = crawl_parser.add_mutually_exclusive_group()
+    recording_group.add_argument(
+        "--record", help="record the interactions with the website to this path"
+    )
+    recording_group.add_argument(
+        "--replay",
+        help="replay a recording from this path instead of the website, into a "
+        "scratch data set given with --dataset and without alerts",
+    )
+    crawl_parser.set_defaults(function=crawl)
+
+    refresh_parser = subparsers.add_parser(
+        "refresh", help="record removed car advertisments"
+    )
+    refresh_parser.add_argument(
+        "--staleness-hours",
+        type=float,
+        default=24,
+        help="hours after which the last check of a car advertisment is stale",
+    )
+    refresh_parser.add_argument(
+        "--maximum-number-of-urls",
+        type=int,
+        help="maximum number of checked car advertisments, all stale ones if omitted",
+    )
+    refresh_parser.add_argument("--parallel-requests", type=int, default=8)
+    refresh_parser.set_defaults(function=refresh)
+
+    export_parser = subparsers.add_parser(
+        "export", help="export feature store, market aggregates or depreciation curves"
+    )
+    export_parser.add_argument(
+        "target", choices=["feature-store", "aggregates", "depreciation"]
+    )
+    export_parser.add_argument("--output", help="path of export")
+    export_parser.add_argument(
+        "--grouping",
+        default="manufacturer_model",
+        help="market segment grouping of exported aggregates",
+    )
+    export_parser.add_argument("--chunksize", type=int, default=10000)
+    export_parser.add_argument(
+        "--processes",
+        type=int,
+        help="number of processes fitting the depreciation curves, one if omitted",
+    )
+    export_parser.set_defaults(function=export)
+
+    comparables_parser = subparsers.add_parser(
+        "comparables", help="print the most similar cars of the data set"
+    )
+    comparables_parser.add_argument(
+        "--url", help="url of car in data set, whose characteristics are compared"
+    )
+    comparables_parser.add_argument("--manufacturer")
+    comparables_parser.add_argument("--model")
+    comparables_parser.add_argument("--entry-year", type=int)
+    comparables_parser.add_argument("--mileage-km", type=int)
+    comparables_parser.add_argument("--horse-power", type=int)
+    comparables_parser.add_argument("--fuel")
+    comparables_parser.add_argument("--transmission")
+    comparables_parser.add_argument("--car-type")
+    comparables_parser.add_argument(
+        "-k", type=int, default=10, help="number of comparable cars"
+    )
+    comparables_parser.set_defaults(function=comparables)
+
+    canonicalize_parser = subparsers.add_parser(
+        "canonicalize",
+        help="map manufacturer and model of the data set to canonical names",
+    )
+    canonicalize_parser.set_defaults(function=canonicalize)
+
+    alerts_parser = subparsers.add_parser(
+        "alerts", help="add, remove or list alert rules"
+    )
+    alerts_parser.add_argument("action", choices=["add", "remove", "list"])
+    alerts_parser.add_argument("--name", help="name of rule to add or remove")
+    alerts_parser.add_argument(
+        "--event", choices=["new", "price_drop"], default="price_drop"
+    )
+    alerts_parser.add_argument("--manufacturer", help="any manufacturer if omitted")
+    alerts_parser.add_argument("--model", help="any model if omitted")
+    alerts_parser.add_argument("--minimum-entry-year", type=int)
+    alerts_parser.add_argument("--maximum-entry-year", type=int)
+    alerts_parser.add_argument("--maximum-price-sek", type=int)
+    alerts_parser.add_argument("--maximum-mileage-km", type=int)
+    alerts_parser.add_argument("--fuel")
+    alerts_parser.add_argument(
+        "--minimum-price-drop",
+        type=float,
+        help="minimum relative price drop, e.g. 0.1 for 10 %%",
+    )
+    alerts_parser.set_defaults(function=alerts)
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="serve read queries over the data set as HTTP/JSON"
+    )
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.set_defaults(function=serve)
+
+    stats_parser = subparsers.add_parser("stats", help="print statistics")
+    stats_parser.add_argument(
+        "--top", type=int, default=10, help="number of manufacturers shown"
+    )
+    stats_parser.set_defaults(function=stats)
+
+    compact_parser = subparsers.add_parser("compact", help="compact the frontier")
+    compact_parser.set_defaults(function=compact)
+
+    for subparser in [crawl_parser, stats_parser, compact_parser]:
+        subparser.add_argument("--frontier", default="data/url_frontier.sqlite")
+
+    return parser
+
+
+def main(argv=None):
+    """Run the subcommand given on the command line.
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments, the ones of the process if None
+    """
+    args = create_argument_parser().parse_args(argv)
+    args.function(args)
+
+
+if __name__ == "__main__":
+    main()
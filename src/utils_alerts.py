@@ -0,0 +1,361 @@
+"""Utility functions for alerting on new car advertisments and price drops.
+
+Users register alert rules, e.g. "Volvo V70, entry year at least 2018, price dropped
+by at least 10 %". During a crawl, every attached car and every price change is
+checked against the rules and matches are emitted right away to a sink, either a
+JSON Lines file or a webhook.
+
+The rules are indexed by event, manufacturer and model, so an event is only checked
+against the rules of its model and the rules which leave manufacturer or model
+open. The cost per event therefore stays flat when rules for other models are added.
+"""
+import http.client
+import json
+import os
+from datetime import datetime
+from os.path import exists, splitext
+from urllib.request import Request, urlopen
+
+import pandas as pd
+
+ALERT_EVENTS = ("new", "price_drop")
+
+# conditions of alert rules and how they compare with the value of the event
+ALERT_CONDITIONS = {
+    "minimum_entry_year": ("entry_year", lambda value, limit: value >= limit),
+    "maximum_entry_year": ("entry_year", lambda value, limit: value <= limit),
+    "maximum_price_sek": ("price_sek", lambda value, limit: value <= limit),
+    "maximum_mileage_km": ("mileage_km", lambda value, limit: value <= limit),
+    "fuel": ("fuel", lambda value, limit: value == limit),
+    "minimum_price_drop": ("price_drop", lambda value, limit: value >= limit),
+}
+
+# characteristics of a car which are part of an event
+EVENT_COLUMNS = [
+    "url",
+    "manufacturer",
+    "model",
+    "entry_year",
+    "mileage_km",
+    "fuel",
+    "price_sek",
+]
+
+# columns of an event which are compared as numbers, though a newly attached car
+# holds them as scraped, e.g. the entry year as string
+NUMERIC_EVENT_COLUMNS = ["entry_year", "mileage_km", "price_sek"]
+
+WEBHOOK_TIMEOUT_S = 5
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def get_path_to_alert_rules(path_to_dataset):
+    """Derive the path of the alert rules which are kept next to the data set.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+
+    Returns
+    -------
+     : str
+        path to alert rules
+    """
+    return splitext(path_to_dataset)[0] + "_alert_rules.json"
+
+
+def get_path_to_alerts(path_to_dataset):
+    """Derive the path of the emitted alerts which are kept next to the data set.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+
+    Returns
+    -------
+     : str
+        path to JSON Lines file of alerts
+    """
+    return splitext(path_to_dataset)[0] + "_alerts.jsonl"
+
+
+def initialize_or_import_alert_rules(path_to_alert_rules):
+    """Import existing alert rules or create an empty list.
+
+    Parameters
+    ----------
+    path_to_alert_rules : str
+        path to alert rules
+
+    Returns
+    -------
+    alert_rules : list
+        registered alert rules
+    """
+    if exists(path_to_alert_rules):
+        with open(path_to_alert_rules, encoding="utf-8") as file:
+            alert_rules = json.load(file)
+    else:
+        alert_rules = []
+
+    return alert_rules
+
+
+def save_alert_rules(alert_rules, path_to_alert_rules):
+    """Save alert rules to file.
+
+    Parameters
+    ----------
+    alert_rules : list
+        registered alert rules
+    path_to_alert_rules : str
+        path to alert rules
+    """
+    with open(path_to_alert_rules + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(alert_rules, file, indent=2)
+    os.replace(path_to_alert_rules + ".tmp", path_to_alert_rules)
+
+
+def create_alert_rule(name, event, manufacturer=None, model=None, **conditions):
+    """Create an alert rule.
+
+    Parameters
+    ----------
+    name : str
+        name of rule, which is part of its alerts
+    event : str
+        event the rule alerts on, one of `ALERT_EVENTS`
+    manufacturer : str
+        manufacturer of car, any manufacturer if None
+    model : str
+        model of car, any model if None
+    **conditions
+        conditions of `ALERT_CONDITIONS` the car has to fulfill, conditions which are
+        None are left out
+
+    Returns
+    -------
+     : dict
+        alert rule
+
+    Raises
+    ------
+    ValueError
+        if the event or a condition is unknown
+    """
+    if event not in ALERT_EVENTS:
+        raise ValueError(f"Unknown event {event}, expected one of {ALERT_EVENTS}.")
+    unknown_conditions = set(conditions) - set(ALERT_CONDITIONS)
+    if unknown_conditions:
+        raise ValueError(f"Unknown condition(s): {', '.join(unknown_conditions)}")
+
+    return {
+        "name": name,
+        "event": event,
+        "manufacturer": manufacturer,
+        "model": model,
+        "conditions": {
+            condition: limit
+            for condition, limit in conditions.items()
+            if limit is not None
+        },
+    }
+
+
+def build_alert_rule_index(alert_rules):
+    """Index alert rules by event, manufacturer and model.
+
+    Parameters
+    ----------
+    alert_rules : list
+        registered alert rules
+
+    Returns
+    -------
+    alert_rule_index : dict
+        alert rules per event, manufacturer and model, where None stands for any
+        manufacturer or model
+    """
+    alert_rule_index = {}
+    for alert_rule in alert_rules:
+        key = (alert_rule["event"], alert_rule["manufacturer"], alert_rule["model"])
+        alert_rule_index.setdefault(key, []).append(alert_rule)
+
+    return alert_rule_index
+
+
+def get_relevant_alert_rules(alert_rule_index, event):
+    """Get the alert rules which may match an event.
+
+    Parameters
+    ----------
+    alert_rule_index : dict
+        alert rules per event, manufacturer and model
+    event : dict
+        event of a car as created by `create_car_event`
+
+    Returns
+    -------
+     : list
+        alert rules of the event type for the manufacturer and model of the car
+    """
+    event_type, manufacturer, model = (
+        event["event"],
+        event["manufacturer"],
+        event["model"],
+    )
+    keys = {
+        (event_type, manufacturer, model),
+        (event_type, manufacturer, None),
+        (event_type, None, model),
+        (event_type, None, None),
+    }
+
+    return [alert_rule for key in keys for alert_rule in alert_rule_index.get(key, [])]
+
+
+def alert_rule_matches_event(alert_rule, event):
+    """Check whether an event fulfills all conditions of an alert rule.
+
+    Parameters
+    ----------
+    alert_rule : dict
+        alert rule
+    event : dict
+        event of a car as created by `create_car_event`
+
+    Returns
+    -------
+     : boolean
+        event fulfills the conditions, missing values fulfill no condition
+    """
+    for condition, limit in alert_rule["conditions"].items():
+        key, compare = ALERT_CONDITIONS[condition]
+        value = event.get(key)
+        if value is None or not compare(value, limit):
+            return False
+
+    return True
+
+
+def to_json_value(value):
+    """Convert a value of the data set to a value which can be written to JSON.
+
+    Parameters
+    ----------
+    value : object
+        value of data set, e.g. a numpy integer or NaN
+
+    Returns
+    -------
+     : object
+        value as Python type, None if missing
+    """
+    if pd.isna(value):
+        return None
+    if hasattr(value, "item"):
+        return value.item()
+
+    return value
+
+
+def create_car_event(event_type, car, previous_price_sek=None):
+    """Create the event of a new car or of a price change.
+
+    Parameters
+    ----------
+    event_type : str
+        type of event, one of `ALERT_EVENTS`
+    car : dict or pd.Series
+        data of car
+    previous_price_sek : int
+        price before a price change
+
+    Returns
+    -------
+    event : dict
+        type of event and characteristics of car
+    """
+    event = {"event": event_type}
+    for column in EVENT_COLUMNS:
+        value = car.get(column)
+        if column in NUMERIC_EVENT_COLUMNS:
+            value = pd.to_numeric(value, errors="coerce")
+        event[column] = to_json_value(value)
+
+    if previous_price_sek is not None:
+        event["previous_price_sek"] = to_json_value(previous_price_sek)
+        if event["price_sek"] is not None and event["previous_price_sek"]:
+            event["price_drop"] = 1 - event["price_sek"] / event["previous_price_sek"]
+
+    return event
+
+
+def emit_alert(alert, alert_sink):
+    """Emit an alert to a sink.
+
+    A failing webhook does not stop the crawl, the alert is only printed then.
+
+    Parameters
+    ----------
+    alert : dict
+        matched rule and event
+    alert_sink : str
+        url of webhook the alert is posted to as JSON, or path to JSON Lines file
+        the alert is appended to
+    """
+    if alert_sink.startswith(("http://", "https://")):
+        request = Request(
+            alert_sink,
+            data=json.dumps(alert).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urlopen(request, timeout=WEBHOOK_TIMEOUT_S):
+                pass
+        # besides timeouts and URLError, a webhook which closes the connection
+        # raises RemoteDisconnected, an OSError, or another HTTPException
+        except (OSError, http.client.HTTPException) as error:
+            print(f"Could not post alert of {alert['rule']} to webhook: {error}")
+    else:
+        with open(alert_sink, "a", encoding="utf-8") as file:
+            file.write(json.dumps(alert) + "\n")
+
+
+def check_event_against_alert_rules(alert_rule_index, event, alert_sink):
+    """Emit an alert for each alert rule the event matches.
+
+    Parameters
+    ----------
+    alert_rule_index : dict
+        alert rules per event, manufacturer and model
+    event : dict
+        event of a car as created by `create_car_event`
+    alert_sink : str
+        url of webhook or path to JSON Lines file
+
+    Returns
+    -------
+     : int
+        number of emitted alerts
+    """
+    if event["event"] == "price_drop" and not event.get("price_drop", 0) > 0:
+        return 0
+
+    number_of_alerts = 0
+    for alert_rule in get_relevant_alert_rules(alert_rule_index, event):
+        if alert_rule_matches_event(alert_rule, event):
+            emit_alert(
+                {
+                    "rule": alert_rule["name"],
+                    "datetime": datetime.now().strftime(DATETIME_FORMAT),
+                    **event,
+                },
+                alert_sink,
+            )
+            number_of_alerts = number_of_alerts + 1
+
+    return number_of_alerts
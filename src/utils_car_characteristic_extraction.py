@@ -1,10 +1,13 @@
 """Utility functions to extract car information from webpage."""
 import re
-from datetime import date, datetime, timedelta
+from datetime import datetime
 from os.path import exists
 
 import pandas as pd
 
+from utils_dataset_schema import DATASET_COLUMNS, DATASET_DTYPES
+from utils_publication_datetime import extract_publication_datetime
+from utils_tracing import trace_span
 from utils_website_scraping import scrape_webpage_for_car_characteristics
 
 
@@ -27,199 +30,69 @@ def initialize_or_import_dataset(path_to_existing_dataset, overwrite=True):
         print(f"Importing already existing file: {path_to_existing_dataset}")
         used_car_data = pd.read_csv(
             path_to_existing_dataset,
-            dtype={
-                "publication_history": str,
-                "price_sek": int,
-                "price_history": str,
-                "entry_year": int,
-                "mileage_km": int,
-            },
+            dtype=DATASET_DTYPES,
             parse_dates=["publication_datetime"],
             infer_datetime_format="%Y-%m-%d %H:%M:%S",
         )
         used_car_data = used_car_data.iloc[:, 1:]
     else:
         print(f"Creating new dataset at: {path_to_existing_dataset}")
-        used_car_data = pd.DataFrame(
-            columns=[
-                "publication_datetime",
-                "publication_history",
-                "location",
-                "provider",
-                "manufacturer",
-                "model",
-                "note",
-                "price_sek",
-                "price_history",
-                "entry_year",
-                "fuel",
-                "mileage_km",
-                "transmission",
-                "type_of_drive",
-                "horse_power",
-                "engine_size_ccm",
-                "top_speed_km_h",
-                "emission_class",
-                "co2_emission_g/km",
-                "test_prozedure",
-                "fuel_consumption_mixed_l_100km",
-                "fuel_consumption_highway_l_100km",
-                "electric_range_km",
-                "number_of_seats",
-                "car_type",
-                "length_mm",
-                "width_mm",
-                "height_mm",
-                "load_capacity_kg",
-                "empty_weight_kg",
-                "total_weight_kg",
-                "url",
-            ]
-        )
+        used_car_data = pd.DataFrame(columns=DATASET_COLUMNS)
 
     return used_car_data
 
 
-def extract_car_characteristics(driver):
+def extract_car_characteristics(driver, reference_time=None):
     """Extract car characteristics of advertisment from webpage.
 
     Parameters
     ----------
     driver : selenium.Webdriver
         webdriver for website interactions
+    reference_time : datetime
+        time the webpage is viewed, e.g. start of crawl, now if None
 
     Returns
     -------
     car_characteristics : dict
         detailed characteristics of car advertisment
     """
-    (
-        publication_datetime,
-        location,
-        car_manufacturer_and_model,
-        price,
-        provider,
-        key_characteristics,
-        key_parameters,
-        detailed_characteristics_and_parameters,
-    ) = scrape_webpage_for_car_characteristics(driver)
-
-    car_characteristics = dict(zip(key_characteristics, key_parameters))
-
-    car_characteristics["publication_datetime"] = extract_publication_datetime(
-        publication_datetime
-    )
-    car_characteristics["location"] = extract_city(location)
-    car_characteristics["price"] = extract_int_number(price)
-    car_characteristics["provider"] = provider
-
-    detailed_car_characteristics = convert_key_value_pair_list_to_dict(
-        detailed_characteristics_and_parameters
-    )
-    car_characteristics.update(detailed_car_characteristics)
-
-    manufacturer, model, note = extract_car_manufacturer_and_model(
-        car_manufacturer_and_model
-    )
-    car_characteristics["manufacturer"] = manufacturer
-    car_characteristics["note"] = note
-    if car_characteristics.get("Modell") is None:
-        car_characteristics["Modell"] = model
-
-    return car_characteristics
-
-
-def extract_publication_datetime(date_time):
-    """Extract the datetime of publication.
-
-    Parameters
-    ----------
-    date_time : str
-        date and time of publication as scraped from webpage
-
-    Returns
-    -------
-    date_time : datetime
-        date and time of publication
-    """
-    datetime_parts = date_time.split()
-
-    if any("idag" in string.lower() for string in datetime_parts):
-        date_time = datetime_of_publication(date.today().weekday(), datetime_parts[-1])
-    elif any("igår" in string.lower() for string in datetime_parts):
-        date_time = datetime_of_publication(
-            date.today().weekday() - 1, datetime_parts[-1]
+    with trace_span("scrape car characteristics", "scrape"):
+        (
+            publication_datetime,
+            location,
+            car_manufacturer_and_model,
+            price,
+            provider,
+            key_characteristics,
+            key_parameters,
+            detailed_characteristics_and_parameters,
+        ) = scrape_webpage_for_car_characteristics(driver)
+
+    with trace_span("normalize car characteristics", "normalize"):
+        car_characteristics = dict(zip(key_characteristics, key_parameters))
+
+        car_characteristics["publication_datetime"] = extract_publication_datetime(
+            publication_datetime, reference_time
         )
-    elif any("måndag" in string.lower() for string in datetime_parts):
-        date_time = datetime_of_publication(0, datetime_parts[-1])
-    elif any("tisdag" in string.lower() for string in datetime_parts):
-        date_time = datetime_of_publication(1, datetime_parts[-1])
-    elif any("onsdag" in string.lower() for string in datetime_parts):
-        date_time = datetime_of_publication(2, datetime_parts[-1])
-    elif any("torsdag" in string.lower() for string in datetime_parts):
-        date_time = datetime_of_publication(3, datetime_parts[-1])
-    elif any("fredag" in string.lower() for string in datetime_parts):
-        date_time = datetime_of_publication(4, datetime_parts[-1])
-    elif any("lördag" in string.lower() for string in datetime_parts):
-        date_time = datetime_of_publication(5, datetime_parts[-1])
-    elif any("söndag" in string.lower() for string in datetime_parts):
-        date_time = datetime_of_publication(6, datetime_parts[-1])
-    elif "mars" in datetime_parts:
-        datetime_parts = [sub.replace("mars", "mar.") for sub in datetime_parts]
-        date_time = datetime.strptime(" ".join(datetime_parts[1:]), "%d %b. %H:%M")
-        date_time = date_time.replace(year=date.today().year)
-    elif "maj" in datetime_parts:
-        datetime_parts = [sub.replace("maj", "may.") for sub in datetime_parts]
-        date_time = datetime.strptime(" ".join(datetime_parts[1:]), "%d %b. %H:%M")
-        date_time = date_time.replace(year=date.today().year)
-    elif "juni" in datetime_parts:
-        datetime_parts = [sub.replace("juni", "jun.") for sub in datetime_parts]
-        date_time = datetime.strptime(" ".join(datetime_parts[1:]), "%d %b. %H:%M")
-        date_time = date_time.replace(year=date.today().year)
-    elif "juli" in datetime_parts:
-        datetime_parts = [sub.replace("juli", "jul.") for sub in datetime_parts]
-        date_time = datetime.strptime(" ".join(datetime_parts[1:]), "%d %b. %H:%M")
-        date_time = date_time.replace(year=date.today().year)
-    elif "okt" in datetime_parts:
-        datetime_parts = [sub.replace("okt", "oct.") for sub in datetime_parts]
-        date_time = datetime.strptime(" ".join(datetime_parts[1:]), "%d %b. %H:%M")
-        date_time = date_time.replace(year=date.today().year)
-    else:
-        date_time = datetime.strptime(" ".join(datetime_parts[1:]), "%d %b. %H:%M")
-        date_time = date_time.replace(year=date.today().year)
-
-    return date_time
-
+        car_characteristics["location"] = extract_city(location)
+        car_characteristics["price"] = extract_int_number(price)
+        car_characteristics["provider"] = provider
 
-def datetime_of_publication(weekday_of_publication, time_of_publication):
-    """Derive the datetime of publication with respect to today's date.
-
-    Parameters
-    ----------
-    weekday_of_publication : int
-        day of the week ranging between 0 (monday) to 6 (sunday)
-    time_of_publication : str
-        time advertisment was published
-
-    Returns
-    -------
-    date_time : datetime
-        date and time of publication
-    """
-    days_between_publication_and_today = date.today().weekday() - weekday_of_publication
-
-    # if weekday of publication lies before today the distance gets negative.
-    # e.g weekday_of_publication is Sunday (6) and today is Wednesday (3)
-    if days_between_publication_and_today < 0:
-        days_between_publication_and_today = 7 + days_between_publication_and_today
+        detailed_car_characteristics = convert_key_value_pair_list_to_dict(
+            detailed_characteristics_and_parameters
+        )
+        car_characteristics.update(detailed_car_characteristics)
 
-    publication_date = date.today() - timedelta(days_between_publication_and_today)
-    publication_date_time = " ".join(
-        [publication_date.strftime("%Y-%m-%d"), time_of_publication]
-    )
-    publication_date_time = datetime.strptime(publication_date_time, "%Y-%m-%d %H:%M")
+        manufacturer, model, note = extract_car_manufacturer_and_model(
+            car_manufacturer_and_model
+        )
+        car_characteristics["manufacturer"] = manufacturer
+        car_characteristics["note"] = note
+        if car_characteristics.get("Modell") is None:
+            car_characteristics["Modell"] = model
 
-    return publication_date_time
+    return car_characteristics
 
 
 def convert_datetime_to_str(date_time):
@@ -0,0 +1,527 @@
+"""Utility functions for mapping raw manufacturer and model names to canonical ones.
+
+The headline of a car advertisment is split on whitespace, so spelling variants like
+"Mercedes", "Mercedes Benz" and "Mercedes-Benz" or "VW" and "Volkswagen" would end up
+as separate categories. Every raw name is therefore resolved to a canonical name of
+a vocabulary, which is kept next to the data set.
+
+The vocabulary memoizes every name it has resolved, by a key which ignores case,
+accents, whitespace and punctuation. Only names it has never seen are scored with
+fuzzywuzzy against the canonical names, and a name without a close enough match
+becomes a canonical name itself.
+"""
+import json
+import os
+import re
+import shutil
+import time
+import unicodedata
+from os.path import exists, splitext
+
+import pandas as pd
+from fuzzywuzzy import fuzz, process
+
+from utils_car_characteristic_extraction import initialize_or_import_dataset
+from utils_change_feed import flush_change_feed, initialize_change_feed, record_update
+from utils_comparable_cars import (
+    add_cars_to_index,
+    create_empty_comparable_car_index,
+    get_path_to_comparable_car_index,
+    save_comparable_car_index,
+)
+from utils_depreciation import get_path_to_depreciation_curves
+from utils_feature_store import export_feature_store, get_path_to_feature_store
+from utils_market_aggregates import (
+    build_aggregates_from_dataset,
+    get_path_to_aggregates,
+    save_aggregates,
+)
+from utils_price_model import get_path_to_price_model_cache
+
+# manufacturers the vocabulary starts with
+CANONICAL_MANUFACTURERS = [
+    "Alfa Romeo",
+    "Aston Martin",
+    "Audi",
+    "BMW",
+    "Chevrolet",
+    "Citroën",
+    "Cupra",
+    "Dacia",
+    "DS",
+    "Fiat",
+    "Ford",
+    "Honda",
+    "Hyundai",
+    "Jaguar",
+    "Jeep",
+    "Kia",
+    "Land Rover",
+    "Lexus",
+    "Mazda",
+    "Mercedes-Benz",
+    "MG",
+    "Mini",
+    "Mitsubishi",
+    "Nissan",
+    "Opel",
+    "Peugeot",
+    "Polestar",
+    "Porsche",
+    "Renault",
+    "Saab",
+    "Seat",
+    "Skoda",
+    "Subaru",
+    "Suzuki",
+    "Tesla",
+    "Toyota",
+    "Volkswagen",
+    "Volvo",
+]
+
+# abbreviations and first words of manufacturers, which are too short or too
+# different to be matched by score
+MANUFACTURER_ALIASES = {
+    "Alfa": "Alfa Romeo",
+    "Aston": "Aston Martin",
+    "Chevy": "Chevrolet",
+    "Land": "Land Rover",
+    "Mercedes": "Mercedes-Benz",
+    "VW": "Volkswagen",
+}
+
+# minimum fuzzywuzzy ratio of the keys of a raw and a canonical name to be the same
+MANUFACTURER_SCORE_CUTOFF = 85
+MODEL_SCORE_CUTOFF = 85
+
+
+def get_path_to_car_names(path_to_dataset):
+    """Derive the path of the car name vocabulary which is kept next to the data set.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+
+    Returns
+    -------
+     : str
+        path to car name vocabulary
+    """
+    return splitext(path_to_dataset)[0] + "_car_names.json"
+
+
+def get_name_key(name):
+    """Get the key of a name, which is the same for all its spelling variants.
+
+    Parameters
+    ----------
+    name : str
+        raw or canonical name
+
+    Returns
+    -------
+     : str
+        lower case letters and digits of name without accents
+    """
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def create_car_name_vocabulary():
+    """Create a vocabulary with the canonical manufacturers and their aliases.
+
+    Returns
+    -------
+    vocabulary : dict
+        canonical manufacturer per key of resolved manufacturer name and, per
+        canonical manufacturer, canonical model per key of resolved model name
+    """
+    vocabulary = {"manufacturers": {}, "models": {}}
+    for manufacturer in CANONICAL_MANUFACTURERS:
+        vocabulary["manufacturers"][get_name_key(manufacturer)] = manufacturer
+        vocabulary["models"][manufacturer] = {}
+    for alias, manufacturer in MANUFACTURER_ALIASES.items():
+        vocabulary["manufacturers"][get_name_key(alias)] = manufacturer
+
+    return vocabulary
+
+
+def initialize_or_import_car_names(path_to_car_names):
+    """Import existing car name vocabulary or create a new one.
+
+    Parameters
+    ----------
+    path_to_car_names : str
+        path to car name vocabulary
+
+    Returns
+    -------
+    vocabulary : dict
+        resolved manufacturer and model names
+    """
+    if exists(path_to_car_names):
+        with open(path_to_car_names, encoding="utf-8") as file:
+            vocabulary = json.load(file)
+    else:
+        vocabulary = create_car_name_vocabulary()
+
+    return vocabulary
+
+
+def save_car_names(vocabulary, path_to_car_names):
+    """Save car name vocabulary to file.
+
+    Parameters
+    ----------
+    vocabulary : dict
+        resolved manufacturer and model names
+    path_to_car_names : str
+        path to car name vocabulary
+    """
+    with open(path_to_car_names + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(vocabulary, file, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(path_to_car_names + ".tmp", path_to_car_names)
+
+
+def extends_name_key(key, other_key):
+    """Check whether one of two name keys starts or ends with the other one.
+
+    Parameters
+    ----------
+    key : str
+        key of a name
+    other_key : str
+        key of another name
+
+    Returns
+    -------
+     : bool
+        True if a key is a prefix or a suffix of the other one
+    """
+    shorter_key, longer_key = sorted([key, other_key], key=len)
+
+    return longer_key.startswith(shorter_key) or longer_key.endswith(shorter_key)
+
+
+def match_canonical_name(key, canonical_names, score_cutoff):
+    """Find the canonical name which is most similar to a name never seen before.
+
+    Names with different digits are never matched, as e.g. "V60" and "V90" or
+    "Model 3" and "Model Y" are different models. Neither are names whose key
+    extends the key of the other one, as e.g. "XCeed" and "Ceed", "e-Niro" and
+    "Niro" or "Aygo X" and "Aygo" are different models as well.
+
+    Parameters
+    ----------
+    key : str
+        key of raw name
+    canonical_names : iterable
+        canonical names the raw name may be a variant of
+    score_cutoff : int
+        minimum fuzzywuzzy ratio of the keys
+
+    Returns
+    -------
+     : str
+        most similar canonical name, None if none reaches the cutoff
+    """
+    digits = re.sub(r"\D", "", key)
+    choices = {
+        canonical_name: get_name_key(canonical_name)
+        for canonical_name in set(canonical_names)
+        if re.sub(r"\D", "", get_name_key(canonical_name)) == digits
+    }
+    choices = {
+        canonical_name: canonical_key
+        for canonical_name, canonical_key in choices.items()
+        if canonical_key == key or not extends_name_key(key, canonical_key)
+    }
+    match = process.extractOne(
+        key,
+        choices,
+        processor=None,
+        scorer=fuzz.ratio,
+        score_cutoff=score_cutoff,
+    )
+    if match is None:
+        return None
+
+    return match[2]
+
+
+def resolve_name(resolved_names, name, score_cutoff):
+    """Resolve a raw name with the memoized names or by fuzzy matching.
+
+    A name without match becomes a canonical name itself. The result is memoized,
+    so each spelling is matched only once.
+
+    Parameters
+    ----------
+    resolved_names : dict
+        canonical name per key of resolved name
+    name : str
+        raw name
+    score_cutoff : int
+        minimum fuzzywuzzy ratio of the keys
+
+    Returns
+    -------
+     : str
+        canonical name
+    """
+    key = get_name_key(name)
+    if not key:
+        return name
+    if key not in resolved_names:
+        resolved_names[key] = (
+            match_canonical_name(key, resolved_names.values(), score_cutoff)
+            or name.strip()
+        )
+
+    return resolved_names[key]
+
+
+def model_is_split_manufacturer(raw_manufacturer, model, manufacturer):
+    """Check whether the model is the second word of a manufacturer of several words.
+
+    Parameters
+    ----------
+    raw_manufacturer : str
+        raw manufacturer
+    model : str
+        raw model
+    manufacturer : str
+        canonical manufacturer
+
+    Returns
+    -------
+     : boolean
+        raw manufacturer and model make up the canonical manufacturer
+    """
+    return isinstance(model, str) and get_name_key(
+        raw_manufacturer + model
+    ) == get_name_key(manufacturer)
+
+
+def canonicalize_car_name(vocabulary, manufacturer, model, note=""):
+    """Map raw manufacturer and model of a car to their canonical names.
+
+    If the headline splits a manufacturer of several words, e.g. "Land Rover", the
+    second word ends up as model and the model is taken from the note instead. A
+    model which repeats the manufacturer drops it.
+
+    Parameters
+    ----------
+    vocabulary : dict
+        resolved manufacturer and model names
+    manufacturer : str
+        raw manufacturer
+    model : str
+        raw model
+    note : str
+        additional notes given in advertisment header
+
+    Returns
+    -------
+    manufacturer : str
+        canonical manufacturer
+    model : str
+        canonical model
+    note : str
+        note without a model taken from it
+    """
+    if not isinstance(manufacturer, str):
+        return manufacturer, model, note
+
+    raw_manufacturer = manufacturer
+    manufacturer = resolve_name(
+        vocabulary["manufacturers"], raw_manufacturer, MANUFACTURER_SCORE_CUTOFF
+    )
+    manufacturer_key = get_name_key(manufacturer)
+
+    if model_is_split_manufacturer(raw_manufacturer, model, manufacturer):
+        if isinstance(note, str) and note.strip():
+            model, _, note = note.strip().partition(" ")
+        else:
+            model = None
+
+    if isinstance(model, str):
+        words = model.split(maxsplit=1)
+        if len(words) == 2 and get_name_key(words[0]) in [
+            manufacturer_key,
+            get_name_key(raw_manufacturer),
+        ]:
+            model = words[1]
+        model = resolve_name(
+            vocabulary["models"].setdefault(manufacturer, {}),
+            model,
+            MODEL_SCORE_CUTOFF,
+        )
+
+    return manufacturer, model, note
+
+
+def canonicalize_car_characteristics(vocabulary, car_characteristics):
+    """Map manufacturer and model of extracted car characteristics to canonical names.
+
+    Parameters
+    ----------
+    vocabulary : dict
+        resolved manufacturer and model names
+    car_characteristics : dict
+        car characteristics as extracted by `extract_car_characteristics`
+
+    Returns
+    -------
+    car_characteristics : dict
+        car characteristics with canonical manufacturer and model
+    """
+    car_characteristics = dict(car_characteristics)
+    (
+        car_characteristics["manufacturer"],
+        car_characteristics["Modell"],
+        car_characteristics["note"],
+    ) = canonicalize_car_name(
+        vocabulary,
+        car_characteristics.get("manufacturer"),
+        car_characteristics.get("Modell"),
+        car_characteristics.get("note", ""),
+    )
+
+    return car_characteristics
+
+
+def canonicalize_dataset(used_car_data, vocabulary):
+    """Map manufacturer and model of all cars of the data set to canonical names.
+
+    Each distinct pair of raw manufacturer and model is resolved once, the most
+    frequent pairs first, so their spelling becomes the canonical one of new models.
+
+    Parameters
+    ----------
+    used_car_data : DataFrame
+        data set of used cars
+    vocabulary : dict
+        resolved manufacturer and model names
+
+    Returns
+    -------
+    used_car_data : DataFrame
+        data set with canonical manufacturer and model
+    changed_rows : np.ndarray
+        positions of rows whose manufacturer, model or note changed
+    """
+    columns = ["manufacturer", "model", "note"]
+    values = {
+        column: used_car_data[column].to_numpy(dtype=object).copy()
+        for column in columns
+    }
+
+    groups = used_car_data.groupby(
+        ["manufacturer", "model"], dropna=False, sort=False
+    ).indices
+    for (manufacturer, model), rows in sorted(
+        groups.items(), key=lambda group: -len(group[1])
+    ):
+        if not isinstance(manufacturer, str):
+            continue
+
+        canonical_manufacturer = resolve_name(
+            vocabulary["manufacturers"], manufacturer, MANUFACTURER_SCORE_CUTOFF
+        )
+        if model_is_split_manufacturer(manufacturer, model, canonical_manufacturer):
+            # the model is taken from the note, which differs from car to car
+            for row in rows:
+                (
+                    values["manufacturer"][row],
+                    values["model"][row],
+                    values["note"][row],
+                ) = canonicalize_car_name(
+                    vocabulary, manufacturer, model, values["note"][row]
+                )
+        else:
+            (
+                values["manufacturer"][rows],
+                values["model"][rows],
+                _,
+            ) = canonicalize_car_name(vocabulary, manufacturer, model)
+
+    canonical_car_data = used_car_data.assign(**values)
+    changed = pd.Series(False, index=used_car_data.index)
+    for column in columns:
+        changed |= used_car_data[column].ne(canonical_car_data[column]) & ~(
+            used_car_data[column].isna() & canonical_car_data[column].isna()
+        )
+
+    return canonical_car_data, changed.to_numpy().nonzero()[0]
+
+
+def recanonicalize_dataset(path_to_dataset):
+    """Map manufacturer and model of the whole data set to canonical names.
+
+    The market aggregates, the comparable car index and an exported feature store,
+    which hold manufacturer and model, are built again. The depreciation curves and
+    the price model cache are removed, so they are built again from scratch the next
+    time they are refreshed. The changed cars are recorded in the change feed.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+
+    Returns
+    -------
+     : int
+        number of changed cars
+    """
+    start = time.perf_counter()
+    used_car_data = initialize_or_import_dataset(path_to_dataset)
+    path_to_car_names = get_path_to_car_names(path_to_dataset)
+    vocabulary = initialize_or_import_car_names(path_to_car_names)
+
+    number_of_models = used_car_data.groupby(["manufacturer", "model"]).ngroups
+    canonical_car_data, changed_rows = canonicalize_dataset(used_car_data, vocabulary)
+    print(
+        f"Mapped {number_of_models} manufacturer and model pair(s) to",
+        f"{canonical_car_data.groupby(['manufacturer', 'model']).ngroups} canonical",
+        f"one(s) in {time.perf_counter() - start:.2f} s,",
+        f"{len(changed_rows)} car(s) changed.",
+    )
+
+    change_feed = initialize_change_feed(path_to_dataset)
+    for row in changed_rows:
+        car_before_update = used_car_data.iloc[row]
+        car = canonical_car_data.iloc[row]
+        record_update(change_feed, car_before_update, car)
+
+    canonical_car_data.to_csv(path_to_dataset + ".tmp")
+    os.replace(path_to_dataset + ".tmp", path_to_dataset)
+    flush_change_feed(change_feed)
+    save_car_names(vocabulary, path_to_car_names)
+
+    if len(changed_rows):
+        save_aggregates(
+            build_aggregates_from_dataset(canonical_car_data),
+            get_path_to_aggregates(path_to_dataset),
+        )
+        index = create_empty_comparable_car_index()
+        add_cars_to_index(index, canonical_car_data)
+        save_comparable_car_index(
+            index, get_path_to_comparable_car_index(path_to_dataset)
+        )
+        path_to_feature_store = get_path_to_feature_store(path_to_dataset)
+        if exists(path_to_feature_store):
+            export_feature_store(canonical_car_data, path_to_feature_store)
+
+        # both are only updated for models with new cars, so the curves and cached
+        # features of the raw names would be kept otherwise
+        path_to_depreciation_curves = get_path_to_depreciation_curves(path_to_dataset)
+        if exists(path_to_depreciation_curves):
+            os.remove(path_to_depreciation_curves)
+        shutil.rmtree(
+            get_path_to_price_model_cache(path_to_dataset), ignore_errors=True
+        )
+
+    return len(changed_rows)
@@ -0,0 +1,346 @@
+"""Utility functions for a change feed of the rows inserted and updated by crawls.
+
+Every car a crawl attaches is recorded as insert with all its columns, and every
+update of a known car as update with the changed columns only. Each change carries
+the id of the crawl run and a sequence number, which increases over all runs.
+
+The changes are kept in memory and appended to a JSON Lines file next to the data
+set whenever the crawl saves the data set, so the feed never runs ahead of the saved
+data. Consumers keep a checkpoint with the last sequence number and the byte offset
+in the file they have read to, so they only read and apply the changes since.
+"""
+import json
+import os
+import uuid
+from datetime import datetime
+from os.path import exists, splitext
+
+import pandas as pd
+
+
+def get_path_to_change_feed(path_to_dataset):
+    """Derive the path of the change feed which is kept next to the data set.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+
+    Returns
+    -------
+     : str
+        path to JSON Lines file of changes
+    """
+    return splitext(path_to_dataset)[0] + "_changes.jsonl"
+
+
+def create_run_id():
+    """Create the id of a crawl run.
+
+    Returns
+    -------
+     : str
+        start of run and a random suffix, so ids sort by start
+    """
+    return f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+
+def get_last_sequence(path_to_change_feed):
+    """Get the sequence number of the last change in the change feed.
+
+    Only the end of the file is read. A last line without newline is incomplete and
+    therefore ignored.
+
+    Parameters
+    ----------
+    path_to_change_feed : str
+        path to JSON Lines file of changes
+
+    Returns
+    -------
+     : int
+        sequence number of last change, 0 if there is none
+    """
+    if not exists(path_to_change_feed):
+        return 0
+
+    with open(path_to_change_feed, "rb") as file:
+        file.seek(0, os.SEEK_END)
+        position = file.tell()
+        tail = b""
+        while position > 0 and tail.count(b"\n") < 2:
+            step = min(4096, position)
+            position = position - step
+            file.seek(position)
+            tail = file.read(step) + tail
+
+    # a last line without newline is still being appended by a writer
+    lines = tail[: tail.rfind(b"\n") + 1].strip().splitlines()
+    if not lines:
+        return 0
+
+    return json.loads(lines[-1])["sequence"]
+
+
+def initialize_change_feed(path_to_dataset):
+    """Start the change feed of a crawl run.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+
+    Returns
+    -------
+     : dict
+        path to change feed, run id, last sequence number and pending changes
+    """
+    path_to_change_feed = get_path_to_change_feed(path_to_dataset)
+
+    return {
+        "path": path_to_change_feed,
+        "run_id": create_run_id(),
+        "last_sequence": get_last_sequence(path_to_change_feed),
+        "pending": [],
+    }
+
+
+def to_change_value(value):
+    """Convert a value of the data set to a value which can be written to JSON.
+
+    Parameters
+    ----------
+    value : object
+        value of data set, e.g. a numpy integer, a timestamp or NaN
+
+    Returns
+    -------
+     : object
+        value as Python type, timestamps in ISO format, None if missing
+    """
+    if not isinstance(value, (list, dict)) and pd.isna(value):
+        return None
+    if isinstance(value, (datetime, pd.Timestamp)):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+
+    return value
+
+
+def record_change(change_feed, operation, url, values, previous_values=None):
+    """Record a change of the data set in the pending changes of the feed.
+
+    Parameters
+    ----------
+    change_feed : dict
+        change feed of crawl run
+    operation : str
+        either "insert" or "update"
+    url : str
+        url of car, which identifies its row
+    values : dict
+        inserted values, or new values of the updated columns
+    previous_values : dict
+        values of the updated columns before the update
+    """
+    change_feed["last_sequence"] = change_feed["last_sequence"] + 1
+    change = {
+        "run_id": change_feed["run_id"],
+        "sequence": change_feed["last_sequence"],
+        "operation": operation,
+        "url": url,
+        "values": {column: to_change_value(value) for column, value in values.items()},
+    }
+    if previous_values is not None:
+        change["previous_values"] = {
+            column: to_change_value(value) for column, value in previous_values.items()
+        }
+    change_feed["pending"].append(change)
+
+
+def record_insert(change_feed, car):
+    """Record an attached car as insert.
+
+    Parameters
+    ----------
+    change_feed : dict
+        change feed of crawl run
+    car : dict or pd.Series
+        data of car
+    """
+    record_change(change_feed, "insert", car["url"], dict(car))
+
+
+def record_update(change_feed, car_before_update, car):
+    """Record the changed columns of an updated car as update.
+
+    Nothing is recorded if no column has changed.
+
+    Parameters
+    ----------
+    change_feed : dict
+        change feed of crawl run
+    car_before_update : pd.Series
+        data of car before update
+    car : pd.Series
+        data of car after update
+    """
+    changed_columns = [
+        column
+        for column in car.index
+        if to_change_value(car[column])
+        != to_change_value(car_before_update.get(column))
+    ]
+    if changed_columns:
+        record_change(
+            change_feed,
+            "update",
+            car["url"],
+            {column: car[column] for column in changed_columns},
+            {column: car_before_update.get(column) for column in changed_columns},
+        )
+
+
+def truncate_incomplete_last_line(path_to_change_feed):
+    """Remove a last line without newline, which a crash while appending left behind.
+
+    Consumers never read past it, so no checkpoint points behind the removed line.
+
+    Parameters
+    ----------
+    path_to_change_feed : str
+        path to JSON Lines file of changes
+    """
+    if not exists(path_to_change_feed):
+        return
+
+    with open(path_to_change_feed, "rb+") as file:
+        end = file.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            step = min(4096, position)
+            position = position - step
+            file.seek(position)
+            block = file.read(step)
+            if b"\n" in block:
+                position = position + block.rfind(b"\n") + 1
+                break
+        if position < end:
+            print(f"Removing incomplete last line of change feed at byte {position}.")
+            file.truncate(position)
+
+
+def flush_change_feed(change_feed):
+    """Append the pending changes to the change feed file.
+
+    An incomplete last line is removed first, as the changes would be appended to it.
+
+    Parameters
+    ----------
+    change_feed : dict
+        change feed of crawl run
+    """
+    if not change_feed["pending"]:
+        return
+
+    truncate_incomplete_last_line(change_feed["path"])
+    with open(change_feed["path"], "a", encoding="utf-8") as file:
+        file.writelines(
+            json.dumps(change, ensure_ascii=False) + "\n"
+            for change in change_feed["pending"]
+        )
+    change_feed["pending"] = []
+
+
+def create_checkpoint():
+    """Create the checkpoint of a consumer which has not read any change.
+
+    Returns
+    -------
+     : dict
+        last read sequence number and byte offset in change feed
+    """
+    return {"sequence": 0, "offset": 0}
+
+
+def read_changes_since(path_to_change_feed, checkpoint):
+    """Read the changes after the checkpoint of a consumer.
+
+    Parameters
+    ----------
+    path_to_change_feed : str
+        path to JSON Lines file of changes
+    checkpoint : dict
+        last read sequence number and byte offset in change feed
+
+    Returns
+    -------
+    changes : list
+        changes after checkpoint, in order of sequence number
+    checkpoint : dict
+        checkpoint after the returned changes
+    """
+    if not exists(path_to_change_feed):
+        return [], checkpoint
+
+    changes = []
+    last_read_sequence = checkpoint["sequence"]
+    offset = checkpoint["offset"]
+    with open(path_to_change_feed, "rb") as file:
+        file.seek(offset)
+        for line in file:
+            if not line.endswith(b"\n"):
+                # the crawl is appending this change right now
+                break
+            offset = offset + len(line)
+            change = json.loads(line)
+            if change["sequence"] > last_read_sequence:
+                changes.append(change)
+            checkpoint = {"sequence": change["sequence"], "offset": offset}
+
+    return changes, checkpoint
+
+
+def apply_changes(used_car_data, changes):
+    """Apply changes of the change feed to a copy of the data set.
+
+    Parameters
+    ----------
+    used_car_data : DataFrame
+        data set of used cars as of the checkpoint of the changes
+    changes : list
+        changes as read by `read_changes_since`
+
+    Returns
+    -------
+    used_car_data : DataFrame
+        data set with the changes applied
+    """
+    row_of_url = {
+        url: row for row, url in zip(used_car_data.index, used_car_data["url"])
+    }
+    inserts = {}
+    used_car_data = used_car_data.copy()
+    for change in changes:
+        values = dict(change["values"])
+        if "publication_datetime" in values:
+            values["publication_datetime"] = pd.to_datetime(
+                values["publication_datetime"]
+            )
+
+        url = change["url"]
+        if url in inserts:
+            inserts[url].update(values)
+        elif url in row_of_url:
+            for column, value in values.items():
+                used_car_data.loc[row_of_url[url], column] = value
+        elif change["operation"] == "insert":
+            inserts[url] = values
+
+    if inserts:
+        used_car_data = pd.concat(
+            [used_car_data, pd.DataFrame(list(inserts.values()))], ignore_index=True
+        )
+
+    return used_car_data
@@ -0,0 +1,370 @@
+"""Utility functions for finding comparable cars with a nearest neighbour index.
+
+Cars are only compared with cars of the same manufacturer and model, so the index
+is partitioned by them and each partition holds a ball tree over the normalized
+entry year, mileage, horse power, fuel, transmission and car type.
+
+New cars are appended to a small list of pending cars of their partition, which is
+searched exhaustively next to the tree. The tree of a partition is only rebuilt once
+its pending cars make up a noticeable share of it, so the index can be updated car
+by car as new car advertisments arrive.
+"""
+import os
+import pickle
+import time
+from os.path import exists, splitext
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+# numerical columns as produced by `attach_new_used_car` with the value a missing
+# value is imputed with and the difference which is as dissimilar as a mismatch of
+# one categorical column
+COMPARABLE_NUMERIC_FEATURES = {
+    "entry_year": (2015, 2),
+    "mileage_km": (100000, 30000),
+    "horse_power": (150, 30),
+}
+
+# categories of the categorical columns as translated by `attach_new_used_car`, each
+# of which gets its own column of the one-hot encoding, missing and unseen categories
+# share one further column
+COMPARABLE_CATEGORIES = {
+    "fuel": ["diesel", "petrol", "hybrid", "electric"],
+    "transmission": ["automatic", "manual"],
+    "car_type": [
+        "estate car",
+        "hatchback",
+        "small",
+        "convertible",
+        "van",
+        "commercial",
+        "SUV",
+        "Sedan",
+        "Coupé",
+    ],
+}
+NUMBER_OF_CATEGORICAL_FEATURES = sum(
+    len(categories) + 1 for categories in COMPARABLE_CATEGORIES.values()
+)
+
+# weight of the one-hot encoding, so a mismatch of one categorical column adds a
+# distance of one
+CATEGORY_WEIGHT = 1 / np.sqrt(2)
+
+# the tree of a partition is rebuilt once the number of pending cars exceeds the
+# maximum of both, i.e. a fraction of the cars in the tree
+MINIMUM_NUMBER_OF_PENDING_CARS = 32
+REBUILD_FRACTION = 0.25
+
+DEFAULT_NUMBER_OF_COMPARABLE_CARS = 10
+
+
+def get_path_to_comparable_car_index(path_to_dataset):
+    """Derive the path of the comparable car index which is kept next to the data set.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+
+    Returns
+    -------
+     : str
+        path to comparable car index
+    """
+    return splitext(path_to_dataset)[0] + "_comparable_cars.pkl"
+
+
+def create_empty_comparable_car_index():
+    """Create an empty comparable car index.
+
+    Returns
+    -------
+     : dict
+        partitions per manufacturer and model, urls of indexed cars and encoded
+        categories
+    """
+    return {
+        "partitions": {},
+        "urls": set(),
+        "categories": COMPARABLE_CATEGORIES,
+    }
+
+
+def initialize_or_import_comparable_car_index(path_to_index):
+    """Import existing comparable car index or create an empty one.
+
+    Parameters
+    ----------
+    path_to_index : str
+        path to comparable car index
+
+    Returns
+    -------
+    index : dict
+        partitions per manufacturer and model and urls of indexed cars
+    """
+    index = create_empty_comparable_car_index()
+    if exists(path_to_index):
+        with open(path_to_index, "rb") as file:
+            imported_index = pickle.load(file)
+        # an index with another encoding of the features is rebuilt from scratch
+        if imported_index.get("categories") == COMPARABLE_CATEGORIES:
+            index = imported_index
+
+    return index
+
+
+def save_comparable_car_index(index, path_to_index):
+    """Save comparable car index to file.
+
+    Parameters
+    ----------
+    index : dict
+        partitions per manufacturer and model and urls of indexed cars
+    path_to_index : str
+        path to comparable car index
+    """
+    with open(path_to_index + ".tmp", "wb") as file:
+        pickle.dump(index, file)
+    os.replace(path_to_index + ".tmp", path_to_index)
+
+
+def get_partition_key(manufacturer, model):
+    """Get key of the partition of a manufacturer and model.
+
+    Parameters
+    ----------
+    manufacturer : str
+        manufacturer of car, may be missing
+    model : str
+        model of car, may be missing
+
+    Returns
+    -------
+     : tuple
+        manufacturer and model, None if missing
+    """
+    return (
+        manufacturer if pd.notna(manufacturer) else None,
+        model if pd.notna(model) else None,
+    )
+
+
+def encode_comparable_features(cars):
+    """Encode characteristics of cars to normalized features.
+
+    Parameters
+    ----------
+    cars : DataFrame
+        cars with columns as attached by `attach_new_used_car`
+
+    Returns
+    -------
+     : np.ndarray
+        features with one row per car
+    """
+    features = []
+    for column, (offset, scale) in COMPARABLE_NUMERIC_FEATURES.items():
+        if column in cars:
+            values = pd.to_numeric(cars[column], errors="coerce").to_numpy(float)
+        else:
+            values = np.full(len(cars), np.nan)
+        features.append((np.nan_to_num(values, nan=offset) - offset) / scale)
+
+    for column, categories in COMPARABLE_CATEGORIES.items():
+        one_hot = np.zeros((len(cars), len(categories) + 1))
+        column_per_category = {category: i for i, category in enumerate(categories)}
+        if column in cars:
+            category_columns = [
+                column_per_category.get(category, len(categories))
+                for category in cars[column]
+            ]
+        else:
+            category_columns = [len(categories)] * len(cars)
+        one_hot[np.arange(len(cars)), category_columns] = CATEGORY_WEIGHT
+        features.append(one_hot)
+
+    return np.column_stack(features)
+
+
+def create_empty_partition():
+    """Create an empty partition of the comparable car index.
+
+    Returns
+    -------
+     : dict
+        tree with its features and urls and the pending features and urls
+    """
+    number_of_features = (
+        len(COMPARABLE_NUMERIC_FEATURES) + NUMBER_OF_CATEGORICAL_FEATURES
+    )
+    return {
+        "tree": None,
+        "features": np.empty((0, number_of_features)),
+        "urls": np.array([], dtype=object),
+        "pending_features": np.empty((0, number_of_features)),
+        "pending_urls": np.array([], dtype=object),
+    }
+
+
+def rebuild_partition(partition):
+    """Rebuild the tree of a partition with its pending cars.
+
+    Parameters
+    ----------
+    partition : dict
+        partition of the comparable car index
+    """
+    partition["features"] = np.concatenate(
+        [partition["features"], partition["pending_features"]]
+    )
+    partition["urls"] = np.concatenate([partition["urls"], partition["pending_urls"]])
+    partition["tree"] = BallTree(partition["features"])
+    partition["pending_features"] = partition["pending_features"][:0]
+    partition["pending_urls"] = partition["pending_urls"][:0]
+
+
+def add_cars_to_index(index, cars):
+    """Add cars which are not indexed yet to the comparable car index.
+
+    Parameters
+    ----------
+    index : dict
+        partitions per manufacturer and model and urls of indexed cars
+    cars : DataFrame
+        cars with columns as attached by `attach_new_used_car`
+
+    Returns
+    -------
+     : int
+        number of added cars
+    """
+    # look up the urls in the set one by one, as `isin` would copy the whole set
+    is_new_car = [url not in index["urls"] for url in cars["url"]]
+    new_cars = cars[is_new_car].drop_duplicates(subset="url")
+    if not len(new_cars):
+        return 0
+
+    features = encode_comparable_features(new_cars)
+    for (manufacturer, model), rows in new_cars.groupby(
+        ["manufacturer", "model"], dropna=False
+    ).indices.items():
+        partition = index["partitions"].setdefault(
+            get_partition_key(manufacturer, model), create_empty_partition()
+        )
+        partition["pending_features"] = np.concatenate(
+            [partition["pending_features"], features[rows]]
+        )
+        partition["pending_urls"] = np.concatenate(
+            [partition["pending_urls"], new_cars["url"].to_numpy(dtype=object)[rows]]
+        )
+        if len(partition["pending_urls"]) >= max(
+            MINIMUM_NUMBER_OF_PENDING_CARS, REBUILD_FRACTION * len(partition["urls"])
+        ):
+            rebuild_partition(partition)
+
+    index["urls"].update(new_cars["url"])
+
+    return len(new_cars)
+
+
+def query_comparable_cars(index, car, k=DEFAULT_NUMBER_OF_COMPARABLE_CARS):
+    """Find the most similar cars of the same manufacturer and model.
+
+    Parameters
+    ----------
+    index : dict
+        partitions per manufacturer and model and urls of indexed cars
+    car : dict
+        characteristics of car with keys as attached by `attach_new_used_car`
+    k : int
+        number of comparable cars
+
+    Returns
+    -------
+    urls : np.ndarray
+        urls of comparable cars, most similar first
+    distances : np.ndarray
+        distances of comparable cars
+    """
+    partition = index["partitions"].get(
+        get_partition_key(car.get("manufacturer"), car.get("model"))
+    )
+    if partition is None:
+        return np.array([], dtype=object), np.array([], dtype=float)
+
+    features = encode_comparable_features(pd.DataFrame([car]))
+
+    urls = [partition["pending_urls"]]
+    distances = [np.linalg.norm(partition["pending_features"] - features, axis=1)]
+    if partition["tree"] is not None:
+        tree_distances, rows = partition["tree"].query(
+            features, k=min(k, len(partition["urls"]))
+        )
+        urls.append(partition["urls"][rows[0]])
+        distances.append(tree_distances[0])
+
+    urls, distances = np.concatenate(urls), np.concatenate(distances)
+    nearest = np.argsort(distances, kind="stable")[:k]
+
+    return urls[nearest], distances[nearest]
+
+
+def find_comparable_cars(
+    index, used_car_data, car, k=DEFAULT_NUMBER_OF_COMPARABLE_CARS
+):
+    """Find the most similar cars of the data set with their current characteristics.
+
+    Parameters
+    ----------
+    index : dict
+        partitions per manufacturer and model and urls of indexed cars
+    used_car_data : DataFrame
+        data set of used cars
+    car : dict
+        characteristics of car with keys as attached by `attach_new_used_car`
+    k : int
+        number of comparable cars
+
+    Returns
+    -------
+     : DataFrame
+        comparable cars with their distance, most similar first
+    """
+    urls, distances = query_comparable_cars(index, car, k)
+    cars = used_car_data.drop_duplicates(subset="url", keep="last").set_index("url")
+
+    return cars.reindex(urls).assign(distance=distances).reset_index()
+
+
+def update_comparable_car_index_after_crawl(path_to_dataset, used_car_data):
+    """Add newly crawled cars to the comparable car index.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set the index is kept next to
+    used_car_data : DataFrame
+        data set of used cars
+
+    Returns
+    -------
+    index : dict
+        updated comparable car index
+    """
+    start = time.perf_counter()
+    path_to_index = get_path_to_comparable_car_index(path_to_dataset)
+
+    index = initialize_or_import_comparable_car_index(path_to_index)
+    number_of_added_cars = add_cars_to_index(index, used_car_data)
+    save_comparable_car_index(index, path_to_index)
+
+    print(
+        f"Added {number_of_added_cars} car(s) to the comparable car index of",
+        f"{len(index['partitions'])} model(s) in {time.perf_counter() - start:.2f} s.",
+    )
+
+    return index
@@ -0,0 +1,791 @@
+"""Utility functions for crawling result webpages of a search for used cars.
+
+The state of a crawl (data set, market aggregates and where they are saved) is kept
+in a dict, so one crawl can process several search queries with the same browsers.
+"""
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from os.path import exists
+
+import pandas as pd
+
+from utils_alerts import (
+    build_alert_rule_index,
+    check_event_against_alert_rules,
+    create_car_event,
+    get_path_to_alert_rules,
+    get_path_to_alerts,
+    initialize_or_import_alert_rules,
+)
+from utils_car_characteristic_extraction import (
+    attach_new_used_car,
+    extract_car_characteristics,
+    initialize_or_import_dataset,
+)
+from utils_car_names import (
+    canonicalize_car_characteristics,
+    get_path_to_car_names,
+    initialize_or_import_car_names,
+    save_car_names,
+)
+from utils_change_feed import (
+    flush_change_feed,
+    initialize_change_feed,
+    record_insert,
+    record_update,
+)
+from utils_comparable_cars import update_comparable_car_index_after_crawl
+from utils_dead_letter_queue import (
+    get_path_to_dead_letter_queue,
+    get_urls_due_for_retry,
+    initialize_or_import_dead_letter_queue,
+    record_failed_extraction,
+    remove_from_dead_letter_queue,
+    save_dead_letter_queue,
+    summarize_failure_types,
+)
+from utils_feature_store import export_feature_store, get_path_to_feature_store
+from utils_market_aggregates import (
+    add_car_to_aggregates,
+    get_path_to_aggregates,
+    initialize_or_import_aggregates,
+    save_aggregates,
+    update_car_in_aggregates,
+)
+from utils_page_watchdog import PageLoadTimeout
+from utils_price_model import train_price_model_after_crawl
+from utils_refresh import (
+    get_path_to_availability,
+    initialize_or_import_availability,
+    record_availability_check,
+    save_availability,
+)
+from utils_tracing import trace_span
+from utils_update_advertisment import (
+    car_is_uploaded_again,
+    update_price_of_car,
+    update_publication_datetime_of_car,
+)
+from utils_url_frontier import (
+    add_urls_to_frontier,
+    claim_batch,
+    collect_results,
+    commit_failure,
+    commit_result,
+    get_frontier_statistics,
+)
+from utils_website_interaction import (
+    accept_cookies,
+    close_information_banner_and_pop_ups,
+    expand_detailed_car_information_arcordeon,
+    fetch_links_of_result_webpage,
+    open_result_webpage,
+    open_webpage,
+)
+from utils_website_scraping import (
+    get_path_to_selector_statistics,
+    import_selector_statistics,
+    save_selector_statistics,
+    scrape_links_to_detailed_car_advertisement,
+    scrape_number_of_result_webpages,
+)
+
+
+def initialize_crawl(path_to_dataset, overwrite=True, alert_sink=None):
+    """Import or create the data set and the market aggregates of a crawl.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+    overwrite : boolean
+        data set shall be overwritten with the crawled data
+    alert_sink : str
+        url of webhook or path to JSON Lines file alerts are emitted to, the alerts
+        file next to the data set if None
+
+    Returns
+    -------
+    crawl : dict
+        state of crawl
+    """
+    used_car_data = initialize_or_import_dataset(path_to_dataset, overwrite)
+
+    path_to_aggregates = get_path_to_aggregates(path_to_dataset)
+    market_aggregates = initialize_or_import_aggregates(
+        path_to_aggregates, used_car_data, overwrite
+    )
+
+    path_to_selector_statistics = get_path_to_selector_statistics(path_to_dataset)
+    import_selector_statistics(path_to_selector_statistics)
+
+    path_to_dead_letter_queue = get_path_to_dead_letter_queue(path_to_dataset)
+    dead_letter_queue = initialize_or_import_dead_letter_queue(
+        path_to_dead_letter_queue
+    )
+
+    path_to_availability = get_path_to_availability(path_to_dataset)
+    availability = initialize_or_import_availability(path_to_availability)
+
+    alert_rules = initialize_or_import_alert_rules(
+        get_path_to_alert_rules(path_to_dataset)
+    )
+
+    path_to_car_names = get_path_to_car_names(path_to_dataset)
+    car_names = initialize_or_import_car_names(path_to_car_names)
+
+    return {
+        "path_to_dataset": path_to_dataset,
+        "path_to_aggregates": path_to_aggregates,
+        "path_to_selector_statistics": path_to_selector_statistics,
+        "path_to_dead_letter_queue": path_to_dead_letter_queue,
+        "path_to_availability": path_to_availability,
+        "path_to_car_names": path_to_car_names,
+        "overwrite": overwrite,
+        "used_car_data": used_car_data,
+        "market_aggregates": market_aggregates,
+        "dead_letter_queue": dead_letter_queue,
+        "availability": availability,
+        "car_names": car_names,
+        "reference_time": datetime.now(),
+        "alert_rule_index": build_alert_rule_index(alert_rules),
+        "alert_sink": alert_sink or get_path_to_alerts(path_to_dataset),
+        "change_feed": initialize_change_feed(path_to_dataset),
+    }
+
+
+def save_crawl(crawl):
+    """Save data set and the files kept next to it, e.g. market aggregates.
+
+    Nothing is saved if the data set shall not be overwritten.
+
+    Parameters
+    ----------
+    crawl : dict
+        state of crawl
+    """
+    if crawl["overwrite"]:
+        print("saving dataset.")
+        with trace_span("save", "save"):
+            # replace the data set at once, so readers like the query service never
+            # see a partially written file
+            crawl["used_car_data"].to_csv(crawl["path_to_dataset"] + ".tmp")
+            os.replace(crawl["path_to_dataset"] + ".tmp", crawl["path_to_dataset"])
+            flush_change_feed(crawl["change_feed"])
+            save_aggregates(crawl["market_aggregates"], crawl["path_to_aggregates"])
+            save_selector_statistics(crawl["path_to_selector_statistics"])
+            save_dead_letter_queue(
+                crawl["dead_letter_queue"], crawl["path_to_dead_letter_queue"]
+            )
+            save_availability(crawl["availability"], crawl["path_to_availability"])
+            save_car_names(crawl["car_names"], crawl["path_to_car_names"])
+
+
+def finish_crawl(crawl):
+    """Refresh price model, comparable car index and feature store after a crawl.
+
+    Parameters
+    ----------
+    crawl : dict
+        state of crawl
+    """
+    if crawl["overwrite"]:
+        print("refreshing price model.")
+        train_price_model_after_crawl(crawl["path_to_dataset"], crawl["used_car_data"])
+
+        print("refreshing comparable car index.")
+        update_comparable_car_index_after_crawl(
+            crawl["path_to_dataset"], crawl["used_car_data"]
+        )
+
+        print("exporting feature store.")
+        export_feature_store(
+            crawl["used_car_data"], get_path_to_feature_store(crawl["path_to_dataset"])
+        )
+
+
+def full_sweep_is_due(path_to_last_full_sweep, days_between_full_sweeps):
+    """Check if the last full crawl of all result webpages is too long ago.
+
+    Parameters
+    ----------
+    path_to_last_full_sweep : str
+        path to file containing datetime of last full crawl
+    days_between_full_sweeps : float
+        days after which all result webpages shall be crawled again
+
+    Returns
+    -------
+     : boolean
+        full crawl is due
+    """
+    if not exists(path_to_last_full_sweep):
+        return True
+
+    with open(path_to_last_full_sweep, encoding="utf-8") as file:
+        last_full_sweep = datetime.strptime(file.read().strip(), "%Y-%m-%d %H:%M:%S")
+
+    return datetime.now() - last_full_sweep >= timedelta(days=days_between_full_sweeps)
+
+
+def record_full_sweep(path_to_last_full_sweep):
+    """Record that all result webpages have been crawled now.
+
+    Parameters
+    ----------
+    path_to_last_full_sweep : str
+        path to file containing datetime of last full crawl
+    """
+    with open(path_to_last_full_sweep, "w", encoding="utf-8") as file:
+        file.write(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+
+def alert_on_car(crawl, event_type, car, previous_price_sek=None):
+    """Emit alerts of the rules matching a new car or a price change.
+
+    Parameters
+    ----------
+    crawl : dict
+        state of crawl
+    event_type : str
+        type of event, either "new" or "price_drop"
+    car : dict or pd.Series
+        data of car
+    previous_price_sek : int
+        price before a price change
+    """
+    if not crawl["alert_rule_index"]:
+        return
+
+    check_event_against_alert_rules(
+        crawl["alert_rule_index"],
+        create_car_event(event_type, car, previous_price_sek),
+        crawl["alert_sink"],
+    )
+
+
+def process_car_advertisement(
+    crawl, driver, link_to_car_advertisement, emit_alerts=True
+):
+    """Open a car advertisment and attach or update the car in the data set.
+
+    Parameters
+    ----------
+    crawl : dict
+        state of crawl
+    driver : selenium.Webdriver
+        webdriver for the webpages with car details
+    link_to_car_advertisement : str
+        url of car advertisment
+    emit_alerts : bool
+        whether alerts are emitted for a new or updated car
+
+    Returns
+    -------
+     : str
+        outcome, either "new", "updated", "known" or "failed". Failed car
+        advertisments, including those which exceeded the time budget of the page
+        load, are recorded in the dead-letter queue of the crawl.
+    """
+    try:
+        open_webpage(driver, link_to_car_advertisement)
+    except PageLoadTimeout as exception:
+        print(exception)
+        record_failed_extraction(
+            crawl["dead_letter_queue"], link_to_car_advertisement, exception
+        )
+        return "failed"
+    accept_cookies(driver)
+    close_information_banner_and_pop_ups(driver)
+
+    used_car_data = crawl["used_car_data"]
+    car_exists_idx = used_car_data.index[
+        used_car_data["url"].eq(link_to_car_advertisement)
+    ]
+    if len(car_exists_idx):
+        record_availability_check(
+            crawl["availability"], link_to_car_advertisement, True
+        )
+
+        if car_is_uploaded_again(
+            used_car_data.loc[car_exists_idx], driver, crawl["reference_time"]
+        ):
+            car_before_update = used_car_data.loc[car_exists_idx].copy()
+
+            used_car_data.loc[car_exists_idx] = update_publication_datetime_of_car(
+                used_car_data.loc[car_exists_idx], driver, crawl["reference_time"]
+            )
+
+            used_car_data.loc[car_exists_idx] = update_price_of_car(
+                used_car_data.loc[car_exists_idx], driver
+            )
+
+            update_car_in_aggregates(
+                crawl["market_aggregates"],
+                car_before_update,
+                used_car_data.loc[car_exists_idx],
+            )
+            record_update(
+                crawl["change_feed"],
+                car_before_update.iloc[-1],
+                used_car_data.loc[car_exists_idx].iloc[-1],
+            )
+            if emit_alerts:
+                alert_on_car(
+                    crawl,
+                    "price_drop",
+                    used_car_data.loc[car_exists_idx].iloc[-1],
+                    car_before_update["price_sek"].iloc[-1],
+                )
+
+            return "updated"
+
+        else:
+            return "known"
+
+    expand_detailed_car_information_arcordeon(driver)
+
+    try:
+        car_characteristics = extract_car_characteristics(
+            driver, crawl["reference_time"]
+        )
+    except Exception as exception:
+        record_failed_extraction(
+            crawl["dead_letter_queue"], link_to_car_advertisement, exception
+        )
+        return "failed"
+
+    with trace_span("attach car", "normalize"):
+        car_characteristics = canonicalize_car_characteristics(
+            crawl["car_names"], car_characteristics
+        )
+        crawl["used_car_data"] = attach_new_used_car(
+            used_car_data, car_characteristics, link_to_car_advertisement
+        )
+        add_car_to_aggregates(
+            crawl["market_aggregates"], crawl["used_car_data"].iloc[-1]
+        )
+    record_insert(crawl["change_feed"], crawl["used_car_data"].iloc[-1])
+    if emit_alerts:
+        alert_on_car(crawl, "new", crawl["used_car_data"].iloc[-1])
+    remove_from_dead_letter_queue(crawl["dead_letter_queue"], link_to_car_advertisement)
+    record_availability_check(crawl["availability"], link_to_car_advertisement, True)
+
+    return "new"
+
+
+def retry_failed_car_advertisements(crawl, driver_detailed_car):
+    """Process the car advertisments of the dead-letter queue whose backoff expired.
+
+    Parameters
+    ----------
+    crawl : dict
+        state of crawl
+    driver_detailed_car : selenium.Webdriver
+        webdriver for the webpages with car details
+
+    Returns
+    -------
+    outcomes : dict
+        number of retried car advertisments per outcome of `process_car_advertisement`
+    """
+    print("failure types in dead-letter queue:")
+    for exception_type, number in summarize_failure_types(crawl["dead_letter_queue"]):
+        print(f"    {exception_type}: {number}")
+
+    urls = get_urls_due_for_retry(crawl["dead_letter_queue"])
+    print(f"retrying {len(urls)} failed car advertisment(s).")
+
+    outcomes = {"new": 0, "updated": 0, "known": 0, "failed": 0}
+    for url in urls:
+        outcome = process_car_advertisement(crawl, driver_detailed_car, url)
+        outcomes[outcome] = outcomes[outcome] + 1
+        if outcome != "failed":
+            remove_from_dead_letter_queue(crawl["dead_letter_queue"], url)
+
+    save_crawl(crawl)
+    print(
+        f"{outcomes['failed']} of {len(urls)} car advertisment(s) failed again,",
+        f"{len(crawl['dead_letter_queue'])} remain in dead-letter queue.",
+    )
+
+    return outcomes
+
+
+def crawl_result_webpage(crawl, driver_detailed_car, all_links_to_car_advertisements):
+    """Process all car advertisments listed on a result webpage.
+
+    Parameters
+    ----------
+    crawl : dict
+        state of crawl
+    driver_detailed_car : selenium.Webdriver
+        webdriver for the webpages with car details
+    all_links_to_car_advertisements : list
+        links to car advertisments of result webpage
+
+    Returns
+    -------
+    outcomes : dict
+        number of car advertisments per outcome of `process_car_advertisement`
+    """
+    outcomes = {"new": 0, "updated": 0, "known": 0, "failed": 0}
+
+    for link_to_car_advertisement in all_links_to_car_advertisements:
+        with trace_span(
+            "car advertisement", "car_advertisement", url=link_to_car_advertisement
+        ) as span_arguments:
+            outcome = process_car_advertisement(
+                crawl, driver_detailed_car, link_to_car_advertisement
+            )
+            span_arguments["outcome"] = outcome
+        outcomes[outcome] = outcomes[outcome] + 1
+
+        if outcome == "known":
+            print(f"{outcomes['known']} car(s) already exist in data set.")
+
+    return outcomes
+
+
+def crawl_search_query(
+    crawl,
+    driver_search_result_overview,
+    driver_detailed_car,
+    urlpage,
+    maximum_number_of_pages=None,
+    number_of_known_pages_to_stop=None,
+    first_result_webpage=1,
+):
+    """Crawl the result webpages of a search query.
+
+    Result webpages are opened directly by their url. While the car advertisments of
+    a result webpage are processed, the links of the next result webpage are fetched
+    in the background with the otherwise idle driver of the result webpages.
+
+    As results are sorted newest first, an incremental crawl can stop paging once
+    several consecutive result webpages contain only cars which already exist in the
+    data set and have not been uploaded again.
+
+    Parameters
+    ----------
+    crawl : dict
+        state of crawl
+    driver_search_result_overview : selenium.Webdriver
+        webdriver for the result webpages
+    driver_detailed_car : selenium.Webdriver
+        webdriver for the webpages with car details
+    urlpage : str
+        url of first result webpage of search query
+    maximum_number_of_pages : int
+        maximum number of result webpages which are crawled, all if None
+    number_of_known_pages_to_stop : int
+        number of consecutive result webpages with only known and unchanged cars
+        after which the crawl stops, never stops early if None
+    first_result_webpage : int
+        number of result webpage the crawl starts at
+
+    Returns
+    -------
+    statistics : dict
+        number of crawled pages, car advertisments per outcome and duration in s
+    """
+    start = time.perf_counter()
+
+    statistics = {"pages": 0, "new": 0, "updated": 0, "known": 0, "failed": 0}
+    print("opening webpage.")
+    try:
+        open_result_webpage(
+            driver_search_result_overview, urlpage, first_result_webpage
+        )
+    except PageLoadTimeout as exception:
+        print(f"{exception} Skipping search query.")
+        statistics["duration_s"] = time.perf_counter() - start
+        return statistics
+
+    last_result_webpage = scrape_number_of_result_webpages(
+        driver_search_result_overview
+    )
+    if maximum_number_of_pages is not None:
+        last_result_webpage = min(
+            last_result_webpage, first_result_webpage + maximum_number_of_pages - 1
+        )
+
+    all_links_to_car_advertisements = scrape_links_to_detailed_car_advertisement(
+        driver_search_result_overview
+    )
+
+    number_of_consecutive_known_pages = 0
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        for result_webpage in range(first_result_webpage, last_result_webpage + 1):
+            print(f"scraping webpage {result_webpage}.")
+
+            links_of_next_result_webpage = None
+            if result_webpage < last_result_webpage:
+                links_of_next_result_webpage = prefetcher.submit(
+                    fetch_links_of_result_webpage,
+                    driver_search_result_overview,
+                    urlpage,
+                    result_webpage + 1,
+                )
+
+            outcomes = crawl_result_webpage(
+                crawl, driver_detailed_car, all_links_to_car_advertisements
+            )
+            statistics["pages"] = statistics["pages"] + 1
+            for outcome, number in outcomes.items():
+                statistics[outcome] = statistics[outcome] + number
+
+            save_crawl(crawl)
+
+            if outcomes["known"] and outcomes["known"] == sum(outcomes.values()):
+                number_of_consecutive_known_pages = (
+                    number_of_consecutive_known_pages + 1
+                )
+            else:
+                number_of_consecutive_known_pages = 0
+
+            if (
+                number_of_known_pages_to_stop is not None
+                and number_of_consecutive_known_pages >= number_of_known_pages_to_stop
+            ):
+                print(
+                    f"stopping after {number_of_consecutive_known_pages} webpage(s)",
+                    "with only known cars.",
+                )
+                break
+
+            if links_of_next_result_webpage is not None:
+                try:
+                    all_links_to_car_advertisements = (
+                        links_of_next_result_webpage.result()
+                    )
+                except Exception as exception:
+                    # a failed prefetch, e.g. by a timeout or a crashed browser,
+                    # costs one result webpage, not the rest of the search query
+                    print(
+                        f"{type(exception).__name__}: {exception}",
+                        f"Skipping webpage {result_webpage + 1}.",
+                    )
+                    all_links_to_car_advertisements = []
+
+    statistics["duration_s"] = time.perf_counter() - start
+
+    return statistics
+
+
+def get_car_of_url(crawl, url):
+    """Get data of car with given url from data set of crawl.
+
+    Parameters
+    ----------
+    crawl : dict
+        state of crawl
+    url : str
+        url of car advertisment
+
+    Returns
+    -------
+     : dict
+        data of car, None if url is not in data set
+    """
+    used_car_data = crawl["used_car_data"]
+    car = used_car_data[used_car_data["url"].eq(url)]
+    if not len(car):
+        return None
+
+    return car.iloc[-1].to_dict()
+
+
+def apply_car_to_crawl(crawl, car):
+    """Attach a new car or replace an existing car in the data set of a crawl.
+
+    Parameters
+    ----------
+    crawl : dict
+        state of crawl
+    car : dict
+        data of car as processed by another worker
+    """
+    car = dict(car)
+    car["publication_datetime"] = pd.to_datetime(car["publication_datetime"])
+
+    used_car_data = crawl["used_car_data"]
+    car_exists_idx = used_car_data.index[used_car_data["url"].eq(car["url"])]
+    if len(car_exists_idx):
+        car_before_update = used_car_data.loc[car_exists_idx].copy()
+        for column, value in car.items():
+            used_car_data.loc[car_exists_idx, column] = value
+        update_car_in_aggregates(
+            crawl["market_aggregates"],
+            car_before_update,
+            used_car_data.loc[car_exists_idx],
+        )
+        record_update(
+            crawl["change_feed"],
+            car_before_update.iloc[-1],
+            used_car_data.loc[car_exists_idx].iloc[-1],
+        )
+        alert_on_car(
+            crawl,
+            "price_drop",
+            used_car_data.loc[car_exists_idx].iloc[-1],
+            car_before_update["price_sek"].iloc[-1],
+        )
+    else:
+        crawl["used_car_data"] = pd.concat(
+            [used_car_data, pd.DataFrame([car])], axis=0, ignore_index=True
+        )
+        add_car_to_aggregates(crawl["market_aggregates"], car)
+        record_insert(crawl["change_feed"], crawl["used_car_data"].iloc[-1])
+        alert_on_car(crawl, "new", car)
+
+
+def get_worker_id():
+    """Get id of this worker, which is unique over all hosts.
+
+    Returns
+    -------
+     : str
+        host name and process id
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_frontier_worker(
+    crawl, connection, driver_detailed_car, batch_size=20, worker_id=None
+):
+    """Claim batches of links from the frontier, process them and commit the results.
+
+    The worker uses the data set of the crawl to recognize known cars, but does not
+    save it. New and updated cars are committed to the frontier and applied to the
+    data set by `collect_frontier_results`.
+
+    Parameters
+    ----------
+    crawl : dict
+        state of crawl
+    connection : sqlite3.Connection
+        connection to frontier
+    driver_detailed_car : selenium.Webdriver
+        webdriver for the webpages with car details
+    batch_size : int
+        number of links which are claimed at once
+    worker_id : str
+        unique id of worker, derived from host name and process id if None
+
+    Returns
+    -------
+    outcomes : dict
+        number of processed car advertisments per outcome
+    """
+    worker_id = worker_id or get_worker_id()
+    outcomes = {"new": 0, "updated": 0, "known": 0, "failed": 0, "lost_lease": 0}
+
+    urls = claim_batch(connection, worker_id, batch_size)
+    while urls:
+        for url in urls:
+            # alerts are emitted once, when the result is collected
+            outcome = process_car_advertisement(
+                crawl, driver_detailed_car, url, emit_alerts=False
+            )
+
+            if outcome == "failed":
+                committed = commit_failure(
+                    connection,
+                    worker_id,
+                    url,
+                    crawl["dead_letter_queue"][url]["exception_type"],
+                )
+            else:
+                car = get_car_of_url(crawl, url) if outcome != "known" else None
+                committed = commit_result(connection, worker_id, url, outcome, car)
+
+            if not committed:
+                print(f"lease on {url} expired, result is discarded.")
+                outcome = "lost_lease"
+            outcomes[outcome] = outcomes[outcome] + 1
+
+        urls = claim_batch(connection, worker_id, batch_size)
+
+    print(f"worker {worker_id} is done: {outcomes}")
+
+    return outcomes
+
+
+def collect_frontier_results(crawl, connection):
+    """Apply all results committed to the frontier to the data set of the crawl.
+
+    Parameters
+    ----------
+    crawl : dict
+        state of crawl
+    connection : sqlite3.Connection
+        connection to frontier
+
+    Returns
+    -------
+     : int
+        number of applied new or updated cars
+    """
+    results = collect_results(connection)
+    cars = [car for _, outcome, car in results if outcome in ["new", "updated"]]
+    for car in cars:
+        apply_car_to_crawl(crawl, car)
+
+    save_crawl(crawl)
+    print(
+        f"applied {len(cars)} new or updated car(s) from frontier,",
+        f"status of frontier: {get_frontier_statistics(connection)}",
+    )
+
+    return len(cars)
+
+
+def discover_car_advertisements(
+    connection, driver_search_result_overview, urlpage, maximum_number_of_pages=None
+):
+    """Add the links of all result webpages of a search query to the frontier.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        connection to frontier
+    driver_search_result_overview : selenium.Webdriver
+        webdriver for the result webpages
+    urlpage : str
+        url of first result webpage of search query
+    maximum_number_of_pages : int
+        maximum number of result webpages, all if None
+
+    Returns
+    -------
+    number_of_added_urls : int
+        number of links which have been added or requeued
+    """
+    open_result_webpage(driver_search_result_overview, urlpage, 1)
+    number_of_result_webpages = scrape_number_of_result_webpages(
+        driver_search_result_overview
+    )
+    if maximum_number_of_pages is not None:
+        number_of_result_webpages = min(
+            number_of_result_webpages, maximum_number_of_pages
+        )
+
+    number_of_added_urls = 0
+    for result_webpage in range(1, number_of_result_webpages + 1):
+        print(f"discovering links on webpage {result_webpage}.")
+        try:
+            links = fetch_links_of_result_webpage(
+                driver_search_result_overview, urlpage, result_webpage
+            )
+        except PageLoadTimeout as exception:
+            print(f"{exception} Skipping webpage {result_webpage}.")
+            continue
+        number_of_added_urls = number_of_added_urls + add_urls_to_frontier(
+            connection, links, requeue_completed=True
+        )
+
+    return number_of_added_urls
@@ -0,0 +1,192 @@
+"""Utility functions for crawling repeatedly in a long-running daemon.
+
+A single crawl pays for starting the browsers and importing the data set before the
+first car advertisment is processed. The daemon keeps the state of the crawl and the
+browsers resident and runs an incremental crawl on a fixed interval instead.
+
+Browsers accumulate memory over time. Each browser of the daemon is therefore quit
+and opened again once it has loaded a number of pages or uses more memory than a
+limit. Measuring the memory requires the optional dependency psutil.
+"""
+import time
+from datetime import datetime
+
+from utils_alerts import (
+    build_alert_rule_index,
+    get_path_to_alert_rules,
+    initialize_or_import_alert_rules,
+)
+from utils_change_feed import create_run_id
+
+DEFAULT_INTERVAL_MINUTES = 60
+
+# browsers are recycled after loading this number of pages or above this memory
+DEFAULT_PAGES_BEFORE_RECYCLING = 500
+DEFAULT_MEMORY_LIMIT_MB = 2000
+
+# number of page loads between two measurements of the memory of a browser
+PAGES_BETWEEN_MEMORY_CHECKS = 10
+
+
+def get_browser_memory_mb(driver):
+    """Measure the memory used by the browser of a webdriver and its child processes.
+
+    Parameters
+    ----------
+    driver : selenium.Webdriver
+        webdriver of Firefox
+
+    Returns
+    -------
+     : float
+        resident memory in MB, None if it cannot be measured, e.g. without psutil
+    """
+    try:
+        import psutil
+    except ImportError:
+        return None
+
+    process_id = getattr(driver, "capabilities", {}).get("moz:processID")
+    if process_id is None:
+        return None
+
+    try:
+        browser = psutil.Process(process_id)
+        processes = [browser, *browser.children(recursive=True)]
+        return sum(process.memory_info().rss for process in processes) / 2**20
+    except psutil.Error:
+        return None
+
+
+class PooledDriver:
+    """Webdriver which is kept open between crawls and recycled when worn out.
+
+    Before a page is loaded, the wrapped webdriver is quit and opened again if it has
+    loaded `pages_before_recycling` pages or its browser uses more than
+    `memory_limit_mb`. All other attributes are passed through to the wrapped
+    webdriver.
+    """
+
+    def __init__(
+        self,
+        open_driver,
+        pages_before_recycling=DEFAULT_PAGES_BEFORE_RECYCLING,
+        memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB,
+    ):
+        self.open_driver = open_driver
+        self.pages_before_recycling = pages_before_recycling
+        self.memory_limit_mb = memory_limit_mb
+        self.driver = open_driver()
+        self.number_of_pages = 0
+        self.number_of_recycles = 0
+
+    def __getattr__(self, name):
+        """Pass attribute through to the wrapped webdriver."""
+        return getattr(self.driver, name)
+
+    def driver_is_worn_out(self):
+        """Check whether the wrapped webdriver has to be recycled.
+
+        Returns
+        -------
+         : boolean
+            page or memory limit has been exceeded
+        """
+        if (
+            self.pages_before_recycling is not None
+            and self.number_of_pages >= self.pages_before_recycling
+        ):
+            return True
+
+        if (
+            self.memory_limit_mb is not None
+            and self.number_of_pages % PAGES_BETWEEN_MEMORY_CHECKS == 0
+        ):
+            memory_mb = get_browser_memory_mb(self.driver)
+            return memory_mb is not None and memory_mb > self.memory_limit_mb
+
+        return False
+
+    def recycle(self):
+        """Quit the wrapped webdriver and open a new one with the same implicit wait."""
+        implicit_wait = self.driver.timeouts.implicit_wait
+        self.driver.quit()
+        self.driver = self.open_driver()
+        self.driver.implicitly_wait(implicit_wait)
+        self.number_of_pages = 0
+        self.number_of_recycles = self.number_of_recycles + 1
+
+    def get(self, url):
+        """Load a page, recycling the wrapped webdriver before if it is worn out."""
+        if self.number_of_pages and self.driver_is_worn_out():
+            print(f"recycling browser after {self.number_of_pages} page(s).")
+            self.recycle()
+
+        self.number_of_pages = self.number_of_pages + 1
+        self.driver.get(url)
+
+
+def prepare_crawl_run(crawl):
+    """Prepare the resident state of a crawl for the next run of the daemon.
+
+    Relative publication times are resolved against the start of the run, alert
+    rules added since the last run are loaded and the changes of the run get their
+    own run id.
+
+    Parameters
+    ----------
+    crawl : dict
+        state of crawl
+    """
+    crawl["reference_time"] = datetime.now()
+    crawl["change_feed"]["run_id"] = create_run_id()
+    crawl["alert_rule_index"] = build_alert_rule_index(
+        initialize_or_import_alert_rules(
+            get_path_to_alert_rules(crawl["path_to_dataset"])
+        )
+    )
+
+
+def run_crawl_daemon(
+    crawl, run_crawl, interval_minutes=DEFAULT_INTERVAL_MINUTES, number_of_runs=None
+):
+    """Run crawls on a fixed interval with the same state of crawl and browsers.
+
+    A run which takes longer than the interval is followed by the next run right
+    away. The daemon stops after `number_of_runs` or when it is interrupted.
+
+    Parameters
+    ----------
+    crawl : dict
+        state of crawl
+    run_crawl : callable
+        function running one crawl with the state of crawl as argument
+    interval_minutes : float
+        minutes between the starts of two runs
+    number_of_runs : int
+        number of runs, runs until interrupted if None
+
+    Returns
+    -------
+    run : int
+        number of finished runs
+    """
+    run = 0
+    try:
+        while number_of_runs is None or run < number_of_runs:
+            start = time.monotonic()
+            prepare_crawl_run(crawl)
+            run_crawl(crawl)
+            run = run + 1
+            print(f"crawl run {run} finished in {time.monotonic() - start:.1f} s.")
+
+            if number_of_runs is not None and run >= number_of_runs:
+                break
+            time_to_next_run = start + interval_minutes * 60 - time.monotonic()
+            if time_to_next_run > 0:
+                print(f"next crawl run in {time_to_next_run / 60:.1f} minute(s).")
+                time.sleep(time_to_next_run)
+    except KeyboardInterrupt:
+        print("stopping crawl daemon.")
+
+    return run
@@ -0,0 +1,325 @@
+"""Utility functions for scheduling crawls of several search queries.
+
+Each search query (e.g. one per brand, price band or region) is a market segment.
+The churn rate of a segment, i.e. how many new and updated car advertisments are
+found per hour, is estimated from recent crawls. The result webpages a scheduled
+crawl may visit are then split between the segments in proportion to the number of
+changes expected since each segment was last crawled.
+"""
+import json
+import os
+from datetime import datetime
+from os.path import exists
+
+from utils_crawl import crawl_search_query
+
+# weight of the most recent crawl in the exponentially smoothed churn rate
+CHURN_RATE_SMOOTHING = 0.3
+
+# churn rate assumed for search queries which have never been crawled, in changed
+# car advertisments per hour. It is high, so new queries are crawled right away.
+INITIAL_CHURN_RATE = 100.0
+
+# number of car advertisments on a result webpage
+CARS_PER_RESULT_WEBPAGE = 40
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def load_search_queries(path_to_search_queries):
+    """Load search queries from a JSON file.
+
+    The file contains a list of search queries, each with a unique "name" and the
+    "url" of its first result webpage.
+
+    Parameters
+    ----------
+    path_to_search_queries : str
+        path to JSON file
+
+    Returns
+    -------
+    search_queries : list
+        search queries
+    """
+    with open(path_to_search_queries, encoding="utf-8") as file:
+        search_queries = json.load(file)
+
+    names = [search_query["name"] for search_query in search_queries]
+    if len(names) != len(set(names)):
+        raise ValueError("Names of search queries must be unique.")
+
+    return search_queries
+
+
+def initialize_or_import_schedule(path_to_schedule):
+    """Import the churn estimates of previous crawls or create an empty schedule.
+
+    Parameters
+    ----------
+    path_to_schedule : str
+        path to JSON file of schedule
+
+    Returns
+    -------
+    schedule : dict
+        churn estimate and last crawl per search query name
+    """
+    if exists(path_to_schedule):
+        print(f"Importing crawl schedule: {path_to_schedule}")
+        with open(path_to_schedule, encoding="utf-8") as file:
+            schedule = json.load(file)
+    else:
+        print(f"Creating new crawl schedule at: {path_to_schedule}")
+        schedule = {}
+
+    return schedule
+
+
+def save_schedule(schedule, path_to_schedule):
+    """Save schedule to file.
+
+    Parameters
+    ----------
+    schedule : dict
+        churn estimate and last crawl per search query name
+    path_to_schedule : str
+        path to JSON file of schedule
+    """
+    with open(path_to_schedule + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(schedule, file, indent=2)
+    os.replace(path_to_schedule + ".tmp", path_to_schedule)
+
+
+def estimate_expected_changes(segment, now):
+    """Estimate number of changed car advertisments since segment was last crawled.
+
+    Parameters
+    ----------
+    segment : dict
+        churn estimate and last crawl of search query, None if never crawled
+    now : datetime
+        time of scheduled crawl
+
+    Returns
+    -------
+     : float
+        expected number of new and updated car advertisments
+    """
+    if segment is None:
+        return INITIAL_CHURN_RATE * 24
+
+    last_crawl = datetime.strptime(segment["last_crawl"], DATETIME_FORMAT)
+    hours_since_last_crawl = max((now - last_crawl).total_seconds() / 3600, 0)
+
+    return segment["churn_rate_per_hour"] * hours_since_last_crawl
+
+
+def split_by_largest_remainder(number_of_pages, weights):
+    """Split pages in proportion to weights, so the parts sum up to the pages.
+
+    Each part gets the integer part of its share, the pages left over go to the
+    parts with the largest fractional parts of their shares.
+
+    Parameters
+    ----------
+    number_of_pages : int
+        number of pages which are split
+    weights : dict
+        positive weight per name
+
+    Returns
+    -------
+    pages : dict
+        number of pages per name
+    """
+    total_weight = sum(weights.values())
+    shares = {
+        name: number_of_pages * weight / total_weight
+        for name, weight in weights.items()
+    }
+    pages = {name: int(share) for name, share in shares.items()}
+    left_over_pages = number_of_pages - sum(pages.values())
+    for name in sorted(
+        shares, key=lambda name: shares[name] - pages[name], reverse=True
+    )[:left_over_pages]:
+        pages[name] = pages[name] + 1
+
+    return pages
+
+
+def allocate_result_webpages(schedule, search_queries, page_budget, now=None):
+    """Split the result webpages of a crawl between the search queries.
+
+    Each search query gets at least one result webpage, the rest of the budget is
+    allocated in proportion to the expected changes since its last crawl. As results
+    are sorted newest first, the first pages of a query contain these changes.
+
+    The allocated result webpages sum up to the budget, unless the expected changes
+    of all search queries fit into fewer pages. If the budget is smaller than the
+    number of search queries, only the ones with the highest priority are crawled.
+
+    Parameters
+    ----------
+    schedule : dict
+        churn estimate and last crawl per search query name
+    search_queries : list
+        search queries
+    page_budget : int
+        total number of result webpages the crawl may visit, no limit if None
+    now : datetime
+        time of scheduled crawl, now if None
+
+    Returns
+    -------
+    allocated_pages : dict
+        number of result webpages per search query name, sorted by priority, None
+        stands for all result webpages
+    """
+    now = now or datetime.now()
+    expected_changes = {
+        search_query["name"]: estimate_expected_changes(
+            schedule.get(search_query["name"]), now
+        )
+        for search_query in search_queries
+    }
+
+    priority = sorted(expected_changes, key=expected_changes.get, reverse=True)
+    if page_budget is None:
+        return {name: None for name in priority}
+
+    allocated_pages = {name: 1 for name in priority[:page_budget]}
+    remaining_budget = page_budget - len(allocated_pages)
+    # more pages than needed to cover the expected changes are not allocated
+    maximum_additional_pages = {
+        name: int(expected_changes[name] // CARS_PER_RESULT_WEBPAGE)
+        for name in allocated_pages
+    }
+    while remaining_budget > 0:
+        weights = {
+            name: expected_changes[name]
+            for name in allocated_pages
+            if expected_changes[name] > 0
+            and allocated_pages[name] - 1 < maximum_additional_pages[name]
+        }
+        if not weights:
+            break
+
+        # pages beyond the maximum of a query are split again between the others
+        for name, pages in split_by_largest_remainder(
+            remaining_budget, weights
+        ).items():
+            pages = min(
+                pages, maximum_additional_pages[name] + 1 - allocated_pages[name]
+            )
+            allocated_pages[name] = allocated_pages[name] + pages
+            remaining_budget = remaining_budget - pages
+
+    return allocated_pages
+
+
+def update_churn_estimate(schedule, search_query_name, statistics, now=None):
+    """Update churn rate of search query with the statistics of its last crawl.
+
+    Parameters
+    ----------
+    schedule : dict
+        churn estimate and last crawl per search query name
+    search_query_name : str
+        name of search query
+    statistics : dict
+        statistics of crawl as returned by `crawl_search_query`
+    now : datetime
+        time of crawl, now if None
+    """
+    now = now or datetime.now()
+    number_of_changes = statistics["new"] + statistics["updated"]
+    segment = schedule.get(search_query_name)
+
+    if segment is None:
+        # without a previous crawl, changes cannot be related to a period of time.
+        # Assume they piled up during the last day.
+        churn_rate = number_of_changes / 24
+    else:
+        last_crawl = datetime.strptime(segment["last_crawl"], DATETIME_FORMAT)
+        hours_since_last_crawl = max((now - last_crawl).total_seconds() / 3600, 1 / 60)
+        observed_churn_rate = number_of_changes / hours_since_last_crawl
+        churn_rate = (
+            CHURN_RATE_SMOOTHING * observed_churn_rate
+            + (1 - CHURN_RATE_SMOOTHING) * segment["churn_rate_per_hour"]
+        )
+
+    schedule[search_query_name] = {
+        "churn_rate_per_hour": churn_rate,
+        "last_crawl": now.strftime(DATETIME_FORMAT),
+        "last_statistics": statistics,
+    }
+
+
+def run_scheduled_crawl(
+    crawl,
+    driver_search_result_overview,
+    driver_detailed_car,
+    search_queries,
+    schedule,
+    page_budget,
+    number_of_known_pages_to_stop=None,
+):
+    """Crawl all search queries with the result webpages allocated by churn rate.
+
+    Parameters
+    ----------
+    crawl : dict
+        state of crawl
+    driver_search_result_overview : selenium.Webdriver
+        webdriver for the result webpages
+    driver_detailed_car : selenium.Webdriver
+        webdriver for the webpages with car details
+    search_queries : list
+        search queries
+    schedule : dict
+        churn estimate and last crawl per search query name
+    page_budget : int
+        total number of result webpages the crawl may visit, no limit if None
+    number_of_known_pages_to_stop : int
+        number of consecutive result webpages with only known and unchanged cars
+        after which the crawl of a search query stops, never stops early if None
+
+    Returns
+    -------
+    schedule : dict
+        updated schedule
+    """
+    urls = {
+        search_query["name"]: search_query["url"] for search_query in search_queries
+    }
+    allocated_pages = allocate_result_webpages(schedule, search_queries, page_budget)
+
+    for name, maximum_number_of_pages in allocated_pages.items():
+        print(f"crawling search query {name}.")
+        statistics = crawl_search_query(
+            crawl,
+            driver_search_result_overview,
+            driver_detailed_car,
+            urls[name],
+            maximum_number_of_pages,
+            number_of_known_pages_to_stop,
+        )
+        # a search query whose first result webpage could not be loaded has not
+        # been crawled, so its churn estimate and last crawl are kept
+        if not statistics["pages"]:
+            continue
+
+        update_churn_estimate(schedule, name, statistics)
+
+        changes_per_browser_hour = (
+            (statistics["new"] + statistics["updated"])
+            / max(statistics["duration_s"], 1)
+            * 3600
+        )
+        print(
+            f"{statistics['new']} new and {statistics['updated']} updated car(s),",
+            f"{changes_per_browser_hour:.0f} changes per browser-hour.",
+        )
+
+    return schedule
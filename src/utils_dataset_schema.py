@@ -0,0 +1,49 @@
+"""Columns and data types of the used car data set.
+
+They are kept apart from the extraction of car characteristics, so the data set can
+be read without importing the browser stack.
+"""
+
+DATASET_COLUMNS = [
+    "publication_datetime",
+    "publication_history",
+    "location",
+    "provider",
+    "manufacturer",
+    "model",
+    "note",
+    "price_sek",
+    "price_history",
+    "entry_year",
+    "fuel",
+    "mileage_km",
+    "transmission",
+    "type_of_drive",
+    "horse_power",
+    "engine_size_ccm",
+    "top_speed_km_h",
+    "emission_class",
+    "co2_emission_g/km",
+    "test_prozedure",
+    "fuel_consumption_mixed_l_100km",
+    "fuel_consumption_highway_l_100km",
+    "electric_range_km",
+    "number_of_seats",
+    "car_type",
+    "length_mm",
+    "width_mm",
+    "height_mm",
+    "load_capacity_kg",
+    "empty_weight_kg",
+    "total_weight_kg",
+    "url",
+]
+
+# data types of columns which cannot be inferred reliably when importing the data set
+DATASET_DTYPES = {
+    "publication_history": str,
+    "price_sek": "Int64",
+    "price_history": str,
+    "entry_year": "Int64",
+    "mileage_km": "Int64",
+}
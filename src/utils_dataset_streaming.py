@@ -0,0 +1,242 @@
+"""Utility functions for out-of-core iteration and aggregation over the data set.
+
+The data set is read in typed chunks of bounded size instead of importing the whole
+file at once. The aggregation helpers compute partial results per chunk and combine
+them, so reports and exports run in bounded memory regardless of the size of the
+data set.
+"""
+import pandas as pd
+
+from utils_dataset_schema import DATASET_DTYPES
+from utils_market_aggregates import add_value_to_sketch, estimate_quantile
+
+DEFAULT_CHUNKSIZE = 10000
+
+
+def iter_dataset_chunks(path_to_dataset, chunksize=DEFAULT_CHUNKSIZE, columns=None):
+    """Iterate over the data set in typed chunks.
+
+    The chunks are typed like the data set imported by `initialize_or_import_dataset`.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+    chunksize : int
+        maximum number of rows per chunk
+    columns : list
+        columns which are read, all columns are read if None
+
+    Yields
+    ------
+    chunk : DataFrame
+        chunk of data set
+    """
+    if columns is not None:
+
+        def usecols(column):
+            # the first, unnamed column of the file is the index written by `to_csv`
+            return column in columns or column.startswith("Unnamed")
+
+        dtype = {key: value for key, value in DATASET_DTYPES.items() if key in columns}
+        parse_dates = (
+            ["publication_datetime"] if "publication_datetime" in columns else False
+        )
+    else:
+        usecols = None
+        dtype = DATASET_DTYPES
+        parse_dates = ["publication_datetime"]
+
+    with pd.read_csv(
+        path_to_dataset,
+        index_col=0,
+        usecols=usecols,
+        dtype=dtype,
+        parse_dates=parse_dates,
+        chunksize=chunksize,
+    ) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def iter_dataset_records(path_to_dataset, chunksize=DEFAULT_CHUNKSIZE, columns=None):
+    """Iterate over the data set car by car.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+    chunksize : int
+        number of rows which are read at once
+    columns : list
+        columns which are read, all columns are read if None
+
+    Yields
+    ------
+    car : dict
+        data of car
+    """
+    for chunk in iter_dataset_chunks(path_to_dataset, chunksize, columns):
+        yield from chunk.to_dict(orient="records")
+
+
+def count_dataset_rows(path_to_dataset, chunksize=DEFAULT_CHUNKSIZE):
+    """Count the rows of the data set without importing it.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+    chunksize : int
+        number of rows which are read at once
+
+    Returns
+    -------
+     : int
+        number of rows
+    """
+    return sum(
+        len(chunk)
+        for chunk in iter_dataset_chunks(path_to_dataset, chunksize, columns=["url"])
+    )
+
+
+def chunked_groupby_sum(chunks, by, column):
+    """Sum column per group over all chunks.
+
+    Parameters
+    ----------
+    chunks : iterable
+        chunks of data set, e.g. from `iter_dataset_chunks`
+    by : str or list
+        grouping columns
+    column : str
+        summed column
+
+    Returns
+    -------
+    total : pd.Series
+        sum per group
+    """
+    total = None
+    for chunk in chunks:
+        partial_sum = chunk.groupby(by)[column].sum()
+        total = partial_sum if total is None else total.add(partial_sum, fill_value=0)
+
+    return total if total is not None else pd.Series(dtype=float, name=column)
+
+
+def chunked_groupby_count(chunks, by, column=None):
+    """Count rows, or non-missing values of a column, per group over all chunks.
+
+    Parameters
+    ----------
+    chunks : iterable
+        chunks of data set, e.g. from `iter_dataset_chunks`
+    by : str or list
+        grouping columns
+    column : str
+        column whose non-missing values are counted, rows are counted if None
+
+    Returns
+    -------
+    total : pd.Series
+        count per group
+    """
+    total = None
+    for chunk in chunks:
+        if column is None:
+            partial_count = chunk.groupby(by).size()
+        else:
+            partial_count = chunk.groupby(by)[column].count()
+        total = (
+            partial_count if total is None else total.add(partial_count, fill_value=0)
+        )
+
+    if total is None:
+        return pd.Series(dtype=int)
+
+    return total.astype(int)
+
+
+def chunked_groupby_mean(chunks, by, column):
+    """Calculate mean of column per group over all chunks.
+
+    Parameters
+    ----------
+    chunks : iterable
+        chunks of data set, e.g. from `iter_dataset_chunks`
+    by : str or list
+        grouping columns
+    column : str
+        averaged column
+
+    Returns
+    -------
+     : pd.Series
+        mean per group
+    """
+    total_sum = None
+    total_count = None
+    for chunk in chunks:
+        grouped_column = chunk.groupby(by)[column]
+        partial_sum = grouped_column.sum()
+        partial_count = grouped_column.count()
+        if total_sum is None:
+            total_sum, total_count = partial_sum, partial_count
+        else:
+            total_sum = total_sum.add(partial_sum, fill_value=0)
+            total_count = total_count.add(partial_count, fill_value=0)
+
+    if total_sum is None:
+        return pd.Series(dtype=float, name=column)
+
+    return total_sum / total_count
+
+
+def chunked_groupby_quantile(chunks, by, column, quantiles=(0.5,)):
+    """Estimate quantiles of column per group over all chunks.
+
+    The values of each group are collected in mergeable quantile sketches (see
+    `utils_market_aggregates`), so memory is bounded by the number of groups and not
+    by the number of rows.
+
+    Parameters
+    ----------
+    chunks : iterable
+        chunks of data set, e.g. from `iter_dataset_chunks`
+    by : str or list
+        grouping columns
+    column : str
+        column whose quantiles are estimated
+    quantiles : tuple
+        quantiles between 0 and 1
+
+    Returns
+    -------
+     : DataFrame
+        estimated quantiles per group, one column per quantile
+    """
+    by_columns = by if isinstance(by, list) else [by]
+
+    sketches = {}
+    for chunk in chunks:
+        values = pd.to_numeric(chunk[column], errors="coerce")
+        for group, group_values in values.groupby([chunk[key] for key in by_columns]):
+            sketch = sketches.setdefault(group, {})
+            for value, number in group_values.dropna().value_counts().items():
+                add_value_to_sketch(sketch, value, weight=int(number))
+
+    index = pd.MultiIndex.from_tuples(sketches.keys(), names=by_columns)
+    if not isinstance(by, list):
+        index = index.get_level_values(0)
+
+    return pd.DataFrame(
+        {
+            quantile: [
+                estimate_quantile(sketch, quantile) for sketch in sketches.values()
+            ]
+            for quantile in quantiles
+        },
+        index=index,
+    ).sort_index()
@@ -0,0 +1,159 @@
+"""Utility functions for the dead-letter queue of failed car advertisments.
+
+Car advertisments whose characteristics could not be extracted are kept in a
+persistent queue together with the type of the exception and the number of
+attempts. They are retried in a batch later with exponential backoff, instead of
+being lost until a full crawl happens to find them again.
+"""
+import json
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from os.path import exists, splitext
+
+# hours to wait before the first retry, doubled with every further attempt
+RETRY_BACKOFF_HOURS = 1
+
+# number of attempts after which a car advertisment is not retried anymore
+MAXIMUM_NUMBER_OF_ATTEMPTS = 5
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def get_path_to_dead_letter_queue(path_to_dataset):
+    """Derive the path of the dead-letter queue which is kept next to the data set.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+
+    Returns
+    -------
+     : str
+        path to dead-letter queue
+    """
+    return splitext(path_to_dataset)[0] + "_dead_letters.json"
+
+
+def initialize_or_import_dead_letter_queue(path_to_dead_letter_queue):
+    """Import existing dead-letter queue or create an empty one.
+
+    Parameters
+    ----------
+    path_to_dead_letter_queue : str
+        path to dead-letter queue
+
+    Returns
+    -------
+    dead_letter_queue : dict
+        failure details per url of car advertisment
+    """
+    if exists(path_to_dead_letter_queue):
+        with open(path_to_dead_letter_queue, encoding="utf-8") as file:
+            dead_letter_queue = json.load(file)
+    else:
+        dead_letter_queue = {}
+
+    return dead_letter_queue
+
+
+def save_dead_letter_queue(dead_letter_queue, path_to_dead_letter_queue):
+    """Save dead-letter queue to file.
+
+    Parameters
+    ----------
+    dead_letter_queue : dict
+        failure details per url of car advertisment
+    path_to_dead_letter_queue : str
+        path to dead-letter queue
+    """
+    with open(path_to_dead_letter_queue + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(dead_letter_queue, file, indent=2)
+    os.replace(path_to_dead_letter_queue + ".tmp", path_to_dead_letter_queue)
+
+
+def record_failed_extraction(dead_letter_queue, url, exception, now=None):
+    """Record a failed extraction of a car advertisment.
+
+    Parameters
+    ----------
+    dead_letter_queue : dict
+        failure details per url of car advertisment
+    url : str
+        url of car advertisment
+    exception : Exception
+        exception raised during extraction
+    now : datetime
+        time of failure, now if None
+    """
+    now = now or datetime.now()
+    failure = dead_letter_queue.get(url, {"attempts": 0})
+    attempts = failure["attempts"] + 1
+
+    next_retry = now + timedelta(hours=RETRY_BACKOFF_HOURS * 2 ** (attempts - 1))
+    dead_letter_queue[url] = {
+        "exception_type": type(exception).__name__,
+        "message": str(exception).split("\n")[0][:200],
+        "attempts": attempts,
+        "first_failure": failure.get("first_failure", now.strftime(DATETIME_FORMAT)),
+        "last_failure": now.strftime(DATETIME_FORMAT),
+        "next_retry": next_retry.strftime(DATETIME_FORMAT),
+    }
+
+
+def remove_from_dead_letter_queue(dead_letter_queue, url):
+    """Remove car advertisment from dead-letter queue after successful extraction.
+
+    Parameters
+    ----------
+    dead_letter_queue : dict
+        failure details per url of car advertisment
+    url : str
+        url of car advertisment
+    """
+    dead_letter_queue.pop(url, None)
+
+
+def get_urls_due_for_retry(dead_letter_queue, now=None):
+    """Get urls of car advertisments whose backoff has expired.
+
+    Parameters
+    ----------
+    dead_letter_queue : dict
+        failure details per url of car advertisment
+    now : datetime
+        time of retry, now if None
+
+    Returns
+    -------
+     : list
+        urls, the ones with the fewest attempts first
+    """
+    now = now or datetime.now()
+    due_failures = [
+        (failure["attempts"], url)
+        for url, failure in dead_letter_queue.items()
+        if failure["attempts"] < MAXIMUM_NUMBER_OF_ATTEMPTS
+        and datetime.strptime(failure["next_retry"], DATETIME_FORMAT) <= now
+    ]
+
+    return [url for _, url in sorted(due_failures)]
+
+
+def summarize_failure_types(dead_letter_queue):
+    """Count car advertisments in dead-letter queue per exception type.
+
+    Parameters
+    ----------
+    dead_letter_queue : dict
+        failure details per url of car advertisment
+
+    Returns
+    -------
+     : list
+        exception types and number of car advertisments, most common first
+    """
+    return Counter(
+        failure["exception_type"] for failure in dead_letter_queue.values()
+    ).most_common()
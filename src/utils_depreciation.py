@@ -0,0 +1,372 @@
+"""Utility functions for fitting depreciation curves of all car models at once.
+
+The price of a car is modelled per manufacturer and model as exponential decay in
+age and mileage, i.e. the log price is linear in entry year and mileage. Instead of
+fitting each model in a loop, the normal equations of all models are accumulated in
+one vectorized pass over the data set and solved as a stack of small systems.
+
+The coefficients are cached next to the data set, and only models which received
+new car advertisments since the last run are refit.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from os.path import exists, splitext
+
+import numpy as np
+import pandas as pd
+
+from utils_dataset_streaming import iter_dataset_chunks
+
+# entry year and mileage the intercept of a curve refers to
+REFERENCE_ENTRY_YEAR = 2015
+MILEAGE_UNIT_KM = 10000
+
+# penalty of the coefficients of entry year and mileage, so models with only a few
+# cars or without variation in entry year or mileage still get a curve
+RIDGE_PENALTY = 1e-3
+
+DEPRECIATION_COLUMNS = [
+    "manufacturer",
+    "model",
+    "price_sek",
+    "entry_year",
+    "mileage_km",
+]
+
+# number of coefficients: intercept, entry year and mileage
+NUMBER_OF_COEFFICIENTS = 3
+
+
+def get_path_to_depreciation_curves(path_to_dataset):
+    """Derive the path of the depreciation curves which are kept next to the data set.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+
+    Returns
+    -------
+     : str
+        path to depreciation curves
+    """
+    return splitext(path_to_dataset)[0] + "_depreciation_curves.csv"
+
+
+def initialize_or_import_depreciation_curves(path_to_depreciation_curves):
+    """Import cached depreciation curves or create an empty table.
+
+    Parameters
+    ----------
+    path_to_depreciation_curves : str
+        path to depreciation curves
+
+    Returns
+    -------
+    depreciation_curves : DataFrame
+        coefficients per manufacturer and model
+    """
+    if exists(path_to_depreciation_curves):
+        depreciation_curves = pd.read_csv(
+            path_to_depreciation_curves, index_col=["manufacturer", "model"]
+        )
+    else:
+        depreciation_curves = pd.DataFrame(
+            columns=["count", "intercept", "entry_year", "mileage"],
+            index=pd.MultiIndex.from_arrays([[], []], names=["manufacturer", "model"]),
+        )
+
+    return depreciation_curves
+
+
+def save_depreciation_curves(depreciation_curves, path_to_depreciation_curves):
+    """Save depreciation curves to file.
+
+    Parameters
+    ----------
+    depreciation_curves : DataFrame
+        coefficients per manufacturer and model
+    path_to_depreciation_curves : str
+        path to depreciation curves
+    """
+    depreciation_curves.to_csv(path_to_depreciation_curves + ".tmp")
+    os.replace(path_to_depreciation_curves + ".tmp", path_to_depreciation_curves)
+
+
+def prepare_depreciation_data(used_car_data):
+    """Select cars with price, entry year and mileage and encode their model.
+
+    Parameters
+    ----------
+    used_car_data : DataFrame
+        data set with at least the columns of `DEPRECIATION_COLUMNS`
+
+    Returns
+    -------
+    models : MultiIndex
+        manufacturer and model of each group
+    group_codes : np.ndarray
+        group of each car
+    design : np.ndarray
+        intercept, entry year and mileage of each car, relative to the reference
+    log_prices : np.ndarray
+        log price of each car
+    """
+    prices = pd.to_numeric(used_car_data["price_sek"], errors="coerce")
+    entry_years = pd.to_numeric(used_car_data["entry_year"], errors="coerce")
+    mileages = pd.to_numeric(used_car_data["mileage_km"], errors="coerce")
+    is_valid = (
+        (prices > 0)
+        & entry_years.notna()
+        & mileages.notna()
+        & used_car_data["manufacturer"].notna()
+        & used_car_data["model"].notna()
+    )
+
+    cars = used_car_data.loc[is_valid, ["manufacturer", "model"]]
+    group_codes, models = pd.MultiIndex.from_frame(cars).factorize()
+    models.names = ["manufacturer", "model"]
+
+    design = np.column_stack(
+        [
+            np.ones(is_valid.sum()),
+            entry_years[is_valid].to_numpy(dtype=float) - REFERENCE_ENTRY_YEAR,
+            mileages[is_valid].to_numpy(dtype=float) / MILEAGE_UNIT_KM,
+        ]
+    )
+
+    return models, group_codes, design, np.log(prices[is_valid].to_numpy(dtype=float))
+
+
+def accumulate_normal_equations(group_codes, design, log_prices, number_of_groups):
+    """Accumulate the normal equations of the least squares fit of each group.
+
+    Parameters
+    ----------
+    group_codes : np.ndarray
+        group of each car
+    design : np.ndarray
+        design matrix with one row per car
+    log_prices : np.ndarray
+        log price of each car
+    number_of_groups : int
+        number of groups
+
+    Returns
+    -------
+    gram_matrices : np.ndarray
+        X^T X of each group, shape (groups, coefficients, coefficients)
+    moments : np.ndarray
+        X^T y of each group, shape (groups, coefficients)
+    """
+    gram_matrices = np.empty(
+        (number_of_groups, NUMBER_OF_COEFFICIENTS, NUMBER_OF_COEFFICIENTS)
+    )
+    moments = np.empty((number_of_groups, NUMBER_OF_COEFFICIENTS))
+    for row in range(NUMBER_OF_COEFFICIENTS):
+        moments[:, row] = np.bincount(
+            group_codes, weights=design[:, row] * log_prices, minlength=number_of_groups
+        )
+        for column in range(row, NUMBER_OF_COEFFICIENTS):
+            gram_matrices[:, row, column] = np.bincount(
+                group_codes,
+                weights=design[:, row] * design[:, column],
+                minlength=number_of_groups,
+            )
+            gram_matrices[:, column, row] = gram_matrices[:, row, column]
+
+    return gram_matrices, moments
+
+
+def accumulate_normal_equations_in_processes(
+    group_codes, design, log_prices, number_of_groups, number_of_processes
+):
+    """Accumulate the normal equations in chunks of cars on a process pool.
+
+    The normal equations of chunks add up, so large data sets can be split between
+    processes.
+
+    Parameters
+    ----------
+    group_codes : np.ndarray
+        group of each car
+    design : np.ndarray
+        design matrix with one row per car
+    log_prices : np.ndarray
+        log price of each car
+    number_of_groups : int
+        number of groups
+    number_of_processes : int
+        number of processes
+
+    Returns
+    -------
+    gram_matrices : np.ndarray
+        X^T X of each group
+    moments : np.ndarray
+        X^T y of each group
+    """
+    chunks = np.array_split(np.arange(len(log_prices)), number_of_processes)
+    with ProcessPoolExecutor(max_workers=number_of_processes) as executor:
+        results = executor.map(
+            accumulate_normal_equations,
+            [group_codes[chunk] for chunk in chunks],
+            [design[chunk] for chunk in chunks],
+            [log_prices[chunk] for chunk in chunks],
+            [number_of_groups] * len(chunks),
+        )
+        gram_matrices, moments = [sum(partial) for partial in zip(*results)]
+
+    return gram_matrices, moments
+
+
+def fit_depreciation_curves(used_car_data, number_of_processes=None):
+    """Fit the depreciation curves of all models in the data set at once.
+
+    Parameters
+    ----------
+    used_car_data : DataFrame
+        data set with at least the columns of `DEPRECIATION_COLUMNS`
+    number_of_processes : int
+        number of processes the normal equations are accumulated on, in this process
+        if None
+
+    Returns
+    -------
+    depreciation_curves : DataFrame
+        number of cars and coefficients per manufacturer and model. exp(entry_year)
+        is the share of the price retained per year of age and exp(mileage) per
+        `MILEAGE_UNIT_KM` of mileage.
+    """
+    models, group_codes, design, log_prices = prepare_depreciation_data(used_car_data)
+
+    if number_of_processes is None or number_of_processes <= 1:
+        gram_matrices, moments = accumulate_normal_equations(
+            group_codes, design, log_prices, len(models)
+        )
+    else:
+        gram_matrices, moments = accumulate_normal_equations_in_processes(
+            group_codes, design, log_prices, len(models), number_of_processes
+        )
+
+    penalty = np.diag([0.0] + [RIDGE_PENALTY] * (NUMBER_OF_COEFFICIENTS - 1))
+    coefficients = np.linalg.solve(gram_matrices + penalty, moments[:, :, np.newaxis])
+
+    return pd.DataFrame(
+        {
+            "count": gram_matrices[:, 0, 0].astype(int),
+            "intercept": coefficients[:, 0, 0],
+            "entry_year": coefficients[:, 1, 0],
+            "mileage": coefficients[:, 2, 0],
+        },
+        index=models,
+    )
+
+
+def update_depreciation_curves(
+    depreciation_curves, used_car_data, number_of_processes=None
+):
+    """Refit the depreciation curves of models whose number of cars has changed.
+
+    Parameters
+    ----------
+    depreciation_curves : DataFrame
+        cached coefficients per manufacturer and model
+    used_car_data : DataFrame
+        data set with at least the columns of `DEPRECIATION_COLUMNS`
+    number_of_processes : int
+        number of processes the normal equations are accumulated on, in this process
+        if None
+
+    Returns
+    -------
+    depreciation_curves : DataFrame
+        updated coefficients per manufacturer and model
+    refit_models : MultiIndex
+        manufacturer and model of refit curves
+    """
+    models, group_codes, _, _ = prepare_depreciation_data(used_car_data)
+    counts = pd.Series(np.bincount(group_codes, minlength=len(models)), index=models)
+    cached_counts = depreciation_curves["count"].reindex(models)
+    refit_models = models[(cached_counts != counts).to_numpy()]
+    if len(refit_models) == 0:
+        return depreciation_curves, refit_models
+
+    is_refit = pd.MultiIndex.from_frame(used_car_data[["manufacturer", "model"]]).isin(
+        refit_models
+    )
+    refit_curves = fit_depreciation_curves(used_car_data[is_refit], number_of_processes)
+
+    depreciation_curves = refit_curves.combine_first(depreciation_curves)
+
+    return depreciation_curves, refit_models
+
+
+def predict_depreciated_prices(depreciation_curves, cars):
+    """Predict the prices of cars with the depreciation curve of their model.
+
+    Parameters
+    ----------
+    depreciation_curves : DataFrame
+        coefficients per manufacturer and model
+    cars : DataFrame
+        cars with columns manufacturer, model, entry_year and mileage_km
+
+    Returns
+    -------
+     : np.ndarray
+        predicted price in SEK, NaN for models without curve
+    """
+    coefficients = depreciation_curves.reindex(
+        pd.MultiIndex.from_frame(cars[["manufacturer", "model"]])
+    )
+    log_prices = (
+        coefficients["intercept"].to_numpy(dtype=float)
+        + coefficients["entry_year"].to_numpy(dtype=float)
+        * (cars["entry_year"].to_numpy(dtype=float) - REFERENCE_ENTRY_YEAR)
+        + coefficients["mileage"].to_numpy(dtype=float)
+        * cars["mileage_km"].to_numpy(dtype=float)
+        / MILEAGE_UNIT_KM
+    )
+
+    return np.exp(log_prices)
+
+
+def refresh_depreciation_curves(path_to_dataset, number_of_processes=None):
+    """Refit the cached depreciation curves of models with new cars in the data set.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set the curves are kept next to
+    number_of_processes : int
+        number of processes the normal equations are accumulated on, in this process
+        if None
+
+    Returns
+    -------
+    depreciation_curves : DataFrame
+        coefficients per manufacturer and model
+    """
+    start = time.perf_counter()
+    path_to_depreciation_curves = get_path_to_depreciation_curves(path_to_dataset)
+
+    used_car_data = pd.concat(
+        iter_dataset_chunks(path_to_dataset, columns=DEPRECIATION_COLUMNS),
+        ignore_index=True,
+    )
+    depreciation_curves = initialize_or_import_depreciation_curves(
+        path_to_depreciation_curves
+    )
+    depreciation_curves, refit_models = update_depreciation_curves(
+        depreciation_curves, used_car_data, number_of_processes
+    )
+    save_depreciation_curves(depreciation_curves, path_to_depreciation_curves)
+
+    print(
+        f"Refit depreciation curves of {len(refit_models)} of",
+        f"{len(depreciation_curves)} model(s) in {time.perf_counter() - start:.2f} s.",
+    )
+
+    return depreciation_curves
@@ -0,0 +1,388 @@
+"""Utility functions to record the interactions with the website and replay them.
+
+A recording driver wraps a webdriver and stores the result of every page load,
+element lookup, text, attribute and click. A replay driver serves these results
+back without a browser, so the whole crawl can be run offline, deterministically
+and at CPU speed, e.g. to benchmark it or to check changes of its control flow.
+
+Results are stored per url of the loaded page and selector. If a page is visited
+several times, e.g. in two crawls with a price change in between, the visits are
+replayed in the order they have been recorded. The same holds for the reference
+time of each crawl run, which relative publication times are resolved against.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+
+from selenium.common import exceptions
+from selenium.common.exceptions import NoSuchElementException
+
+from utils_page_watchdog import PageLoadTimeout
+
+# the drivers of the result webpages and of the car details share a recording, and
+# result webpages are prefetched in another thread
+RECORDING_LOCK = threading.Lock()
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# exceptions replayed with their own type besides the ones of selenium
+REPLAYED_EXCEPTIONS = {"PageLoadTimeout": PageLoadTimeout}
+
+
+def create_empty_recording():
+    """Create an empty recording.
+
+    Returns
+    -------
+     : dict
+        loaded pages, lookups, element interactions and reference times
+    """
+    return {
+        "pages": [],
+        "page_loads": {},
+        "lookups": {},
+        "elements": {},
+        "number_of_elements": 0,
+        "reference_times": [],
+    }
+
+
+def import_recording(path_to_recording):
+    """Import a recording from file.
+
+    Parameters
+    ----------
+    path_to_recording : str
+        path to JSON file of recording
+
+    Returns
+    -------
+    recording : dict
+        loaded pages, lookups and element interactions
+    """
+    with open(path_to_recording, encoding="utf-8") as file:
+        recording = json.load(file)
+
+    return recording
+
+
+def save_recording(recording, path_to_recording):
+    """Save recording to file.
+
+    Parameters
+    ----------
+    recording : dict
+        loaded pages, lookups and element interactions
+    path_to_recording : str
+        path to JSON file of recording
+    """
+    with open(path_to_recording + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(recording, file)
+    os.replace(path_to_recording + ".tmp", path_to_recording)
+
+
+def create_replay_counters():
+    """Create counters of replayed lookups and element interactions.
+
+    Replay drivers which share the counters replay a recording like the drivers which
+    shared it during recording.
+
+    Returns
+    -------
+     : dict
+        number of replays per page load, lookup, element interaction and of
+        reference times
+    """
+    return {"page_loads": {}, "lookups": {}, "elements": {}, "reference_times": 0}
+
+
+def record_reference_time(recording, reference_time):
+    """Record the reference time of a crawl run.
+
+    Parameters
+    ----------
+    recording : dict
+        loaded pages, lookups, element interactions and reference times
+    reference_time : datetime
+        time relative publication times of the run are resolved against
+    """
+    with RECORDING_LOCK:
+        recording.setdefault("reference_times", []).append(
+            reference_time.strftime(DATETIME_FORMAT)
+        )
+
+
+def replay_reference_time(recording, replay_counters):
+    """Replay the reference time of the next crawl run.
+
+    Parameters
+    ----------
+    recording : dict
+        loaded pages, lookups, element interactions and reference times
+    replay_counters : dict
+        number of replays per lookup, per element interaction and of reference times
+
+    Returns
+    -------
+     : datetime
+        recorded reference time of run, None if the recording has none left
+    """
+    with RECORDING_LOCK:
+        reference_times = recording.get("reference_times", [])
+        number_of_replays = replay_counters.get("reference_times", 0)
+        if number_of_replays >= len(reference_times):
+            return None
+        replay_counters["reference_times"] = number_of_replays + 1
+
+    return datetime.strptime(reference_times[number_of_replays], DATETIME_FORMAT)
+
+
+def get_lookup_key(url, by, value):
+    """Get key of an element lookup on a page.
+
+    Parameters
+    ----------
+    url : str
+        url of loaded page
+    by : str
+        strategy of selector, e.g. "css selector"
+    value : str
+        selector
+
+    Returns
+    -------
+     : str
+        key of lookup in recording
+    """
+    return json.dumps([url, by, value])
+
+
+def record_result(results, key, call):
+    """Call a method of the website and record its result or exception.
+
+    Parameters
+    ----------
+    results : dict
+        recorded results per key
+    key : str
+        key of call, e.g. "text" or "click"
+    call : callable
+        method of the website without arguments
+
+    Returns
+    -------
+    result : object
+        result of call
+    """
+    try:
+        result = call()
+    except Exception as exception:
+        results.setdefault(key, []).append({"exception": type(exception).__name__})
+        raise
+    results.setdefault(key, []).append({"result": result})
+
+    return result
+
+
+def replay_result(results, key, counters):
+    """Replay the next recorded result of a call.
+
+    If the call has been replayed more often than recorded, its last result is
+    replayed again.
+
+    Parameters
+    ----------
+    results : dict
+        recorded results per key
+    key : str
+        key of call, e.g. "text" or "click"
+    counters : dict
+        number of replays per key
+
+    Returns
+    -------
+     : object
+        recorded result
+
+    Raises
+    ------
+    Exception
+        recorded exception, of the selenium type with the recorded name if any
+    """
+    recorded_results = results.get(key)
+    if not recorded_results:
+        raise NoSuchElementException(f"No result of {key} has been recorded.")
+
+    number_of_replays = counters.get(key, 0)
+    counters[key] = number_of_replays + 1
+    recorded_result = recorded_results[
+        min(number_of_replays, len(recorded_results) - 1)
+    ]
+    if "exception" in recorded_result:
+        exception_type = REPLAYED_EXCEPTIONS.get(
+            recorded_result["exception"],
+            getattr(exceptions, recorded_result["exception"], Exception),
+        )
+        raise exception_type(f"Replayed {recorded_result['exception']}.")
+
+    return recorded_result["result"]
+
+
+class RecordingElement:
+    """Webelement which records text, attributes and clicks."""
+
+    def __init__(self, element, element_id, recording):
+        self.element = element
+        self.element_id = element_id
+        self.results = recording["elements"].setdefault(element_id, {})
+
+    @property
+    def text(self):
+        """Record text of element."""
+        return record_result(self.results, "text", lambda: self.element.text)
+
+    def get_attribute(self, name):
+        """Record attribute of element."""
+        return record_result(
+            self.results,
+            f"attribute {name}",
+            lambda: self.element.get_attribute(name),
+        )
+
+    def click(self):
+        """Record click on element."""
+        return record_result(self.results, "click", self.element.click)
+
+
+class RecordingDriver:
+    """Webdriver which records page loads and element lookups of a webdriver.
+
+    All other attributes are passed through to the wrapped webdriver.
+    """
+
+    def __init__(self, driver, recording):
+        self.driver = driver
+        self.recording = recording
+        self.url = None
+
+    def __getattr__(self, name):
+        """Pass attribute through to the wrapped webdriver."""
+        return getattr(self.driver, name)
+
+    def get(self, url):
+        """Record loading a page, including a timeout or another failure."""
+        self.url = url
+        self.recording["pages"].append(url)
+        record_result(
+            self.recording.setdefault("page_loads", {}),
+            url,
+            lambda: self.driver.get(url),
+        )
+
+    def find_elements(self, by, value):
+        """Record elements found on the current page."""
+        elements = self.driver.find_elements(by, value)
+
+        recorded_elements = []
+        with RECORDING_LOCK:
+            for element in elements:
+                element_id = str(self.recording["number_of_elements"])
+                self.recording["number_of_elements"] = (
+                    self.recording["number_of_elements"] + 1
+                )
+                recorded_elements.append(
+                    RecordingElement(element, element_id, self.recording)
+                )
+            self.recording["lookups"].setdefault(
+                get_lookup_key(self.url, by, value), []
+            ).append([element.element_id for element in recorded_elements])
+
+        return recorded_elements
+
+    def find_element(self, by, value):
+        """Record first element found on the current page."""
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f"No element matches {value}.")
+
+        return elements[0]
+
+
+class ReplayElement:
+    """Webelement which replays recorded text, attributes and clicks."""
+
+    def __init__(self, element_id, recording, counters):
+        self.element_id = element_id
+        self.results = recording["elements"].get(element_id, {})
+        self.counters = counters.setdefault(element_id, {})
+
+    @property
+    def text(self):
+        """Replay text of element."""
+        return replay_result(self.results, "text", self.counters)
+
+    def get_attribute(self, name):
+        """Replay attribute of element."""
+        return replay_result(self.results, f"attribute {name}", self.counters)
+
+    def click(self):
+        """Replay click on element."""
+        return replay_result(self.results, "click", self.counters)
+
+
+class ReplayDriver:
+    """Webdriver which replays a recording without a browser.
+
+    Lookups on pages or with selectors which have not been recorded find no
+    elements.
+    """
+
+    def __init__(self, recording, replay_counters=None):
+        self.recording = recording
+        self.replay_counters = replay_counters or create_replay_counters()
+        self.url = None
+        self.timeouts = SimpleNamespace(implicit_wait=0)
+
+    def get(self, url):
+        """Replay loading a page, raising the recorded exception if it failed."""
+        self.url = url
+        # recordings without page loads only contain successful ones
+        page_loads = self.recording.get("page_loads", {})
+        if url in page_loads:
+            replay_result(page_loads, url, self.replay_counters["page_loads"])
+
+    def implicitly_wait(self, time_to_wait):
+        """Set implicit wait, which is not needed during replay."""
+        self.timeouts.implicit_wait = time_to_wait
+
+    def quit(self):
+        """Quit driver, nothing to do during replay."""
+
+    def find_elements(self, by, value):
+        """Replay elements found on the current page."""
+        key = get_lookup_key(self.url, by, value)
+        recorded_lookups = self.recording["lookups"].get(key)
+        if not recorded_lookups:
+            return []
+
+        with RECORDING_LOCK:
+            number_of_replays = self.replay_counters["lookups"].get(key, 0)
+            self.replay_counters["lookups"][key] = number_of_replays + 1
+        element_ids = recorded_lookups[
+            min(number_of_replays, len(recorded_lookups) - 1)
+        ]
+
+        return [
+            ReplayElement(element_id, self.recording, self.replay_counters["elements"])
+            for element_id in element_ids
+        ]
+
+    def find_element(self, by, value):
+        """Replay first element found on the current page."""
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f"No element matches {value}.")
+
+        return elements[0]
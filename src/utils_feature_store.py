@@ -0,0 +1,323 @@
+"""Utility functions for a memory-mapped feature store of the used car data set.
+
+Numeric columns and the codes of categorical columns are exported to `.npy` files,
+which analysis processes open memory-mapped. Thereby, all processes share the same
+pages in the OS cache instead of holding their own copy of the data set.
+
+Each export writes its arrays to new files named by the export and then replaces the
+metadata, which names the arrays. So a single rename switches readers to the new
+export, and a reader never pairs the arrays of one export with the metadata of
+another.
+"""
+import json
+import os
+from datetime import datetime
+from os import makedirs
+from os.path import join, splitext
+
+import numpy as np
+import pandas as pd
+
+from utils_dataset_streaming import (
+    DEFAULT_CHUNKSIZE,
+    count_dataset_rows,
+    iter_dataset_chunks,
+)
+
+FEATURE_STORE_VERSION = 1
+
+# arrays of stores exported before their files were named by the export
+DEFAULT_ARRAY_FILES = {
+    "numeric": "numeric.npy",
+    "categorical_codes": "categorical_codes.npy",
+}
+
+# number of times opening is retried, if an export replaced the store meanwhile
+NUMBER_OF_OPEN_ATTEMPTS = 3
+
+NUMERIC_COLUMNS = [
+    "price_sek",
+    "mileage_km",
+    "entry_year",
+    "horse_power",
+    "co2_emission_g/km",
+    "length_mm",
+    "width_mm",
+    "height_mm",
+    "load_capacity_kg",
+    "empty_weight_kg",
+    "total_weight_kg",
+]
+
+CATEGORICAL_COLUMNS = [
+    "manufacturer",
+    "model",
+    "fuel",
+    "transmission",
+    "type_of_drive",
+    "car_type",
+    "location",
+    "provider",
+]
+
+
+def get_path_to_feature_store(path_to_dataset):
+    """Derive the path of the feature store which is kept next to the data set.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+
+    Returns
+    -------
+     : str
+        path to directory of feature store
+    """
+    return splitext(path_to_dataset)[0] + "_feature_store"
+
+
+def export_feature_store(used_car_data, path_to_store):
+    """Export numeric columns and categorical codes to memory-mappable arrays.
+
+    Parameters
+    ----------
+    used_car_data : DataFrame
+        data set of used cars
+    path_to_store : str
+        path to directory of feature store
+    """
+    write_feature_store([used_car_data], len(used_car_data), path_to_store)
+
+
+def export_feature_store_in_chunks(
+    path_to_dataset, path_to_store, chunksize=DEFAULT_CHUNKSIZE
+):
+    """Export the data set file to the feature store without importing it at once.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+    path_to_store : str
+        path to directory of feature store
+    chunksize : int
+        number of rows which are read at once
+    """
+    columns = NUMERIC_COLUMNS + CATEGORICAL_COLUMNS
+    write_feature_store(
+        iter_dataset_chunks(path_to_dataset, chunksize, columns),
+        count_dataset_rows(path_to_dataset, chunksize),
+        path_to_store,
+    )
+
+
+def write_feature_store(chunks, number_of_rows, path_to_store):
+    """Write chunks of the data set to the memory-mappable arrays of the store.
+
+    Both arrays are stored column-major, so a single column is a contiguous block of
+    memory. Missing numeric values are NaN, missing categories have code -1.
+
+    Parameters
+    ----------
+    chunks : iterable
+        chunks of data set
+    number_of_rows : int
+        total number of rows of all chunks
+    path_to_store : str
+        path to directory of feature store
+    """
+    makedirs(path_to_store, exist_ok=True)
+
+    # arrays are written to new files, so processes which have mapped the previous
+    # export keep reading consistent pages
+    export_id = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    array_files = {
+        array_name: f"{array_name}-{export_id}.npy"
+        for array_name in DEFAULT_ARRAY_FILES
+    }
+    numeric = create_memory_mapped_array(
+        join(path_to_store, array_files["numeric"]),
+        np.float64,
+        (number_of_rows, len(NUMERIC_COLUMNS)),
+    )
+    categorical_codes = create_memory_mapped_array(
+        join(path_to_store, array_files["categorical_codes"]),
+        np.int32,
+        (number_of_rows, len(CATEGORICAL_COLUMNS)),
+    )
+
+    # codes are assigned in order of first appearance, consistently over all chunks
+    categories = {column: {} for column in CATEGORICAL_COLUMNS}
+    first_row = 0
+    for chunk in chunks:
+        rows = slice(first_row, first_row + len(chunk))
+        for idx, column in enumerate(NUMERIC_COLUMNS):
+            numeric[rows, idx] = pd.to_numeric(chunk[column], errors="coerce").to_numpy(
+                dtype=np.float64
+            )
+        for idx, column in enumerate(CATEGORICAL_COLUMNS):
+            values = chunk[column].astype("string")
+            for category in values.dropna().unique():
+                categories[column].setdefault(str(category), len(categories[column]))
+            categorical_codes[rows, idx] = (
+                values.map(categories[column]).fillna(-1).to_numpy(dtype=np.int32)
+            )
+        first_row = rows.stop
+
+    numeric.flush()
+    categorical_codes.flush()
+    del numeric, categorical_codes
+
+    # replacing the metadata, which names the arrays, switches to the new export
+    metadata = {
+        "version": FEATURE_STORE_VERSION,
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "arrays": array_files,
+        "number_of_rows": number_of_rows,
+        "numeric_columns": NUMERIC_COLUMNS,
+        "categorical_columns": CATEGORICAL_COLUMNS,
+        "categories": {
+            column: list(column_categories)
+            for column, column_categories in categories.items()
+        },
+    }
+    path_to_metadata = join(path_to_store, "metadata.json")
+    with open(path_to_metadata + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(metadata, file)
+    os.replace(path_to_metadata + ".tmp", path_to_metadata)
+    remove_stale_arrays(path_to_store, array_files.values())
+
+    print(f"Exported {number_of_rows} car(s) to feature store: {path_to_store}")
+
+
+def remove_stale_arrays(path_to_store, current_array_files):
+    """Remove the arrays of previous exports from the feature store.
+
+    Processes which have mapped them keep reading them, arrays which cannot be
+    removed, e.g. while they are mapped on Windows, are removed by a later export.
+
+    Parameters
+    ----------
+    path_to_store : str
+        path to directory of feature store
+    current_array_files : iterable
+        file names of the arrays of the current export
+    """
+    for file_name in set(os.listdir(path_to_store)) - set(current_array_files):
+        if file_name.endswith((".npy", ".npy.tmp")):
+            try:
+                os.remove(join(path_to_store, file_name))
+            except OSError:
+                pass
+
+
+def create_memory_mapped_array(path_to_array, dtype, shape):
+    """Create a column-major `.npy` file which is memory-mapped for writing.
+
+    Parameters
+    ----------
+    path_to_array : str
+        path to `.npy` file
+    dtype : np.dtype
+        data type of array
+    shape : tuple
+        shape of array
+
+    Returns
+    -------
+     : np.memmap
+        writable memory-mapped array
+    """
+    return np.lib.format.open_memmap(
+        path_to_array, mode="w+", dtype=dtype, shape=shape, fortran_order=True
+    )
+
+
+def open_feature_store(path_to_store):
+    """Open feature store read-only and memory-mapped.
+
+    Opening does not read the arrays, pages are only loaded when accessed and are
+    shared with all other processes that opened the same store.
+
+    Parameters
+    ----------
+    path_to_store : str
+        path to directory of feature store
+
+    Returns
+    -------
+    feature_store : dict
+        metadata and memory-mapped numeric and categorical code arrays
+    """
+    for attempt in range(NUMBER_OF_OPEN_ATTEMPTS):
+        with open(join(path_to_store, "metadata.json"), encoding="utf-8") as file:
+            metadata = json.load(file)
+
+        if metadata["version"] != FEATURE_STORE_VERSION:
+            raise ValueError(
+                f"Feature store version {metadata['version']} is not supported."
+            )
+
+        array_files = metadata.get("arrays", DEFAULT_ARRAY_FILES)
+        try:
+            return {
+                "metadata": metadata,
+                **{
+                    array_name: np.load(join(path_to_store, array_file), mmap_mode="r")
+                    for array_name, array_file in array_files.items()
+                },
+            }
+        except FileNotFoundError:
+            # the arrays of the export have been removed by a newer export since
+            # the metadata has been read
+            if attempt == NUMBER_OF_OPEN_ATTEMPTS - 1:
+                raise
+
+
+def get_feature_store_column(feature_store, column):
+    """Get column of feature store without copying it.
+
+    Parameters
+    ----------
+    feature_store : dict
+        opened feature store
+    column : str
+        name of numeric or categorical column
+
+    Returns
+    -------
+     : np.ndarray
+        read-only view on values of numeric column or codes of categorical column
+    """
+    metadata = feature_store["metadata"]
+    if column in metadata["numeric_columns"]:
+        return feature_store["numeric"][:, metadata["numeric_columns"].index(column)]
+    elif column in metadata["categorical_columns"]:
+        return feature_store["categorical_codes"][
+            :, metadata["categorical_columns"].index(column)
+        ]
+    else:
+        raise KeyError(f"Column {column} is not part of the feature store.")
+
+
+def decode_categorical_codes(feature_store, column, codes):
+    """Decode codes of categorical column to their categories.
+
+    Parameters
+    ----------
+    feature_store : dict
+        opened feature store
+    column : str
+        name of categorical column
+    codes : np.ndarray
+        codes of categorical column
+
+    Returns
+    -------
+     : pd.Categorical
+        categories, missing values are NaN
+    """
+    return pd.Categorical.from_codes(
+        codes, categories=feature_store["metadata"]["categories"][column]
+    )
@@ -0,0 +1,533 @@
+"""Utility functions for incrementally maintained market aggregates.
+
+The aggregates consist of mergeable statistics (counts, sums and quantile sketches)
+per market segment. They are updated whenever a car is attached to the data set or
+its price or publication datetime is updated, so reports can read them directly
+instead of running a groupby over the whole data set.
+"""
+import json
+import math
+import os
+from os.path import exists, splitext
+
+# market segments the aggregates are kept for; the key is used as name of the
+# grouping in the persisted file
+AGGREGATE_GROUPINGS = {
+    "manufacturer": ["manufacturer"],
+    "manufacturer_model": ["manufacturer", "model"],
+    "manufacturer_model_entry_year": ["manufacturer", "model", "entry_year"],
+    "fuel": ["fuel"],
+    "car_type": ["car_type"],
+}
+
+# numerical columns of the data set for which statistics are aggregated
+AGGREGATE_COLUMNS = ["price_sek", "mileage_km", "horse_power"]
+
+# relative accuracy of the quantile sketches, i.e. an estimated median of 100 000 SEK
+# lies within +/- 1 000 SEK of the true median
+SKETCH_RELATIVE_ACCURACY = 0.01
+_SKETCH_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+
+
+def get_path_to_aggregates(path_to_dataset):
+    """Derive the path of the aggregates which are persisted next to the data set.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+
+    Returns
+    -------
+     : str
+        path to aggregates
+    """
+    return splitext(path_to_dataset)[0] + "_aggregates.json"
+
+
+def initialize_or_import_aggregates(path_to_aggregates, used_car_data, overwrite=True):
+    """Import existing aggregates or build them once from the data set.
+
+    Parameters
+    ----------
+    path_to_aggregates : str
+        path to file which shall be imported
+    used_car_data : DataFrame
+        data set of used cars the aggregates are built from if no file exists
+    overwrite : boolean
+        file shall be overwritten
+
+    Returns
+    -------
+    aggregates : dict
+        market aggregates
+    """
+    if exists(path_to_aggregates) and overwrite is True:
+        print(f"Importing already existing aggregates: {path_to_aggregates}")
+        with open(path_to_aggregates, encoding="utf-8") as file:
+            aggregates = json.load(file)
+    else:
+        print(f"Building aggregates from dataset at: {path_to_aggregates}")
+        aggregates = build_aggregates_from_dataset(used_car_data)
+
+    return aggregates
+
+
+def create_empty_aggregates():
+    """Create empty aggregates for all market segments.
+
+    Returns
+    -------
+     : dict
+        empty market aggregates
+    """
+    return {
+        "groupings": {
+            grouping: {"columns": columns, "groups": {}}
+            for grouping, columns in AGGREGATE_GROUPINGS.items()
+        }
+    }
+
+
+def build_aggregates_from_dataset(used_car_data):
+    """Build aggregates with a single pass over the data set.
+
+    Parameters
+    ----------
+    used_car_data : DataFrame
+        data set of used cars
+
+    Returns
+    -------
+    aggregates : dict
+        market aggregates
+    """
+    aggregates = create_empty_aggregates()
+    for car in used_car_data.to_dict(orient="records"):
+        add_car_to_aggregates(aggregates, car)
+
+    return aggregates
+
+
+def save_aggregates(aggregates, path_to_aggregates):
+    """Save aggregates to file.
+
+    The file is written to a temporary file first and then moved, so a crash while
+    saving does not corrupt the existing aggregates.
+
+    Parameters
+    ----------
+    aggregates : dict
+        market aggregates
+    path_to_aggregates : str
+        path to file the aggregates are saved to
+    """
+    path_to_temporary_file = path_to_aggregates + ".tmp"
+    with open(path_to_temporary_file, "w", encoding="utf-8") as file:
+        json.dump(aggregates, file)
+    os.replace(path_to_temporary_file, path_to_aggregates)
+
+
+def add_car_to_aggregates(aggregates, car):
+    """Add a car to the statistics of all market segments it belongs to.
+
+    Parameters
+    ----------
+    aggregates : dict
+        market aggregates
+    car : dict, pd.Series or DataFrame
+        data of car, as attached by `attach_new_used_car`
+    """
+    change_aggregates(aggregates, convert_car_to_dict(car), 1)
+
+
+def remove_car_from_aggregates(aggregates, car):
+    """Remove a car from the statistics of all market segments it belongs to.
+
+    Parameters
+    ----------
+    aggregates : dict
+        market aggregates
+    car : dict, pd.Series or DataFrame
+        data of car
+    """
+    change_aggregates(aggregates, convert_car_to_dict(car), -1)
+
+
+def update_car_in_aggregates(aggregates, old_car, new_car):
+    """Replace the old state of an updated car with its new state.
+
+    Used after `update_price_of_car` and `update_publication_datetime_of_car`.
+
+    Parameters
+    ----------
+    aggregates : dict
+        market aggregates
+    old_car : dict, pd.Series or DataFrame
+        data of car before update
+    new_car : dict, pd.Series or DataFrame
+        data of car after update
+    """
+    old_car = convert_car_to_dict(old_car)
+    new_car = convert_car_to_dict(new_car)
+
+    change_aggregates(aggregates, old_car, -1)
+    change_aggregates(aggregates, new_car, 1)
+
+    if old_car.get("publication_datetime") != new_car.get("publication_datetime"):
+        for group in get_groups_of_car(aggregates, new_car):
+            group["uploaded_again"] = group.get("uploaded_again", 0) + 1
+
+
+def merge_aggregates(aggregates, other_aggregates):
+    """Merge the statistics of other aggregates into aggregates.
+
+    This allows to combine aggregates of e.g. separate crawls or data set chunks.
+
+    Parameters
+    ----------
+    aggregates : dict
+        market aggregates which are updated
+    other_aggregates : dict
+        market aggregates which are merged
+    """
+    for grouping, other_grouping in other_aggregates["groupings"].items():
+        groups = aggregates["groupings"].setdefault(
+            grouping, {"columns": other_grouping["columns"], "groups": {}}
+        )["groups"]
+        for key, other_group in other_grouping["groups"].items():
+            group = groups.setdefault(key, create_empty_group(other_group["values"]))
+            merge_groups(group, other_group)
+
+
+def aggregates_to_dataframe(aggregates, grouping, quantiles=(0.5,)):
+    """Convert the aggregates of a market segment grouping to a DataFrame.
+
+    This is what reports and dashboards read instead of the whole data set.
+
+    Parameters
+    ----------
+    aggregates : dict
+        market aggregates
+    grouping : str
+        name of grouping, see `AGGREGATE_GROUPINGS`
+    quantiles : tuple
+        quantiles which are estimated for each aggregated column
+
+    Returns
+    -------
+    summary : DataFrame
+        count, mean and quantiles of aggregated columns per group
+    """
+    columns = aggregates["groupings"][grouping]["columns"]
+    rows = []
+    for group in aggregates["groupings"][grouping]["groups"].values():
+        if group["count"] <= 0:
+            continue
+        row = dict(zip(columns, group["values"]))
+        row["count"] = group["count"]
+        row["uploaded_again"] = group.get("uploaded_again", 0)
+        for column in AGGREGATE_COLUMNS:
+            row[f"mean_{column}"] = calculate_mean(group, column)
+            for quantile in quantiles:
+                row[f"q{int(quantile * 100)}_{column}"] = estimate_quantile(
+                    group["sketches"].get(column, {}), quantile
+                )
+        rows.append(row)
+
+    # pandas is imported here only, so the aggregates can be read without it
+    import pandas as pd
+
+    summary = pd.DataFrame(rows)
+    if not summary.empty:
+        summary = summary.sort_values(columns, ignore_index=True)
+
+    return summary
+
+
+def add_value_to_sketch(sketch, value, weight=1):
+    """Add value to quantile sketch.
+
+    The sketch is a logarithmic histogram, where the bins grow with the value. Thus,
+    sketches can be merged and values can be removed again by adding a negative
+    weight.
+
+    Parameters
+    ----------
+    sketch : dict
+        quantile sketch, mapping bin to number of values
+    value : float
+        value which is added
+    weight : int
+        number of times the value is added
+    """
+    key = get_bin_of_value(value)
+    sketch[key] = sketch.get(key, 0) + weight
+    if sketch[key] == 0:
+        del sketch[key]
+
+
+def merge_sketches(sketch, other_sketch):
+    """Merge other quantile sketch into sketch.
+
+    Parameters
+    ----------
+    sketch : dict
+        quantile sketch which is updated
+    other_sketch : dict
+        quantile sketch which is merged
+    """
+    for key, number_of_values in other_sketch.items():
+        sketch[key] = sketch.get(key, 0) + number_of_values
+        if sketch[key] == 0:
+            del sketch[key]
+
+
+def estimate_quantile(sketch, quantile):
+    """Estimate quantile from quantile sketch.
+
+    Parameters
+    ----------
+    sketch : dict
+        quantile sketch
+    quantile : float
+        quantile between 0 and 1
+
+    Returns
+    -------
+     : float
+        estimated quantile or None if sketch is empty
+    """
+    bins = sorted(
+        ((get_value_of_bin(key), number) for key, number in sketch.items()),
+        key=lambda item: item[0],
+    )
+    number_of_values = sum(number for _, number in bins)
+    if number_of_values <= 0:
+        return None
+
+    rank = quantile * (number_of_values - 1)
+    cumulative_number = 0
+    for key_value, number in bins:
+        cumulative_number = cumulative_number + number
+        if cumulative_number > rank:
+            return key_value
+
+    return bins[-1][0]
+
+
+def get_bin_of_value(value):
+    """Get bin of quantile sketch a value belongs to.
+
+    Parameters
+    ----------
+    value : float
+        value which is added to the sketch
+
+    Returns
+    -------
+     : str
+        bin of sketch
+    """
+    if value <= 0:
+        return "0"
+    return str(math.ceil(math.log(value, _SKETCH_GAMMA)))
+
+
+def get_value_of_bin(key):
+    """Get representative value of bin of quantile sketch.
+
+    The relative error to any value in the bin is below `SKETCH_RELATIVE_ACCURACY`.
+
+    Parameters
+    ----------
+    key : str
+        bin of sketch
+
+    Returns
+    -------
+     : float
+        representative value of bin
+    """
+    if key == "0":
+        return 0.0
+    return 2 * _SKETCH_GAMMA ** int(key) / (_SKETCH_GAMMA + 1)
+
+
+def convert_car_to_dict(car):
+    """Convert data of car to dict.
+
+    Parameters
+    ----------
+    car : dict, pd.Series or DataFrame
+        data of car, a DataFrame is expected to contain a single row
+
+    Returns
+    -------
+     : dict
+        data of car
+    """
+    if isinstance(car, dict):
+        return car
+    elif car.ndim == 2:
+        return car.iloc[0].to_dict()
+    return car.to_dict()
+
+
+def normalize_group_value(value):
+    """Normalize value of a grouping column, so it can be used as key.
+
+    Parameters
+    ----------
+    value : object
+        value of grouping column, e.g. manufacturer or entry year
+
+    Returns
+    -------
+     : str
+        normalized value, missing values are converted to an empty string
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def convert_to_number(value):
+    """Convert value to number.
+
+    Parameters
+    ----------
+    value : object
+        value of column
+
+    Returns
+    -------
+     : float
+        value as number or None if value is missing or not a number
+    """
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(value):
+        return None
+    return value
+
+
+def create_empty_group(values):
+    """Create statistics of an empty market segment.
+
+    Parameters
+    ----------
+    values : list
+        values of the grouping columns of the market segment
+
+    Returns
+    -------
+     : dict
+        empty statistics
+    """
+    return {
+        "values": values,
+        "count": 0,
+        "uploaded_again": 0,
+        "counts": {},
+        "sums": {},
+        "sketches": {},
+    }
+
+
+def get_groups_of_car(aggregates, car):
+    """Get statistics of all market segments a car belongs to.
+
+    Parameters
+    ----------
+    aggregates : dict
+        market aggregates
+    car : dict
+        data of car
+
+    Returns
+    -------
+     : list
+        statistics of market segments
+    """
+    groups = []
+    for grouping in aggregates["groupings"].values():
+        values = [
+            normalize_group_value(car.get(column)) for column in grouping["columns"]
+        ]
+        key = "|".join(values)
+        groups.append(grouping["groups"].setdefault(key, create_empty_group(values)))
+
+    return groups
+
+
+def change_aggregates(aggregates, car, weight):
+    """Add or remove car to statistics of all market segments it belongs to.
+
+    Parameters
+    ----------
+    aggregates : dict
+        market aggregates
+    car : dict
+        data of car
+    weight : int
+        1 for adding the car, -1 for removing the car
+    """
+    for group in get_groups_of_car(aggregates, car):
+        group["count"] = group["count"] + weight
+        for column in AGGREGATE_COLUMNS:
+            value = convert_to_number(car.get(column))
+            if value is None:
+                continue
+            group["counts"][column] = group["counts"].get(column, 0) + weight
+            group["sums"][column] = group["sums"].get(column, 0) + weight * value
+            add_value_to_sketch(
+                group["sketches"].setdefault(column, {}), value, weight=weight
+            )
+
+
+def merge_groups(group, other_group):
+    """Merge statistics of other market segment into market segment.
+
+    Parameters
+    ----------
+    group : dict
+        statistics which are updated
+    other_group : dict
+        statistics which are merged
+    """
+    group["count"] = group["count"] + other_group["count"]
+    group["uploaded_again"] = group.get("uploaded_again", 0) + other_group.get(
+        "uploaded_again", 0
+    )
+    for column, number in other_group["counts"].items():
+        group["counts"][column] = group["counts"].get(column, 0) + number
+    for column, total in other_group["sums"].items():
+        group["sums"][column] = group["sums"].get(column, 0) + total
+    for column, sketch in other_group["sketches"].items():
+        merge_sketches(group["sketches"].setdefault(column, {}), sketch)
+
+
+def calculate_mean(group, column):
+    """Calculate mean of column from statistics of market segment.
+
+    Parameters
+    ----------
+    group : dict
+        statistics of market segment
+    column : str
+        aggregated column
+
+    Returns
+    -------
+     : float
+        mean or None if no values are available
+    """
+    number = group["counts"].get(column, 0)
+    if number <= 0:
+        return None
+    return group["sums"][column] / number
@@ -0,0 +1,482 @@
+"""Utility functions for estimating market prices from a sample of car advertisments.
+
+A full crawl visits every result webpage of every search query, although a median
+price per market segment can be estimated well from a few hundred cars. A sampling
+crawl instead treats each search query as a stratum and draws a stratified random
+sample within a budget of browser time: it opens randomly chosen result webpages of
+a stratum and processes only a few randomly chosen car advertisments of each.
+
+Strata are sampled in proportion to the square root of their number of cars, which
+trades the precision of the estimate of each stratum against the one of the whole
+market. The median price of a stratum comes with a distribution-free confidence
+interval from the order statistics of its sample, the median of the whole market
+weights each car by the number of cars it represents and comes with a confidence
+interval from a stratified bootstrap.
+"""
+import math
+import time
+from datetime import datetime
+from os.path import exists, splitext
+
+import numpy as np
+import pandas as pd
+from scipy.stats import binom
+
+from utils_crawl import get_car_of_url, process_car_advertisement, save_crawl
+from utils_page_watchdog import PageLoadTimeout
+from utils_website_interaction import (
+    fetch_links_of_result_webpage,
+    open_result_webpage,
+)
+from utils_website_scraping import (
+    scrape_links_to_detailed_car_advertisement,
+    scrape_number_of_result_webpages,
+)
+
+# car advertisments processed per opened result webpage: more spread the sample over
+# the result webpages, fewer pay more often for loading a result webpage
+DEFAULT_ADS_PER_SAMPLED_PAGE = 4
+
+CONFIDENCE_LEVEL = 0.95
+NUMBER_OF_BOOTSTRAP_SAMPLES = 1000
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# name of the row of all strata in the summary, apart from any search query name
+ALL_STRATA = "(all strata)"
+
+
+def get_path_to_market_snapshots(path_to_dataset):
+    """Derive the path of the market snapshots which are kept next to the data set.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+
+    Returns
+    -------
+     : str
+        path to CSV file of market snapshots
+    """
+    return splitext(path_to_dataset)[0] + "_market_snapshots.csv"
+
+
+def open_stratum(driver_search_result_overview, search_query, rng):
+    """Open the first result webpage of a search query to size its stratum.
+
+    Parameters
+    ----------
+    driver_search_result_overview : selenium.Webdriver
+        webdriver for the result webpages
+    search_query : dict
+        search query with "name" and "url" of its first result webpage
+    rng : np.random.Generator
+        random number generator
+
+    Returns
+    -------
+    stratum : dict
+        url, number of result webpages and cars, result webpages in random order and
+        the sampled prices, None if the first result webpage could not be loaded
+    """
+    try:
+        open_result_webpage(driver_search_result_overview, search_query["url"], 1)
+    except PageLoadTimeout as exception:
+        print(f"{exception} Skipping search query {search_query['name']}.")
+        return None
+
+    number_of_pages = scrape_number_of_result_webpages(driver_search_result_overview)
+    links_of_first_page = scrape_links_to_detailed_car_advertisement(
+        driver_search_result_overview
+    )
+
+    return {
+        "url": search_query["url"],
+        "number_of_pages": number_of_pages,
+        # approximately, as the last result webpage may not be full
+        "number_of_cars": number_of_pages * len(links_of_first_page),
+        "unvisited_pages": list(rng.permutation(np.arange(1, number_of_pages + 1))),
+        "links_of_first_page": links_of_first_page,
+        "pending_links": [],
+        "visited_pages": 0,
+        "visited_ads": 0,
+        "prices": [],
+    }
+
+
+def choose_next_stratum(strata):
+    """Choose the stratum which lags furthest behind its share of the sample.
+
+    Parameters
+    ----------
+    strata : dict
+        stratum per search query name
+
+    Returns
+    -------
+     : str
+        name of stratum, None if all strata are exhausted
+    """
+    candidates = [
+        name
+        for name, stratum in strata.items()
+        if stratum["number_of_cars"]
+        and (stratum["pending_links"] or stratum["unvisited_pages"])
+    ]
+    if not candidates:
+        return None
+
+    return min(
+        candidates,
+        key=lambda name: strata[name]["visited_ads"]
+        / math.sqrt(strata[name]["number_of_cars"]),
+    )
+
+
+def draw_links_of_page(
+    driver_search_result_overview, stratum, ads_per_sampled_page, rng
+):
+    """Open the next random result webpage of a stratum and draw links from it.
+
+    Parameters
+    ----------
+    driver_search_result_overview : selenium.Webdriver
+        webdriver for the result webpages
+    stratum : dict
+        stratum of search query
+    ads_per_sampled_page : int
+        number of car advertisments drawn from the result webpage
+    rng : np.random.Generator
+        random number generator
+    """
+    result_webpage = int(stratum["unvisited_pages"].pop())
+    stratum["visited_pages"] = stratum["visited_pages"] + 1
+    if result_webpage == 1:
+        links = stratum["links_of_first_page"]
+    else:
+        try:
+            links = fetch_links_of_result_webpage(
+                driver_search_result_overview, stratum["url"], result_webpage
+            )
+        except PageLoadTimeout as exception:
+            print(f"{exception} Skipping webpage {result_webpage}.")
+            return
+
+    number_of_drawn_links = min(ads_per_sampled_page, len(links))
+    stratum["pending_links"] = list(
+        rng.choice(np.array(links, dtype=object), number_of_drawn_links, replace=False)
+    )
+
+
+def sample_search_queries(
+    crawl,
+    driver_search_result_overview,
+    driver_detailed_car,
+    search_queries,
+    budget_s,
+    ads_per_sampled_page=DEFAULT_ADS_PER_SAMPLED_PAGE,
+    seed=None,
+):
+    """Process a stratified random sample of the car advertisments of search queries.
+
+    Sampled car advertisments are processed like in a full crawl, so new cars are
+    attached to the data set and known cars are only updated if uploaded again.
+
+    Parameters
+    ----------
+    crawl : dict
+        state of crawl
+    driver_search_result_overview : selenium.Webdriver
+        webdriver for the result webpages
+    driver_detailed_car : selenium.Webdriver
+        webdriver for the webpages with car details
+    search_queries : list
+        search queries, each a stratum
+    budget_s : float
+        browser time in s after which no further car advertisment is processed
+    ads_per_sampled_page : int
+        number of car advertisments drawn from each opened result webpage
+    seed : int
+        seed of the random sample, a random one if None
+
+    Returns
+    -------
+    strata : dict
+        stratum with its number of cars and sampled prices per search query name
+    """
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+
+    strata = {}
+    for search_query in search_queries:
+        print(f"sizing search query {search_query['name']}.")
+        stratum = open_stratum(driver_search_result_overview, search_query, rng)
+        if stratum is not None:
+            strata[search_query["name"]] = stratum
+
+    name = choose_next_stratum(strata)
+    while name is not None and time.perf_counter() - start < budget_s:
+        stratum = strata[name]
+        if not stratum["pending_links"]:
+            draw_links_of_page(
+                driver_search_result_overview, stratum, ads_per_sampled_page, rng
+            )
+        if stratum["pending_links"]:
+            link_to_car_advertisement = stratum["pending_links"].pop()
+            stratum["visited_ads"] = stratum["visited_ads"] + 1
+            outcome = process_car_advertisement(
+                crawl, driver_detailed_car, link_to_car_advertisement
+            )
+            if outcome != "failed":
+                car = get_car_of_url(crawl, link_to_car_advertisement)
+                price = pd.to_numeric(car["price_sek"], errors="coerce")
+                if pd.notna(price):
+                    stratum["prices"].append(float(price))
+        name = choose_next_stratum(strata)
+
+    save_crawl(crawl)
+
+    duration_s = time.perf_counter() - start
+    print(
+        f"sampled {sum(len(stratum['prices']) for stratum in strata.values())} of",
+        f"about {sum(stratum['number_of_cars'] for stratum in strata.values())}",
+        f"car advertisment(s) on {sum(s['visited_pages'] for s in strata.values())}",
+        f"of {sum(s['number_of_pages'] for s in strata.values())} result webpage(s)",
+        f"in {duration_s:.0f} s.",
+    )
+
+    return strata
+
+
+def estimate_median_with_confidence_interval(values, confidence=CONFIDENCE_LEVEL):
+    """Estimate the median of a simple random sample with a confidence interval.
+
+    The interval is bounded by order statistics of the sample, whose ranks follow
+    from the binomial distribution, so it does not assume a distribution of prices.
+
+    Parameters
+    ----------
+    values : array-like
+        sampled values
+    confidence : float
+        confidence level of interval
+
+    Returns
+    -------
+    median : float
+        median of sample, NaN if empty
+    lower : float
+        lower bound of interval, NaN if the sample is too small
+    upper : float
+        upper bound of interval, NaN if the sample is too small
+    """
+    values = np.sort(np.asarray(values, dtype=float))
+    number_of_values = len(values)
+    if not number_of_values:
+        return np.nan, np.nan, np.nan
+
+    median = float(np.median(values))
+    rank = int(binom.ppf((1 - confidence) / 2, number_of_values, 0.5))
+    if rank < 1:
+        return median, np.nan, np.nan
+
+    return median, values[rank - 1], values[number_of_values - rank]
+
+
+def calculate_weighted_medians(values, weights):
+    """Calculate the weighted median of each row.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        values with one sample per row
+    weights : np.ndarray
+        weight of each column
+
+    Returns
+    -------
+     : np.ndarray
+        weighted median per row
+    """
+    order = np.argsort(values, axis=1)
+    cumulative_weights = np.cumsum(weights[order], axis=1)
+    middle = (cumulative_weights < cumulative_weights[:, -1:] / 2).sum(axis=1)
+
+    return np.take_along_axis(values, order, axis=1)[np.arange(len(values)), middle]
+
+
+def estimate_market_median_with_confidence_interval(
+    strata, confidence=CONFIDENCE_LEVEL, seed=None
+):
+    """Estimate the median of all strata with a stratified bootstrap interval.
+
+    Each sampled car represents the number of cars of its stratum divided by the size
+    of its sample.
+
+    Parameters
+    ----------
+    strata : dict
+        stratum with its number of cars and sampled prices per search query name
+    confidence : float
+        confidence level of interval
+    seed : int
+        seed of the bootstrap samples, a random one if None
+
+    Returns
+    -------
+    median : float
+        weighted median of sample, NaN if empty
+    lower : float
+        lower bound of interval
+    upper : float
+        upper bound of interval
+    """
+    sampled_strata = [stratum for stratum in strata.values() if stratum["prices"]]
+    if not sampled_strata:
+        return np.nan, np.nan, np.nan
+
+    weights = np.concatenate(
+        [
+            np.full(len(stratum["prices"]), stratum["number_of_cars"])
+            / len(stratum["prices"])
+            for stratum in sampled_strata
+        ]
+    )
+    prices = np.concatenate([stratum["prices"] for stratum in sampled_strata])
+    median = calculate_weighted_medians(prices[np.newaxis], weights)[0]
+
+    rng = np.random.default_rng(seed)
+    bootstrap_prices = np.concatenate(
+        [
+            rng.choice(
+                np.asarray(stratum["prices"]),
+                (NUMBER_OF_BOOTSTRAP_SAMPLES, len(stratum["prices"])),
+            )
+            for stratum in sampled_strata
+        ],
+        axis=1,
+    )
+    lower, upper = np.quantile(
+        calculate_weighted_medians(bootstrap_prices, weights),
+        [(1 - confidence) / 2, (1 + confidence) / 2],
+    )
+
+    return median, lower, upper
+
+
+def summarize_market_sample(strata, confidence=CONFIDENCE_LEVEL):
+    """Estimate the median price of each stratum and of the whole market.
+
+    Parameters
+    ----------
+    strata : dict
+        stratum with its number of cars and sampled prices per search query name
+    confidence : float
+        confidence level of intervals
+
+    Returns
+    -------
+    summary : DataFrame
+        estimated number of cars, size of sample and median price with the bounds of
+        its confidence interval per stratum and for all strata
+    """
+    rows = []
+    for name, stratum in strata.items():
+        median, lower, upper = estimate_median_with_confidence_interval(
+            stratum["prices"], confidence
+        )
+        rows.append(
+            [name, stratum["number_of_cars"], len(stratum["prices"])]
+            + [median, lower, upper]
+        )
+    rows.append(
+        [
+            ALL_STRATA,
+            sum(stratum["number_of_cars"] for stratum in strata.values()),
+            sum(len(stratum["prices"]) for stratum in strata.values()),
+            *estimate_market_median_with_confidence_interval(strata, confidence),
+        ]
+    )
+
+    return pd.DataFrame(
+        rows,
+        columns=[
+            "stratum",
+            "number_of_cars",
+            "sampled_cars",
+            "median_price_sek",
+            "median_price_sek_lower",
+            "median_price_sek_upper",
+        ],
+    )
+
+
+def save_market_snapshot(summary, path_to_market_snapshots):
+    """Append the summary of a market sample to the market snapshots.
+
+    Parameters
+    ----------
+    summary : DataFrame
+        summary as returned by `summarize_market_sample`
+    path_to_market_snapshots : str
+        path to CSV file of market snapshots
+    """
+    summary.assign(snapshot_datetime=datetime.now().strftime(DATETIME_FORMAT)).to_csv(
+        path_to_market_snapshots,
+        mode="a",
+        header=not exists(path_to_market_snapshots),
+        index=False,
+    )
+
+
+def run_sampling_crawl(
+    crawl,
+    driver_search_result_overview,
+    driver_detailed_car,
+    search_queries,
+    budget_s,
+    ads_per_sampled_page=DEFAULT_ADS_PER_SAMPLED_PAGE,
+    seed=None,
+):
+    """Estimate median prices per search query from a sample and save the snapshot.
+
+    Parameters
+    ----------
+    crawl : dict
+        state of crawl
+    driver_search_result_overview : selenium.Webdriver
+        webdriver for the result webpages
+    driver_detailed_car : selenium.Webdriver
+        webdriver for the webpages with car details
+    search_queries : list
+        search queries, each a stratum
+    budget_s : float
+        browser time in s after which no further car advertisment is processed
+    ads_per_sampled_page : int
+        number of car advertisments drawn from each opened result webpage
+    seed : int
+        seed of the random sample, a random one if None
+
+    Returns
+    -------
+    summary : DataFrame
+        estimated median price with confidence interval per stratum and for all
+    """
+    strata = sample_search_queries(
+        crawl,
+        driver_search_result_overview,
+        driver_detailed_car,
+        search_queries,
+        budget_s,
+        ads_per_sampled_page,
+        seed,
+    )
+    summary = summarize_market_sample(strata)
+    print(summary.to_string(index=False, float_format="{:.0f}".format))
+
+    path_to_market_snapshots = get_path_to_market_snapshots(crawl["path_to_dataset"])
+    save_market_snapshot(summary, path_to_market_snapshots)
+    print(f"Appended market snapshot to: {path_to_market_snapshots}")
+
+    return summary
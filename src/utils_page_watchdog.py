@@ -0,0 +1,189 @@
+"""Utility functions for bounding the time a webdriver may spend on loading a page.
+
+A stalled ad script or a hanging request would otherwise block the crawl for
+minutes. Pages are loaded with the eager page load strategy by default, which does
+not wait for images, stylesheets and scripts after the document is parsed, and each
+page load gets a time budget as page load timeout of the webdriver.
+
+A webdriver which does not return within its budget and a grace period is stuck
+itself. A watchdog then quits its browser, which makes the blocked call return, and
+opens a new browser. Either way the page load raises `PageLoadTimeout`, so the crawl
+can record the url for a later retry and continue with the next page.
+"""
+import threading
+import time
+
+# page load strategies of the webdriver: "normal" waits for all resources, "eager"
+# until the document is parsed and "none" only until the page load has started,
+# so elements are waited for by the implicit wait of the webdriver
+PAGE_LOAD_STRATEGIES = ("normal", "eager", "none")
+DEFAULT_PAGE_LOAD_STRATEGY = "eager"
+
+DEFAULT_PAGE_TIME_BUDGET_S = 20
+
+# time the watchdog gives a webdriver past the budget to return by itself
+WATCHDOG_GRACE_S = 10
+
+
+class PageLoadTimeout(Exception):
+    """Loading a page exceeded its time budget."""
+
+
+def create_firefox_options(page_load_strategy=DEFAULT_PAGE_LOAD_STRATEGY):
+    """Create the options of Firefox with a page load strategy.
+
+    Parameters
+    ----------
+    page_load_strategy : str
+        one of `PAGE_LOAD_STRATEGIES`
+
+    Returns
+    -------
+    options : selenium.webdriver.FirefoxOptions
+        options of Firefox
+    """
+    from selenium import webdriver
+
+    options = webdriver.FirefoxOptions()
+    options.page_load_strategy = page_load_strategy
+
+    return options
+
+
+def stop_page_load(driver):
+    """Stop loading the remaining resources of the current page.
+
+    Parameters
+    ----------
+    driver : selenium.Webdriver
+        webdriver whose page load timed out
+    """
+    try:
+        driver.execute_script("window.stop();")
+    except Exception:
+        pass
+
+
+class WatchdogDriver:
+    """Webdriver whose page loads are bounded by a time budget.
+
+    A page load which exceeds the budget is stopped and raises `PageLoadTimeout`. If
+    the wrapped webdriver does not return within the budget and `WATCHDOG_GRACE_S`,
+    its browser is quit and, if `restart_when_stuck`, a new one is opened, otherwise
+    the crawl fails on the next page. All other attributes are passed through to the
+    wrapped webdriver.
+    """
+
+    def __init__(
+        self,
+        open_driver,
+        page_time_budget_s=DEFAULT_PAGE_TIME_BUDGET_S,
+        restart_when_stuck=True,
+    ):
+        self.open_driver = open_driver
+        self.page_time_budget_s = page_time_budget_s
+        self.restart_when_stuck = restart_when_stuck
+        self.driver = self.open_bounded_driver()
+        self.implicit_wait = 0
+        self.number_of_timeouts = 0
+        self.number_of_restarts = 0
+
+    def __getattr__(self, name):
+        """Pass attribute through to the wrapped webdriver."""
+        return getattr(self.driver, name)
+
+    def open_bounded_driver(self):
+        """Open a webdriver with the time budget as page load timeout.
+
+        Returns
+        -------
+        driver : selenium.Webdriver
+            webdriver for website interactions
+        """
+        driver = self.open_driver()
+        driver.set_page_load_timeout(self.page_time_budget_s)
+
+        return driver
+
+    def quit_stuck_driver(self, driver, stuck):
+        """Quit the browser of a webdriver which is stuck on loading a page.
+
+        Called by the watchdog timer, so the blocked page load returns.
+
+        Parameters
+        ----------
+        driver : selenium.Webdriver
+            webdriver which is stuck
+        stuck : threading.Event
+            set to tell the page load that the watchdog has quit the webdriver
+        """
+        stuck.set()
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def implicitly_wait(self, time_to_wait):
+        """Set the implicit wait of the wrapped webdriver and remember it.
+
+        The stuck webdriver cannot be asked for its implicit wait anymore.
+        """
+        self.implicit_wait = time_to_wait
+        self.driver.implicitly_wait(time_to_wait)
+
+    def restart(self):
+        """Open a new webdriver with the same implicit wait as the stuck one."""
+        self.driver = self.open_bounded_driver()
+        self.driver.implicitly_wait(self.implicit_wait)
+        self.number_of_restarts = self.number_of_restarts + 1
+
+    def get(self, url):
+        """Load a page within the time budget.
+
+        Parameters
+        ----------
+        url : str
+            url of webpage
+
+        Raises
+        ------
+        PageLoadTimeout
+            if the page load exceeds the time budget
+        """
+        from selenium.common.exceptions import TimeoutException
+
+        start = time.monotonic()
+        stuck = threading.Event()
+        watchdog = threading.Timer(
+            self.page_time_budget_s + WATCHDOG_GRACE_S,
+            self.quit_stuck_driver,
+            (self.driver, stuck),
+        )
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            self.driver.get(url)
+        except TimeoutException:
+            stop_page_load(self.driver)
+            self.number_of_timeouts = self.number_of_timeouts + 1
+            raise PageLoadTimeout(
+                f"Loading {url} exceeded {self.page_time_budget_s} s."
+            ) from None
+        except Exception:
+            if not stuck.is_set():
+                raise
+        finally:
+            watchdog.cancel()
+
+        if stuck.is_set():
+            self.number_of_timeouts = self.number_of_timeouts + 1
+            print(
+                f"browser got stuck on {url},",
+                f"quit it after {time.monotonic() - start:.1f} s.",
+            )
+            if self.restart_when_stuck:
+                self.restart()
+            raise PageLoadTimeout(
+                f"Browser got stuck on loading {url} for more than "
+                f"{self.page_time_budget_s + WATCHDOG_GRACE_S} s."
+            )
@@ -0,0 +1,407 @@
+"""Utility functions for incrementally training a price model of used cars.
+
+The encoded feature matrix of all cars is kept in a cache next to the data set.
+After a crawl only the newly attached cars are encoded and appended to the cache
+and the price model is updated with these cars instead of being refit from scratch.
+"""
+import pickle
+import time
+from os import makedirs
+from os.path import exists, join, splitext
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.linear_model import SGDRegressor
+
+# numerical columns as produced by `attach_new_used_car` and the fixed offset and
+# scale they are normalized with. Fixed values are used instead of a fitted scaler,
+# so that the cached encoding of a car never changes when new cars are added.
+NUMERIC_FEATURES = {
+    "entry_year": (2010, 10),
+    "mileage_km": (0, 100000),
+    "horse_power": (0, 100),
+    "engine_size_ccm": (0, 1000),
+    "co2_emission_g/km": (0, 100),
+    "fuel_consumption_mixed_l_100km": (0, 10),
+    "electric_range_km": (0, 100),
+    "empty_weight_kg": (0, 1000),
+}
+
+# categorical columns as produced by `attach_new_used_car`, which are one-hot encoded
+# with the hashing trick. Thus, no vocabulary has to be kept and categories which are
+# seen for the first time do not change the width of the feature matrix.
+CATEGORICAL_FEATURES = [
+    "manufacturer",
+    "model",
+    "fuel",
+    "transmission",
+    "type_of_drive",
+    "car_type",
+    "emission_class",
+    "location",
+]
+
+NUMBER_OF_HASHED_FEATURES = 2**14
+
+
+def get_path_to_price_model_cache(path_to_dataset):
+    """Derive the path of the price model cache which is kept next to the data set.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+
+    Returns
+    -------
+     : str
+        path to directory of price model cache
+    """
+    return splitext(path_to_dataset)[0] + "_price_model"
+
+
+def encode_car_features(cars):
+    """Encode characteristics of cars to a feature matrix.
+
+    Parameters
+    ----------
+    cars : DataFrame
+        cars with columns as attached by `attach_new_used_car`
+
+    Returns
+    -------
+     : scipy.sparse.csr_matrix
+        feature matrix with one row per car
+    """
+    numeric_features = []
+    for column, (offset, scale) in NUMERIC_FEATURES.items():
+        if column in cars:
+            values = pd.to_numeric(cars[column], errors="coerce").to_numpy(float)
+        else:
+            values = np.full(len(cars), np.nan)
+        is_missing = np.isnan(values)
+        numeric_features.append(np.where(is_missing, 0.0, (values - offset) / scale))
+        numeric_features.append(is_missing.astype(float))
+    numeric_features = sp.csr_matrix(np.column_stack(numeric_features))
+
+    hasher = FeatureHasher(
+        n_features=NUMBER_OF_HASHED_FEATURES, input_type="string", alternate_sign=False
+    )
+    categorical_features = hasher.transform(
+        [
+            [
+                f"{column}={car.get(column)}"
+                for column in CATEGORICAL_FEATURES
+                if pd.notna(car.get(column))
+            ]
+            for car in cars.to_dict(orient="records")
+        ]
+    )
+
+    return sp.hstack([numeric_features, categorical_features], format="csr")
+
+
+def initialize_or_import_feature_cache(path_to_cache):
+    """Import existing feature cache or create an empty one.
+
+    Parameters
+    ----------
+    path_to_cache : str
+        path to directory of price model cache
+
+    Returns
+    -------
+    feature_cache : dict
+        urls of cached cars, their encoded feature matrix and the log prices the
+        price model has been trained with
+    """
+    path_to_features = join(path_to_cache, "features.npz")
+    path_to_urls = join(path_to_cache, "urls.npy")
+    if exists(path_to_features) and exists(path_to_urls):
+        print(f"Importing cached feature matrix: {path_to_features}")
+        feature_cache = {
+            "urls": np.load(path_to_urls, allow_pickle=True),
+            "features": sp.load_npz(path_to_features),
+            "trained_log_prices": np.load(join(path_to_cache, "log_prices.npy")),
+        }
+    else:
+        print(f"Creating new feature cache at: {path_to_cache}")
+        feature_cache = {
+            "urls": np.array([], dtype=object),
+            "features": sp.csr_matrix(
+                (0, 2 * len(NUMERIC_FEATURES) + NUMBER_OF_HASHED_FEATURES)
+            ),
+            "trained_log_prices": np.array([], dtype=float),
+        }
+
+    return feature_cache
+
+
+def update_feature_cache(feature_cache, used_car_data):
+    """Encode cars which are not cached yet and append them to the feature cache.
+
+    Parameters
+    ----------
+    feature_cache : dict
+        urls of cached cars and their encoded feature matrix
+    used_car_data : DataFrame
+        data set of used cars
+
+    Returns
+    -------
+    feature_cache : dict
+        updated feature cache
+    new_rows : np.ndarray
+        rows of feature matrix which have been appended
+    """
+    is_new_car = ~used_car_data["url"].isin(set(feature_cache["urls"]))
+    new_cars = used_car_data[is_new_car].drop_duplicates(subset="url")
+
+    number_of_cached_cars = len(feature_cache["urls"])
+    new_rows = np.arange(number_of_cached_cars, number_of_cached_cars + len(new_cars))
+    if len(new_cars):
+        feature_cache["features"] = sp.vstack(
+            [feature_cache["features"], encode_car_features(new_cars)], format="csr"
+        )
+        feature_cache["urls"] = np.concatenate(
+            [feature_cache["urls"], new_cars["url"].to_numpy(dtype=object)]
+        )
+        feature_cache["trained_log_prices"] = np.concatenate(
+            [feature_cache["trained_log_prices"], np.full(len(new_cars), np.nan)]
+        )
+
+    return feature_cache, new_rows
+
+
+def save_feature_cache(feature_cache, path_to_cache):
+    """Save feature cache to directory.
+
+    Parameters
+    ----------
+    feature_cache : dict
+        urls of cached cars and their encoded feature matrix
+    path_to_cache : str
+        path to directory of price model cache
+    """
+    makedirs(path_to_cache, exist_ok=True)
+    sp.save_npz(join(path_to_cache, "features.npz"), feature_cache["features"])
+    np.save(join(path_to_cache, "urls.npy"), feature_cache["urls"], allow_pickle=True)
+    np.save(join(path_to_cache, "log_prices.npy"), feature_cache["trained_log_prices"])
+
+
+def get_prices_of_cached_cars(feature_cache, used_car_data):
+    """Get current log prices of cached cars.
+
+    Prices are looked up on every refresh, as they may have been updated by
+    `update_price_of_car` since the car was cached.
+
+    Parameters
+    ----------
+    feature_cache : dict
+        urls of cached cars and their encoded feature matrix
+    used_car_data : DataFrame
+        data set of used cars
+
+    Returns
+    -------
+     : np.ndarray
+        logarithm of price in SEK per cached car, NaN if price is unknown
+    """
+    prices = used_car_data.drop_duplicates(subset="url", keep="last").set_index("url")
+    prices = (
+        pd.to_numeric(prices["price_sek"], errors="coerce")
+        .reindex(feature_cache["urls"])
+        .to_numpy(dtype=float, copy=True)
+    )
+    prices[prices <= 0] = np.nan
+
+    return np.log(prices)
+
+
+def get_rows_with_changed_prices(feature_cache, log_prices):
+    """Get rows of cached cars whose price differs from the one the model knows.
+
+    This includes newly cached cars as well as cars whose price has been updated.
+
+    Parameters
+    ----------
+    feature_cache : dict
+        urls of cached cars, their encoded feature matrix and the log prices the
+        price model has been trained with
+    log_prices : np.ndarray
+        current logarithm of prices of cached cars
+
+    Returns
+    -------
+     : np.ndarray
+        rows of feature matrix the price model has to be updated with
+    """
+    trained_log_prices = feature_cache["trained_log_prices"]
+    has_changed = ~np.isnan(log_prices) & (
+        np.isnan(trained_log_prices) | (log_prices != trained_log_prices)
+    )
+
+    return np.flatnonzero(has_changed)
+
+
+def initialize_or_import_price_model(path_to_cache):
+    """Import existing price model or create a new one.
+
+    Parameters
+    ----------
+    path_to_cache : str
+        path to directory of price model cache
+
+    Returns
+    -------
+    price_model : SGDRegressor
+        model predicting the logarithm of the price of a car
+    """
+    path_to_model = join(path_to_cache, "price_model.pkl")
+    if exists(path_to_model):
+        print(f"Importing price model: {path_to_model}")
+        with open(path_to_model, "rb") as file:
+            price_model = pickle.load(file)
+    else:
+        price_model = SGDRegressor(
+            loss="huber", penalty="l2", alpha=1e-5, learning_rate="adaptive"
+        )
+
+    return price_model
+
+
+def save_price_model(price_model, path_to_cache):
+    """Save price model to directory.
+
+    Parameters
+    ----------
+    price_model : SGDRegressor
+        model predicting the logarithm of the price of a car
+    path_to_cache : str
+        path to directory of price model cache
+    """
+    makedirs(path_to_cache, exist_ok=True)
+    with open(join(path_to_cache, "price_model.pkl"), "wb") as file:
+        pickle.dump(price_model, file)
+
+
+def refresh_price_model(price_model, features, log_prices, rows, number_of_epochs=5):
+    """Update price model incrementally with the given rows of the feature matrix.
+
+    Parameters
+    ----------
+    price_model : SGDRegressor
+        model predicting the logarithm of the price of a car
+    features : scipy.sparse.csr_matrix
+        cached feature matrix
+    log_prices : np.ndarray
+        logarithm of prices of cached cars
+    rows : np.ndarray
+        rows the model is updated with, e.g. the newly cached cars
+    number_of_epochs : int
+        number of passes over the rows
+
+    Returns
+    -------
+    price_model : SGDRegressor
+        updated price model
+    """
+    rows = rows[~np.isnan(log_prices[rows])]
+    if not len(rows):
+        return price_model
+
+    random_generator = np.random.default_rng(0)
+    for _ in range(number_of_epochs):
+        shuffled_rows = random_generator.permutation(rows)
+        price_model.partial_fit(features[shuffled_rows], log_prices[shuffled_rows])
+
+    return price_model
+
+
+def measure_prediction_performance(
+    price_model, features, number_of_single_predictions=100
+):
+    """Measure latency of single predictions and throughput of batch predictions.
+
+    Parameters
+    ----------
+    price_model : SGDRegressor
+        fitted price model
+    features : scipy.sparse.csr_matrix
+        feature matrix used for the predictions
+    number_of_single_predictions : int
+        number of single predictions the latency is measured with
+
+    Returns
+    -------
+     : dict
+        median latency in milliseconds and throughput in cars per second
+    """
+    latencies = []
+    for row in range(min(number_of_single_predictions, features.shape[0])):
+        start = time.perf_counter()
+        price_model.predict(features[row])
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    price_model.predict(features)
+    duration_of_batch_prediction = time.perf_counter() - start
+
+    return {
+        "latency_ms": float(np.median(latencies)) * 1000,
+        "throughput_cars_per_s": features.shape[0]
+        / max(duration_of_batch_prediction, 1e-9),
+    }
+
+
+def train_price_model_after_crawl(path_to_dataset, used_car_data):
+    """Append newly crawled cars to the feature cache and refresh the price model.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set the cache is kept next to
+    used_car_data : DataFrame
+        data set of used cars
+
+    Returns
+    -------
+    price_model : SGDRegressor
+        updated price model
+    """
+    start = time.perf_counter()
+    path_to_cache = get_path_to_price_model_cache(path_to_dataset)
+
+    feature_cache = initialize_or_import_feature_cache(path_to_cache)
+    feature_cache, new_rows = update_feature_cache(feature_cache, used_car_data)
+    log_prices = get_prices_of_cached_cars(feature_cache, used_car_data)
+    changed_rows = get_rows_with_changed_prices(feature_cache, log_prices)
+
+    price_model = initialize_or_import_price_model(path_to_cache)
+    price_model = refresh_price_model(
+        price_model, feature_cache["features"], log_prices, changed_rows
+    )
+    feature_cache["trained_log_prices"][changed_rows] = log_prices[changed_rows]
+    # new cars without a price are not among the changed rows
+    repriced_rows = changed_rows[~np.isin(changed_rows, new_rows)]
+
+    save_feature_cache(feature_cache, path_to_cache)
+    save_price_model(price_model, path_to_cache)
+    print(
+        f"Price model refreshed with {len(new_rows)} new and",
+        f"{len(repriced_rows)} re-priced car(s) in",
+        f"{time.perf_counter() - start:.2f} s.",
+    )
+
+    if hasattr(price_model, "coef_") and feature_cache["features"].shape[0]:
+        performance = measure_prediction_performance(
+            price_model, feature_cache["features"]
+        )
+        print(
+            f"Prediction latency: {performance['latency_ms']:.3f} ms,",
+            f"throughput: {performance['throughput_cars_per_s']:.0f} cars/s.",
+        )
+
+    return price_model
@@ -0,0 +1,188 @@
+"""Utility functions for parsing the Swedish publication timestamps of advertisments.
+
+Timestamps are shown relative to the day they are viewed, e.g. "idag 10:15",
+"igår 09:03" or "måndag 18:40", and as day and month for older advertisments,
+e.g. "Publicerad 3 mars 14:05". They are resolved against an explicit reference
+time, usually the start of the crawl, so historical timestamps can be re-derived.
+
+All forms are handled by a single compiled pattern and parsed strings are cached,
+since the same timestamps are parsed again on every visit of an advertisment.
+"""
+import re
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+import pandas as pd
+
+# days before the reference date of relative day words
+RELATIVE_DAYS = {"idag": 0, "igår": 1}
+
+WEEKDAYS = {
+    "måndag": 0,
+    "tisdag": 1,
+    "onsdag": 2,
+    "torsdag": 3,
+    "fredag": 4,
+    "lördag": 5,
+    "söndag": 6,
+}
+
+MONTHS = {
+    "jan": 1,
+    "januari": 1,
+    "feb": 2,
+    "februari": 2,
+    "mar": 3,
+    "mars": 3,
+    "apr": 4,
+    "april": 4,
+    "maj": 5,
+    "jun": 6,
+    "juni": 6,
+    "jul": 7,
+    "juli": 7,
+    "aug": 8,
+    "augusti": 8,
+    "sep": 9,
+    "sept": 9,
+    "september": 9,
+    "okt": 10,
+    "oktober": 10,
+    "nov": 11,
+    "november": 11,
+    "dec": 12,
+    "december": 12,
+}
+
+PUBLICATION_DATETIME_PATTERN = re.compile(
+    r"(?:\b(?P<day_word>"
+    + "|".join(list(RELATIVE_DAYS) + list(WEEKDAYS))
+    + r")\b"
+    + r"|\b(?P<day>\d{1,2})\.?\s+(?P<month>"
+    + "|".join(sorted(MONTHS, key=len, reverse=True))
+    + r")\b\.?(?:\s+(?P<year>\d{4}))?)"
+    + r"\D*?\b(?P<hour>\d{1,2})[:.](?P<minute>\d{2})\b",
+    re.IGNORECASE,
+)
+
+# number of distinct timestamps and reference dates kept in cache
+PUBLICATION_DATETIME_CACHE_SIZE = 2**16
+
+
+def extract_publication_datetime(date_time, reference_time=None):
+    """Extract the datetime of publication.
+
+    Parameters
+    ----------
+    date_time : str
+        date and time of publication as scraped from webpage
+    reference_time : datetime
+        time the webpage has been viewed, e.g. start of crawl, now if None
+
+    Returns
+    -------
+     : datetime
+        date and time of publication
+    """
+    reference_date = (reference_time or datetime.now()).date()
+
+    return parse_publication_datetime(date_time, reference_date)
+
+
+@lru_cache(maxsize=PUBLICATION_DATETIME_CACHE_SIZE)
+def parse_publication_datetime(date_time, reference_date):
+    """Parse a publication timestamp with respect to a reference date.
+
+    Day and month without year are assigned to the latest year in which they do
+    not lie after the reference date.
+
+    Parameters
+    ----------
+    date_time : str
+        date and time of publication as scraped from webpage
+    reference_date : date
+        date the webpage has been viewed
+
+    Returns
+    -------
+     : datetime
+        date and time of publication
+    """
+    match = PUBLICATION_DATETIME_PATTERN.search(date_time.lower())
+    if match is None:
+        raise ValueError(f"Unknown format of publication datetime: {date_time}")
+
+    day_word = match["day_word"]
+    if day_word in RELATIVE_DAYS:
+        publication_date = reference_date - timedelta(RELATIVE_DAYS[day_word])
+    elif day_word is not None:
+        # if weekday of publication lies before today the distance gets negative.
+        # e.g weekday of publication is Sunday (6) and today is Wednesday (3)
+        days_between_publication_and_today = (
+            reference_date.weekday() - WEEKDAYS[day_word]
+        ) % 7
+        publication_date = reference_date - timedelta(
+            days_between_publication_and_today
+        )
+    elif match["year"] is not None:
+        publication_date = date(
+            int(match["year"]), MONTHS[match["month"]], int(match["day"])
+        )
+    else:
+        publication_date = date(
+            reference_date.year, MONTHS[match["month"]], int(match["day"])
+        )
+        if publication_date > reference_date:
+            publication_date = publication_date.replace(year=reference_date.year - 1)
+
+    return datetime(
+        publication_date.year,
+        publication_date.month,
+        publication_date.day,
+        int(match["hour"]),
+        int(match["minute"]),
+    )
+
+
+def extract_publication_datetimes(date_times, reference_time=None):
+    """Extract the datetimes of publication of a whole column.
+
+    Each distinct timestamp is parsed only once.
+
+    Parameters
+    ----------
+    date_times : pd.Series or list
+        dates and times of publication as scraped from webpage
+    reference_time : datetime or pd.Series
+        time the webpages have been viewed, either one for all timestamps or one per
+        timestamp, now if None
+
+    Returns
+    -------
+     : pd.Series
+        dates and times of publication, NaT where a timestamp is missing
+    """
+    date_times = pd.Series(date_times)
+    if isinstance(reference_time, pd.Series):
+        reference_dates = pd.to_datetime(reference_time).dt.date.to_numpy()
+    else:
+        reference_dates = [(reference_time or datetime.now()).date()] * len(date_times)
+
+    publication_datetimes = {
+        (date_time, reference_date): parse_publication_datetime(
+            date_time, reference_date
+        )
+        for date_time, reference_date in set(zip(date_times, reference_dates))
+        if isinstance(date_time, str)
+    }
+
+    return pd.to_datetime(
+        pd.Series(
+            [
+                publication_datetimes.get(key)
+                for key in zip(date_times, reference_dates)
+            ],
+            index=date_times.index,
+            dtype=object,
+        )
+    )
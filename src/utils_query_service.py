@@ -0,0 +1,445 @@
+"""Utility functions for serving read queries over the data set as HTTP/JSON.
+
+The data set is kept in memory together with secondary indexes: the rows of each
+manufacturer, model and fuel, the rows sorted by entry year and by price for range
+filters, and the row of each url. A query intersects the rows of its filters, sorts
+and pages them and is cached until the crawler saves the data set again, which is
+detected by the modification time of the file.
+
+Example: GET /cars?manufacturer=Volvo&min_entry_year=2018&sort=-price_sek&page=2
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from utils_dataset_streaming import iter_dataset_chunks
+
+# columns with an index of the rows per value, which are filtered by equality
+CATEGORICAL_INDEX_COLUMNS = ["manufacturer", "model", "fuel"]
+
+# columns with an index of the rows sorted by value, which are filtered by range
+RANGE_INDEX_COLUMNS = ["entry_year", "price_sek"]
+
+SORTABLE_COLUMNS = ["publication_datetime", "price_sek", "entry_year", "mileage_km"]
+DEFAULT_SORT = "-publication_datetime"
+
+DEFAULT_PAGE_SIZE = 20
+MAXIMUM_PAGE_SIZE = 100
+
+# share of the data set above which the selected rows are sorted by filtering the
+# presorted rows of the data set instead of sorting the selected rows
+PRESORTED_SHARE = 1 / 16
+
+# number of answered queries which are cached
+QUERY_CACHE_SIZE = 1024
+
+DEFAULT_PORT = 8000
+
+
+def get_dataset_version(path_to_dataset):
+    """Get the version of the data set file, which changes whenever it is saved.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+
+    Returns
+    -------
+     : tuple
+        modification time in ns and size of file, None if it does not exist
+    """
+    try:
+        status = os.stat(path_to_dataset)
+    except FileNotFoundError:
+        return None
+
+    return status.st_mtime_ns, status.st_size
+
+
+def build_query_indexes(used_car_data):
+    """Build the secondary indexes of the data set.
+
+    Parameters
+    ----------
+    used_car_data : DataFrame
+        data set of used cars
+
+    Returns
+    -------
+    indexes : dict
+        sorted rows per value of each categorical column, rows and values sorted by
+        each range column, row per url, and sort key and rows in ascending and
+        descending order per sortable column
+    """
+    indexes = {"categorical": {}, "range": {}, "sort_keys": {}, "sorted_rows": {}}
+    for column in CATEGORICAL_INDEX_COLUMNS:
+        indexes["categorical"][column] = {
+            str(value): rows
+            for value, rows in used_car_data.groupby(column).indices.items()
+        }
+
+    for column in RANGE_INDEX_COLUMNS:
+        values = pd.to_numeric(used_car_data[column], errors="coerce").to_numpy(float)
+        rows = np.flatnonzero(~np.isnan(values))
+        rows = rows[np.argsort(values[rows], kind="stable")]
+        indexes["range"][column] = (rows, values[rows])
+
+    for column in SORTABLE_COLUMNS:
+        values = used_car_data[column]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            sort_key = values.astype("int64").to_numpy(float)
+            sort_key[values.isna().to_numpy()] = np.nan
+        else:
+            sort_key = pd.to_numeric(values, errors="coerce").to_numpy(float)
+        indexes["sort_keys"][column] = sort_key
+        indexes["sorted_rows"][column] = np.argsort(sort_key, kind="stable")
+        indexes["sorted_rows"][f"-{column}"] = np.argsort(-sort_key, kind="stable")
+
+    indexes["urls"] = {url: row for row, url in enumerate(used_car_data["url"])}
+
+    return indexes
+
+
+def load_query_service_data(service):
+    """Import the data set of a query service and rebuild its indexes and cache.
+
+    Parameters
+    ----------
+    service : dict
+        state of query service
+    """
+    version = get_dataset_version(service["path_to_dataset"])
+    if version is None:
+        used_car_data = pd.DataFrame(columns=["url", *SORTABLE_COLUMNS])
+    else:
+        used_car_data = pd.concat(
+            iter_dataset_chunks(service["path_to_dataset"]), ignore_index=True
+        )
+        used_car_data = used_car_data.drop_duplicates(
+            subset="url", keep="last"
+        ).reset_index(drop=True)
+
+    service["used_car_data"] = used_car_data
+    service["indexes"] = build_query_indexes(used_car_data)
+    service["cache"] = OrderedDict()
+    service["version"] = version
+    print(f"Serving {len(used_car_data)} car(s) of: {service['path_to_dataset']}")
+
+
+def create_query_service(path_to_dataset):
+    """Create a query service over the data set.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+
+    Returns
+    -------
+    service : dict
+        state of query service
+    """
+    service = {"path_to_dataset": path_to_dataset, "lock": threading.Lock()}
+    load_query_service_data(service)
+
+    return service
+
+
+def refresh_query_service(service):
+    """Reload the data set of a query service if the crawler has saved it since.
+
+    Parameters
+    ----------
+    service : dict
+        state of query service
+    """
+    if get_dataset_version(service["path_to_dataset"]) != service["version"]:
+        load_query_service_data(service)
+
+
+def parse_query(query_string):
+    """Parse and validate the parameters of a query.
+
+    Parameters
+    ----------
+    query_string : str
+        query of url, e.g. "manufacturer=Volvo&max_price_sek=100000"
+
+    Returns
+    -------
+    query : tuple
+        sorted pairs of parameter and value, which is hashable for the cache
+
+    Raises
+    ------
+    ValueError
+        if a parameter is unknown or has an invalid value
+    """
+    parameters = parse_qs(query_string)
+    known_parameters = {
+        *CATEGORICAL_INDEX_COLUMNS,
+        *[
+            f"{bound}_{column}"
+            for column in RANGE_INDEX_COLUMNS
+            for bound in ("min", "max")
+        ],
+        "url",
+        "sort",
+        "page",
+        "page_size",
+    }
+    unknown_parameters = set(parameters) - known_parameters
+    if unknown_parameters:
+        raise ValueError(f"Unknown parameter(s): {', '.join(unknown_parameters)}")
+
+    query = {column: tuple(sorted(values)) for column, values in parameters.items()}
+    for parameter in query:
+        if parameter.startswith(("min_", "max_")):
+            try:
+                query[parameter] = float(query[parameter][-1])
+            except ValueError:
+                raise ValueError(f"{parameter} must be a number.") from None
+    # pages are parsed as integers right away, as e.g. inf passes `float`
+    for parameter in ["page", "page_size"]:
+        if parameter in query:
+            try:
+                query[parameter] = int(query[parameter][-1])
+            except ValueError:
+                raise ValueError(f"{parameter} must be an integer.") from None
+
+    sort = query.get("sort", (DEFAULT_SORT,))[-1]
+    if sort.lstrip("-") not in SORTABLE_COLUMNS:
+        raise ValueError(f"sort must be one of {SORTABLE_COLUMNS}, optionally with -.")
+    query["sort"] = sort
+
+    query["page"] = query.get("page", 1)
+    query["page_size"] = query.get("page_size", DEFAULT_PAGE_SIZE)
+    if query["page"] < 1 or not 1 <= query["page_size"] <= MAXIMUM_PAGE_SIZE:
+        raise ValueError(
+            f"page must be positive and page_size between 1 and {MAXIMUM_PAGE_SIZE}."
+        )
+
+    return tuple(sorted(query.items()))
+
+
+def select_rows(indexes, query, number_of_cars):
+    """Select the rows of the data set matching all filters of a query.
+
+    Parameters
+    ----------
+    indexes : dict
+        secondary indexes of the data set
+    query : dict
+        parsed query
+    number_of_cars : int
+        number of rows of the data set
+
+    Returns
+    -------
+     : np.ndarray
+        sorted rows matching the filters
+    """
+    empty_rows = np.array([], dtype=np.intp)
+    rows_per_filter = []
+    for column in CATEGORICAL_INDEX_COLUMNS:
+        if column in query:
+            rows_per_filter.append(
+                np.sort(
+                    np.concatenate(
+                        [
+                            indexes["categorical"][column].get(value, empty_rows)
+                            for value in query[column]
+                        ]
+                    )
+                )
+            )
+
+    for column in RANGE_INDEX_COLUMNS:
+        minimum = query.get(f"min_{column}", -np.inf)
+        maximum = query.get(f"max_{column}", np.inf)
+        if np.isfinite(minimum) or np.isfinite(maximum):
+            rows, values = indexes["range"][column]
+            start = np.searchsorted(values, minimum, side="left")
+            end = np.searchsorted(values, maximum, side="right")
+            rows_per_filter.append(np.sort(rows[start:end]))
+
+    if "url" in query:
+        rows_per_filter.append(
+            np.array(
+                sorted(
+                    indexes["urls"][url]
+                    for url in query["url"]
+                    if url in indexes["urls"]
+                ),
+                dtype=np.intp,
+            )
+        )
+
+    if not rows_per_filter:
+        return np.arange(number_of_cars)
+
+    rows_per_filter.sort(key=len)
+    selected_rows = rows_per_filter[0]
+    for rows in rows_per_filter[1:]:
+        selected_rows = np.intersect1d(selected_rows, rows, assume_unique=True)
+
+    return selected_rows
+
+
+def sort_rows(indexes, rows, sort, number_of_cars):
+    """Sort selected rows of the data set by a sortable column.
+
+    Missing values are sorted last.
+
+    Parameters
+    ----------
+    indexes : dict
+        secondary indexes of the data set
+    rows : np.ndarray
+        selected rows
+    sort : str
+        sortable column, descending if prefixed with -
+    number_of_cars : int
+        number of rows of the data set
+
+    Returns
+    -------
+     : np.ndarray
+        sorted rows
+    """
+    if len(rows) > PRESORTED_SHARE * number_of_cars:
+        is_selected = np.zeros(number_of_cars, dtype=bool)
+        is_selected[rows] = True
+        sorted_rows = indexes["sorted_rows"][sort]
+        return sorted_rows[is_selected[sorted_rows]]
+
+    sort_key = indexes["sort_keys"][sort.lstrip("-")][rows]
+    if sort.startswith("-"):
+        sort_key = -sort_key
+
+    return rows[np.argsort(sort_key, kind="stable")]
+
+
+def answer_query(service, query):
+    """Answer a query with a page of the matching cars.
+
+    Parameters
+    ----------
+    service : dict
+        state of query service
+    query : tuple
+        parsed query as returned by `parse_query`
+
+    Returns
+    -------
+     : bytes
+        JSON with total number of matching cars, page, page size and the cars of
+        the page
+    """
+    cached_answer = service["cache"].get(query)
+    if cached_answer is not None:
+        service["cache"].move_to_end(query)
+        return cached_answer
+
+    parameters = dict(query)
+    used_car_data = service["used_car_data"]
+    rows = select_rows(service["indexes"], parameters, len(used_car_data))
+
+    rows = sort_rows(service["indexes"], rows, parameters["sort"], len(used_car_data))
+
+    first_row = (parameters["page"] - 1) * parameters["page_size"]
+    cars = used_car_data.iloc[rows[first_row : first_row + parameters["page_size"]]]
+    answer = (
+        f'{{"total": {len(rows)}, "page": {parameters["page"]}, '
+        f'"page_size": {parameters["page_size"]}, "cars": '
+        + cars.to_json(orient="records", date_format="iso", force_ascii=False)
+        + "}"
+    ).encode("utf-8")
+
+    service["cache"][query] = answer
+    if len(service["cache"]) > QUERY_CACHE_SIZE:
+        service["cache"].popitem(last=False)
+
+    return answer
+
+
+def create_query_request_handler(service):
+    """Create the handler of requests to the query service.
+
+    Parameters
+    ----------
+    service : dict
+        state of query service
+
+    Returns
+    -------
+     : type
+        request handler class for `ThreadingHTTPServer`
+    """
+
+    class QueryRequestHandler(BaseHTTPRequestHandler):
+        """Answer queries for cars of the data set."""
+
+        def do_GET(self):
+            """Answer query for cars, health check or 404 for other paths."""
+            url = urlsplit(self.path)
+            with service["lock"]:
+                refresh_query_service(service)
+                if url.path == "/cars":
+                    try:
+                        status, body = 200, answer_query(
+                            service, parse_query(url.query)
+                        )
+                    except ValueError as error:
+                        status, body = 400, json.dumps({"error": str(error)}).encode()
+                elif url.path == "/health":
+                    status, body = (
+                        200,
+                        json.dumps({"cars": len(service["used_car_data"])}).encode(),
+                    )
+                else:
+                    status, body = 404, json.dumps({"error": "Not found."}).encode()
+
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            """Do not log every request."""
+
+    return QueryRequestHandler
+
+
+def create_query_server(path_to_dataset, host="127.0.0.1", port=DEFAULT_PORT):
+    """Create the HTTP server of a query service over the data set.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+    host : str
+        host the server listens on
+    port : int
+        port of server, any free port if 0
+
+    Returns
+    -------
+     : ThreadingHTTPServer
+        server, which is started with `serve_forever()`
+    """
+    server = ThreadingHTTPServer(
+        (host, port),
+        create_query_request_handler(create_query_service(path_to_dataset)),
+    )
+    server.daemon_threads = True
+
+    return server
@@ -0,0 +1,349 @@
+"""Utility functions for refreshing the availability of known car advertisments.
+
+The data set does not show when a car advertisment disappears, i.e. when the car
+has presumably been sold. The availability of each advertisment is therefore kept
+next to the data set: when it was last checked and when it was found removed.
+
+A refresh checks only the advertisments whose last check is older than a threshold,
+the ones most likely sold since first. It does not open a browser, but requests the
+advertisments in parallel and only looks at the status of the response.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from os.path import exists, splitext
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+import pandas as pd
+
+from utils_dataset_streaming import iter_dataset_chunks
+
+# status codes of removed car advertisments
+REMOVED_STATUS_CODES = (404, 410)
+
+# hours after which an availability check is stale
+DEFAULT_STALENESS_HOURS = 24
+
+NUMBER_OF_PARALLEL_REQUESTS = 8
+REQUEST_TIMEOUT_S = 10
+
+# pseudo counts of removed and available advertisments added to the observed ones of
+# each model, so models with few checks get a sale probability close to 10 %
+SALE_PROBABILITY_PRIOR = (1, 9)
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def get_path_to_availability(path_to_dataset):
+    """Derive the path of the availability file which is kept next to the data set.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+
+    Returns
+    -------
+     : str
+        path to availability file
+    """
+    return splitext(path_to_dataset)[0] + "_availability.json"
+
+
+def initialize_or_import_availability(path_to_availability):
+    """Import existing availability of car advertisments or create an empty one.
+
+    Parameters
+    ----------
+    path_to_availability : str
+        path to availability file
+
+    Returns
+    -------
+    availability : dict
+        last check and removal datetime per url of car advertisment
+    """
+    if exists(path_to_availability):
+        with open(path_to_availability, encoding="utf-8") as file:
+            availability = json.load(file)
+    else:
+        availability = {}
+
+    return availability
+
+
+def merge_availability(availability, other_availability):
+    """Merge availability of car advertisments, the latest check of each url wins.
+
+    Parameters
+    ----------
+    availability : dict
+        last check and removal datetime per url of car advertisment, which is
+        updated with the later checks of the other availability
+    other_availability : dict
+        last check and removal datetime per url of car advertisment
+    """
+    for url, other_record in other_availability.items():
+        record = availability.get(url)
+        # datetimes in DATETIME_FORMAT sort like strings
+        if record is None or other_record["last_check"] > record["last_check"]:
+            availability[url] = other_record
+
+
+def save_availability(availability, path_to_availability):
+    """Save availability of car advertisments to file.
+
+    The crawl and a refresh may both run for a long time, so the file is read again
+    and merged before it is replaced, keeping the checks the other recorded since.
+
+    Parameters
+    ----------
+    availability : dict
+        last check and removal datetime per url of car advertisment, which is
+        updated with the later checks found in the file
+    path_to_availability : str
+        path to availability file
+    """
+    merge_availability(
+        availability, initialize_or_import_availability(path_to_availability)
+    )
+    with open(path_to_availability + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(availability, file)
+    os.replace(path_to_availability + ".tmp", path_to_availability)
+
+
+def record_availability_check(availability, url, available, now=None):
+    """Record the result of checking whether a car advertisment is still available.
+
+    Parameters
+    ----------
+    availability : dict
+        last check and removal datetime per url of car advertisment
+    url : str
+        url of car advertisment
+    available : boolean
+        car advertisment is still available
+    now : datetime
+        time of check, now if None
+    """
+    now = (now or datetime.now()).strftime(DATETIME_FORMAT)
+    record = availability.setdefault(url, {"last_check": now, "removed": None})
+    record["last_check"] = now
+    if not available and record["removed"] is None:
+        record["removed"] = now
+    elif available:
+        record["removed"] = None
+
+
+def estimate_sale_probabilities(availability, used_car_data):
+    """Estimate the probability that a car is sold per manufacturer and model.
+
+    The probability is the share of checked car advertisments of the model which
+    have been found removed, smoothed with `SALE_PROBABILITY_PRIOR`.
+
+    Parameters
+    ----------
+    availability : dict
+        last check and removal datetime per url of car advertisment
+    used_car_data : DataFrame
+        data set with columns url, manufacturer and model
+
+    Returns
+    -------
+     : pd.Series
+        sale probability per row of data set
+    """
+    records = used_car_data["url"].map(availability)
+    checked = records.notna()
+    removed = records.map(
+        lambda record: isinstance(record, dict) and record["removed"] is not None
+    )
+    counts = (
+        used_car_data.assign(checked=checked, removed=removed)
+        .groupby(["manufacturer", "model"], dropna=False)[["checked", "removed"]]
+        .transform("sum")
+    )
+    removed_prior, available_prior = SALE_PROBABILITY_PRIOR
+
+    return (counts["removed"] + removed_prior) / (
+        counts["checked"] + removed_prior + available_prior
+    )
+
+
+def select_stale_urls(
+    availability,
+    used_car_data,
+    staleness_hours=DEFAULT_STALENESS_HOURS,
+    maximum_number_of_urls=None,
+    now=None,
+):
+    """Select car advertisments whose availability check is stale.
+
+    Advertisments which have never been checked count as checked at publication.
+    They are ordered by the expected number of sales since their last check, i.e. the
+    hours since the last check times their sale probability.
+
+    Parameters
+    ----------
+    availability : dict
+        last check and removal datetime per url of car advertisment
+    used_car_data : DataFrame
+        data set with columns url, manufacturer, model and publication_datetime
+    staleness_hours : float
+        hours after which an availability check is stale
+    maximum_number_of_urls : int
+        maximum number of selected urls, all stale urls if None
+    now : datetime
+        time of refresh, now if None
+
+    Returns
+    -------
+     : list
+        urls of car advertisments, most likely sold first
+    """
+    now = now or datetime.now()
+    records = used_car_data["url"].map(availability)
+    is_removed = records.map(
+        lambda record: isinstance(record, dict) and record["removed"] is not None
+    )
+    last_check = pd.to_datetime(
+        records.map(
+            lambda record: record["last_check"] if isinstance(record, dict) else None
+        ),
+        format=DATETIME_FORMAT,
+    ).fillna(pd.to_datetime(used_car_data["publication_datetime"]))
+    hours_since_last_check = (now - last_check).dt.total_seconds() / 3600
+
+    priority = hours_since_last_check * estimate_sale_probabilities(
+        availability, used_car_data
+    )
+    is_stale = ~is_removed & (hours_since_last_check >= staleness_hours)
+    stale_urls = (
+        used_car_data.loc[is_stale, "url"]
+        .to_frame()
+        .assign(priority=priority[is_stale])
+        .drop_duplicates("url")
+        .sort_values("priority", ascending=False)["url"]
+    )
+
+    return stale_urls.tolist()[:maximum_number_of_urls]
+
+
+def check_car_advertisement_is_available(url, timeout=REQUEST_TIMEOUT_S):
+    """Check whether a car advertisment is still available without a browser.
+
+    Parameters
+    ----------
+    url : str
+        url of car advertisment
+    timeout : float
+        seconds to wait for the response
+
+    Returns
+    -------
+     : boolean
+        car advertisment is available, None if this could not be determined
+    """
+    request = Request(url, headers={"User-Agent": "Mozilla/5.0"})
+    try:
+        with urlopen(request, timeout=timeout):
+            return True
+    except HTTPError as error:
+        if error.code in REMOVED_STATUS_CODES:
+            return False
+        return None
+    except (URLError, TimeoutError):
+        return None
+
+
+def refresh_availability(
+    availability,
+    urls,
+    number_of_parallel_requests=NUMBER_OF_PARALLEL_REQUESTS,
+    now=None,
+):
+    """Check the availability of car advertisments in parallel.
+
+    Parameters
+    ----------
+    availability : dict
+        last check and removal datetime per url of car advertisment
+    urls : list
+        urls of car advertisments
+    number_of_parallel_requests : int
+        number of requests which are sent at the same time
+    now : datetime
+        time of refresh, now if None
+
+    Returns
+    -------
+    outcomes : dict
+        number of car advertisments per outcome, either "available", "removed" or
+        "unknown"
+    """
+    now = now or datetime.now()
+    outcomes = {"available": 0, "removed": 0, "unknown": 0}
+    with ThreadPoolExecutor(max_workers=number_of_parallel_requests) as executor:
+        for url, available in zip(
+            urls, executor.map(check_car_advertisement_is_available, urls)
+        ):
+            if available is None:
+                outcomes["unknown"] = outcomes["unknown"] + 1
+                continue
+
+            record_availability_check(availability, url, available, now)
+            outcome = "available" if available else "removed"
+            outcomes[outcome] = outcomes[outcome] + 1
+
+    return outcomes
+
+
+def refresh_stale_car_advertisements(
+    path_to_dataset,
+    staleness_hours=DEFAULT_STALENESS_HOURS,
+    maximum_number_of_urls=None,
+    number_of_parallel_requests=NUMBER_OF_PARALLEL_REQUESTS,
+):
+    """Check the car advertisments of the data set whose availability check is stale.
+
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+    staleness_hours : float
+        hours after which an availability check is stale
+    maximum_number_of_urls : int
+        maximum number of checked car advertisments, all stale ones if None
+    number_of_parallel_requests : int
+        number of requests which are sent at the same time
+
+    Returns
+    -------
+    outcomes : dict
+        number of car advertisments per outcome of `refresh_availability`
+    """
+    path_to_availability = get_path_to_availability(path_to_dataset)
+    availability = initialize_or_import_availability(path_to_availability)
+    used_car_data = pd.concat(
+        iter_dataset_chunks(
+            path_to_dataset,
+            columns=["url", "manufacturer", "model", "publication_datetime"],
+        ),
+        ignore_index=True,
+    )
+
+    urls = select_stale_urls(
+        availability, used_car_data, staleness_hours, maximum_number_of_urls
+    )
+    print(f"checking {len(urls)} stale car advertisment(s).")
+    outcomes = refresh_availability(availability, urls, number_of_parallel_requests)
+    save_availability(availability, path_to_availability)
+
+    print(
+        f"{outcomes['removed']} removed and {outcomes['available']} available car(s),",
+        f"{outcomes['unknown']} could not be checked.",
+    )
+
+    return outcomes
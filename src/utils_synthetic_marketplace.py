@@ -0,0 +1,500 @@
+"""Utility functions for a synthetic marketplace of used cars served locally.
+
+The marketplace generates result webpages and car advertisments with the elements
+the selectors of `utils_website_scraping` look for, so the crawler can be run and
+load-tested without the real website. Listings churn while the server runs: new
+car advertisments are published, some are uploaded again, re-priced or sold.
+Optional fields are left out of some car advertisments.
+"""
+import math
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from utils_website_scraping import SELECTOR_REGISTRY
+
+CARS_PER_RESULT_WEBPAGE = 40
+
+# manufacturers and models with price of a new car in SEK
+CAR_MODELS = {
+    "Volvo": {"V60": 450000, "V70": 400000, "XC60": 550000, "XC90": 750000},
+    "Volkswagen": {"Golf": 300000, "Passat": 380000, "Tiguan": 420000},
+    "Toyota": {"Corolla": 290000, "RAV4": 430000, "Yaris": 210000},
+    "BMW": {"320d": 460000, "X5": 850000},
+    "Audi": {"A4": 440000, "A6": 560000},
+    "Kia": {"Ceed": 250000, "Niro": 350000},
+    "Tesla": {"Model 3": 500000},
+}
+
+FUELS = ["Diesel", "Bensin", "Miljöbränsle/Hybrid", "El"]
+TRANSMISSIONS = ["Automat", "Manuell"]
+CAR_TYPES = ["Kombi", "Halvkombi", "SUV", "Sedan"]
+CITIES = ["Stockholm", "Göteborg", "Malmö", "Uppsala", "Umeå"]
+
+# months as abbreviated on the website
+MONTHS = [
+    "jan.",
+    "feb.",
+    "mars",
+    "apr.",
+    "maj",
+    "juni",
+    "juli",
+    "aug.",
+    "sep.",
+    "okt.",
+    "nov.",
+    "dec.",
+]
+WEEKDAYS = ["måndag", "tisdag", "onsdag", "torsdag", "fredag", "lördag", "söndag"]
+
+# fields of a car advertisment which are left out with the missing field rate
+OPTIONAL_FIELDS = ["location", "price", "detailed_characteristics"]
+
+
+def create_marketplace(
+    number_of_listings=10000,
+    new_listings_per_hour=200,
+    reuploads_per_hour=50,
+    price_changes_per_hour=50,
+    sales_per_hour=100,
+    missing_field_rate=0.05,
+    latency_s=0.0,
+    seed=0,
+):
+    """Create a marketplace with randomly generated listings.
+
+    Parameters
+    ----------
+    number_of_listings : int
+        number of car advertisments at start
+    new_listings_per_hour : float
+        car advertisments published per hour
+    reuploads_per_hour : float
+        car advertisments uploaded again per hour
+    price_changes_per_hour : float
+        car advertisments whose price changes per hour, without being uploaded again
+    sales_per_hour : float
+        car advertisments removed per hour
+    missing_field_rate : float
+        probability that an optional field is left out of a car advertisment
+    latency_s : float
+        seconds each response is delayed
+    seed : int
+        seed of random generator
+
+    Returns
+    -------
+    marketplace : dict
+        listings and configuration of marketplace
+    """
+    now = datetime.now()
+    marketplace = {
+        "listings": {},
+        "order": [],
+        "next_id": 0,
+        "random": random.Random(seed),
+        "lock": threading.Lock(),
+        "last_update": now,
+        "churn_per_hour": {
+            "new": new_listings_per_hour,
+            "reupload": reuploads_per_hour,
+            "price_change": price_changes_per_hour,
+            "sale": sales_per_hour,
+        },
+        "pending_churn": {
+            "new": 0.0,
+            "reupload": 0.0,
+            "price_change": 0.0,
+            "sale": 0.0,
+        },
+        "missing_field_rate": missing_field_rate,
+        "latency_s": latency_s,
+    }
+
+    # listings are published over the last 60 days, newest first
+    publication_datetimes = sorted(
+        (
+            now - timedelta(minutes=marketplace["random"].uniform(0, 60 * 24 * 60))
+            for _ in range(number_of_listings)
+        ),
+        reverse=True,
+    )
+    for publication_datetime in publication_datetimes:
+        listing = generate_listing(marketplace, publication_datetime)
+        marketplace["order"].append(listing["id"])
+
+    return marketplace
+
+
+def generate_listing(marketplace, publication_datetime):
+    """Generate a random car advertisment and add it to the listings.
+
+    Parameters
+    ----------
+    marketplace : dict
+        listings and configuration of marketplace
+    publication_datetime : datetime
+        time of publication
+
+    Returns
+    -------
+    listing : dict
+        generated car advertisment
+    """
+    rng = marketplace["random"]
+    manufacturer = rng.choice(list(CAR_MODELS))
+    model = rng.choice(list(CAR_MODELS[manufacturer]))
+    entry_year = rng.randint(2005, publication_datetime.year)
+    age = publication_datetime.year - entry_year
+    mileage_mil = max(int(rng.gauss(1500 * age + 500, 700)), 10)
+    price = CAR_MODELS[manufacturer][model] * 0.86**age * (1 - mileage_mil / 60000)
+    price = max(int(price * rng.uniform(0.85, 1.15) / 100) * 100, 5000)
+
+    missing_fields = [
+        field
+        for field in OPTIONAL_FIELDS
+        if rng.random() < marketplace["missing_field_rate"]
+    ]
+    listing = {
+        "id": marketplace["next_id"],
+        "publication_datetime": publication_datetime.replace(second=0, microsecond=0),
+        "manufacturer": manufacturer,
+        "model": model,
+        "note": rng.choice(["D4 Momentum", "T5 R-Design", "1.6 TDI", "Hybrid", ""]),
+        "price": price,
+        "entry_year": entry_year,
+        "mileage_mil": mileage_mil,
+        "fuel": "El" if manufacturer == "Tesla" else rng.choice(FUELS[:3]),
+        "transmission": rng.choice(TRANSMISSIONS),
+        "car_type": rng.choice(CAR_TYPES),
+        "horse_power": rng.randrange(90, 400, 5),
+        "location": rng.choice(CITIES),
+        "provider": f"Bilhandlare {rng.randrange(500)} AB",
+        "missing_fields": missing_fields,
+    }
+    marketplace["listings"][listing["id"]] = listing
+    marketplace["next_id"] = marketplace["next_id"] + 1
+
+    return listing
+
+
+def update_marketplace(marketplace, now=None):
+    """Apply the churn of the marketplace since its last update.
+
+    Parameters
+    ----------
+    marketplace : dict
+        listings and configuration of marketplace
+    now : datetime
+        time of update, now if None
+    """
+    now = now or datetime.now()
+    hours = (now - marketplace["last_update"]).total_seconds() / 3600
+    marketplace["last_update"] = now
+
+    rng = marketplace["random"]
+    pending_churn = marketplace["pending_churn"]
+    for event, per_hour in marketplace["churn_per_hour"].items():
+        pending_churn[event] = pending_churn[event] + per_hour * hours
+        number_of_events = int(pending_churn[event])
+        pending_churn[event] = pending_churn[event] - number_of_events
+
+        for _ in range(number_of_events):
+            if event == "new":
+                listing = generate_listing(marketplace, now)
+                marketplace["order"].insert(0, listing["id"])
+                continue
+            if not marketplace["order"]:
+                break
+
+            listing_id = rng.choice(marketplace["order"])
+            listing = marketplace["listings"][listing_id]
+            if event == "reupload":
+                listing["publication_datetime"] = now.replace(second=0, microsecond=0)
+                listing["price"] = int(listing["price"] * rng.uniform(0.9, 1.0))
+                marketplace["order"].remove(listing_id)
+                marketplace["order"].insert(0, listing_id)
+            elif event == "price_change":
+                listing["price"] = int(listing["price"] * rng.uniform(0.9, 1.0))
+            elif event == "sale":
+                listing["sold"] = now
+                marketplace["order"].remove(listing_id)
+
+
+def format_publication_datetime(publication_datetime, now):
+    """Format time of publication like the website.
+
+    Parameters
+    ----------
+    publication_datetime : datetime
+        time of publication
+    now : datetime
+        time the webpage is viewed
+
+    Returns
+    -------
+     : str
+        time of publication, relative to now if less than a week ago
+    """
+    days = (now.date() - publication_datetime.date()).days
+    time_of_day = publication_datetime.strftime("%H:%M")
+    if days == 0:
+        return f"Idag {time_of_day}"
+    elif days == 1:
+        return f"Igår {time_of_day}"
+    elif days < 7:
+        return f"{WEEKDAYS[publication_datetime.weekday()].capitalize()} {time_of_day}"
+
+    month = MONTHS[publication_datetime.month - 1]
+    return f"Publicerad {publication_datetime.day} {month} {time_of_day}"
+
+
+def render_element(field, text="", **attributes):
+    """Render an HTML element which the first selector of a field matches.
+
+    Parameters
+    ----------
+    field : str
+        field of webpage, see `SELECTOR_REGISTRY`
+    text : str
+        text of element
+    **attributes
+        further attributes of element, e.g. href
+
+    Returns
+    -------
+     : str
+        HTML of element
+    """
+    by, value = SELECTOR_REGISTRY[field]["candidates"][0]
+    if by == "id":
+        tag, attributes["id"] = "button", value
+    else:
+        tag, attributes["class"] = re.match(r"(\w+)\[class='(.*)'\]", value).groups()
+
+    rendered_attributes = " ".join(
+        f'{name}="{escape(str(attribute))}"' for name, attribute in attributes.items()
+    )
+    text = "<br>".join(escape(line) for line in str(text).split("\n"))
+
+    return f"<{tag} {rendered_attributes}>{text}</{tag}>"
+
+
+def render_result_webpage(marketplace, result_webpage):
+    """Render a result webpage with links to the newest car advertisments first.
+
+    Parameters
+    ----------
+    marketplace : dict
+        listings and configuration of marketplace
+    result_webpage : int
+        number of result webpage, starting at 1
+
+    Returns
+    -------
+     : str
+        HTML of result webpage
+    """
+    order = marketplace["order"]
+    number_of_result_webpages = max(math.ceil(len(order) / CARS_PER_RESULT_WEBPAGE), 1)
+    first = (result_webpage - 1) * CARS_PER_RESULT_WEBPAGE
+    listings = [
+        marketplace["listings"][listing_id]
+        for listing_id in order[first : first + CARS_PER_RESULT_WEBPAGE]
+    ]
+
+    elements = [render_element("cookie_accept_button", "Godkänn")]
+    for listing in listings:
+        headline = f"{listing['manufacturer']} {listing['model']} {listing['note']}"
+        elements.append(
+            "<article>"
+            + render_element(
+                "links_to_car_advertisment", headline, href=f"/annons/{listing['id']}"
+            )
+            + render_element("all_providers", listing["provider"])
+            + "</article>"
+        )
+
+    pages = sorted({1, result_webpage, number_of_result_webpages})
+    elements.append(
+        "<nav>"
+        + "".join(
+            render_element("number_of_result_webpages", page, href=f"?page={page}")
+            for page in pages
+        )
+        + "</nav>"
+    )
+
+    return "<html><body>" + "".join(elements) + "</body></html>"
+
+
+def render_car_advertisement(listing, now):
+    """Render the webpage of a car advertisment.
+
+    Parameters
+    ----------
+    listing : dict
+        car advertisment
+    now : datetime
+        time the webpage is viewed
+
+    Returns
+    -------
+     : str
+        HTML of car advertisment
+    """
+    missing_fields = listing["missing_fields"]
+    elements = [
+        render_element("cookie_accept_button", "Godkänn"),
+        render_element(
+            "publication_datetime",
+            format_publication_datetime(listing["publication_datetime"], now),
+        ),
+        render_element(
+            "car_manufacturer_and_model",
+            f"{listing['manufacturer']} {listing['model']} {listing['note']}",
+        ),
+        render_element("provider", listing["provider"]),
+    ]
+    if "location" not in missing_fields:
+        elements.append(render_element("location", f"{listing['location']} Karta"))
+    if "price" not in missing_fields:
+        elements.append(
+            render_element("price_of_car", f"{listing['price']:,} kr".replace(",", " "))
+        )
+
+    general_characteristics = {
+        "Miltal": f"{listing['mileage_mil']:,}".replace(",", " "),
+        "Modellår": listing["entry_year"],
+        "Bränsle": listing["fuel"],
+        "Växellåda": listing["transmission"],
+    }
+    for key, parameter in general_characteristics.items():
+        elements.append(render_element("general_car_characteristic_keys", key))
+        elements.append(
+            render_element("general_car_characteristic_parameters", parameter)
+        )
+
+    if "detailed_characteristics" not in missing_fields:
+        elements.append(
+            render_element("detail_arcordeon_expansion_buttons", "Fordonsdata")
+        )
+        detailed_characteristics = {
+            "Modell": listing["model"],
+            "Hästkrafter": f"{listing['horse_power']} hk",
+            "Biltyp": listing["car_type"],
+        }
+        for key, parameter in detailed_characteristics.items():
+            elements.append(
+                render_element(
+                    "detailed_car_characteristic_keys_and_parameters",
+                    f"{key}\n{parameter}",
+                )
+            )
+
+    return "<html><body>" + "".join(elements) + "</body></html>"
+
+
+def create_request_handler(marketplace):
+    """Create the handler of requests to the marketplace.
+
+    Parameters
+    ----------
+    marketplace : dict
+        listings and configuration of marketplace
+
+    Returns
+    -------
+     : type
+        request handler class for `ThreadingHTTPServer`
+    """
+
+    class MarketplaceRequestHandler(BaseHTTPRequestHandler):
+        """Serve result webpages and car advertisments of the marketplace."""
+
+        def do_GET(self):
+            """Serve result webpage, car advertisment or 404 for sold cars."""
+            time.sleep(marketplace["latency_s"])
+            url = urlsplit(self.path)
+            now = datetime.now()
+            with marketplace["lock"]:
+                update_marketplace(marketplace, now)
+                status, body = 404, "<html><body>Annonsen finns inte.</body></html>"
+                if url.path == "/search":
+                    result_webpage = int(parse_qs(url.query).get("page", ["1"])[0])
+                    status, body = 200, render_result_webpage(
+                        marketplace, result_webpage
+                    )
+                elif url.path.startswith("/annons/"):
+                    listing = marketplace["listings"].get(
+                        int(url.path.rsplit("/", 1)[-1])
+                    )
+                    if listing is not None and "sold" not in listing:
+                        status, body = 200, render_car_advertisement(listing, now)
+
+            content = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            """Do not log every request."""
+
+    return MarketplaceRequestHandler
+
+
+def start_marketplace_server(marketplace, port=0):
+    """Serve the marketplace in a background thread.
+
+    Parameters
+    ----------
+    marketplace : dict
+        listings and configuration of marketplace
+    port : int
+        port of server, any free port if 0
+
+    Returns
+    -------
+    server : ThreadingHTTPServer
+        running server, stopped with `server.shutdown()`
+    urlpage : str
+        url of first result webpage
+    """
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", port), create_request_handler(marketplace)
+    )
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server, f"http://127.0.0.1:{server.server_address[1]}/search?page=1"
+
+
+def get_expected_car(listing):
+    """Get the values the crawler is expected to extract from a car advertisment.
+
+    Parameters
+    ----------
+    listing : dict
+        car advertisment
+
+    Returns
+    -------
+     : dict
+        expected values of data set columns
+    """
+    return {
+        "manufacturer": listing["manufacturer"],
+        "model": listing["model"],
+        "price_sek": None if "price" in listing["missing_fields"] else listing["price"],
+        "entry_year": listing["entry_year"],
+        "mileage_km": listing["mileage_mil"] * 10,
+        "publication_datetime": listing["publication_datetime"],
+    }
@@ -0,0 +1,110 @@
+"""Utility functions for optional span tracing of a crawl.
+
+Spans are recorded around page loads, element lookups, clicks, normalization and
+saving while tracing is started. They are exported as Chrome trace events, so a
+crawl can be inspected on a timeline, e.g. in chrome://tracing or Perfetto, to
+find out why single car advertisments take much longer than others.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# recorded trace events, None while tracing is stopped
+TRACE_EVENTS = None
+
+
+def start_tracing():
+    """Start recording spans, discarding the spans of a previous trace."""
+    global TRACE_EVENTS
+    TRACE_EVENTS = []
+
+
+def stop_tracing():
+    """Stop recording spans.
+
+    Returns
+    -------
+    trace_events : list
+        recorded trace events
+    """
+    global TRACE_EVENTS
+    trace_events, TRACE_EVENTS = TRACE_EVENTS or [], None
+
+    return trace_events
+
+
+def tracing_is_active():
+    """Check whether spans are recorded.
+
+    Returns
+    -------
+     : boolean
+        tracing has been started
+    """
+    return TRACE_EVENTS is not None
+
+
+@contextmanager
+def trace_span(name, category="crawl", **arguments):
+    """Record the duration of the enclosed code as span.
+
+    Nothing is recorded while tracing is stopped.
+
+    Parameters
+    ----------
+    name : str
+        name of span
+    category : str
+        category of span, e.g. "page_load" or "find_element"
+    **arguments
+        details shown with the span, e.g. the url of a page load
+
+    Yields
+    ------
+    arguments : dict
+        details of span, which can be extended by the enclosed code, e.g. with the
+        number of found elements
+    """
+    if TRACE_EVENTS is None:
+        yield arguments
+        return
+
+    start = time.perf_counter_ns()
+    try:
+        yield arguments
+    except Exception as exception:
+        arguments["exception"] = type(exception).__name__
+        raise
+    finally:
+        end = time.perf_counter_ns()
+        if TRACE_EVENTS is not None:
+            TRACE_EVENTS.append(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": start / 1000,
+                    "dur": (end - start) / 1000,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "args": arguments,
+                }
+            )
+
+
+def save_trace(trace_events, path_to_trace):
+    """Save trace events in the Chrome trace event format.
+
+    Parameters
+    ----------
+    trace_events : list
+        recorded trace events
+    path_to_trace : str
+        path to JSON file of trace
+    """
+    with open(path_to_trace, "w", encoding="utf-8") as file:
+        json.dump(
+            {"traceEvents": trace_events, "displayTimeUnit": "ms"}, file, default=str
+        )
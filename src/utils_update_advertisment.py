@@ -2,8 +2,8 @@
 from utils_car_characteristic_extraction import (
     convert_datetime_to_str,
     extract_int_number,
-    extract_publication_datetime,
 )
+from utils_publication_datetime import extract_publication_datetime
 from utils_website_scraping import scrape_price_of_car, scrape_publication_datetime
 
 
@@ -32,7 +32,7 @@ def update_car_history(history_of_car, old_value):
     return history_of_car
 
 
-def car_is_uploaded_again(advertisment, driver):
+def car_is_uploaded_again(advertisment, driver, reference_time=None):
     """Check if advertisment already exists in dataset and is updated.
 
     Parameters
@@ -41,6 +41,8 @@ def car_is_uploaded_again(advertisment, driver):
         data of car
     driver : str or int
         selenium.WebElement of webpage with car details
+    reference_time : datetime
+        time the webpage is viewed, e.g. start of crawl, now if None
 
     Returns
     -------
@@ -51,14 +53,14 @@ def car_is_uploaded_again(advertisment, driver):
         new_publication_date_time,
         old_publication_date_time,
         publication_date_time_history,
-    ) = get_advertisment_datetimes(advertisment, driver)
+    ) = get_advertisment_datetimes(advertisment, driver, reference_time)
 
     return (new_publication_date_time not in old_publication_date_time) and (
         new_publication_date_time not in publication_date_time_history
     )
 
 
-def update_publication_datetime_of_car(advertisment, driver):
+def update_publication_datetime_of_car(advertisment, driver, reference_time=None):
     """Update the publication date and history of car.
 
     Parameters
@@ -67,6 +69,8 @@ def update_publication_datetime_of_car(advertisment, driver):
         data of car
     driver : str or int
         selenium.WebElement of webpage with car details
+    reference_time : datetime
+        time the webpage is viewed, e.g. start of crawl, now if None
 
     Returns
     -------
@@ -77,7 +81,7 @@ def update_publication_datetime_of_car(advertisment, driver):
         new_publication_date_time,
         old_publication_date_time,
         publication_date_time_history,
-    ) = get_advertisment_datetimes(advertisment, driver)
+    ) = get_advertisment_datetimes(advertisment, driver, reference_time)
 
     print(
         f"Car advertisment from {old_publication_date_time} has been uploaded again on",
@@ -93,7 +97,7 @@ def update_publication_datetime_of_car(advertisment, driver):
     return advertisment
 
 
-def get_advertisment_datetimes(advertisment, driver):
+def get_advertisment_datetimes(advertisment, driver, reference_time=None):
     """Update the publication datetime and history of car.
 
     Parameters
@@ -102,6 +106,8 @@ def get_advertisment_datetimes(advertisment, driver):
         data of car
     driver : str or int
         selenium.WebElement of webpage with car details
+    reference_time : datetime
+        time the webpage is viewed, e.g. start of crawl, now if None
 
     Returns
     -------
@@ -113,7 +119,9 @@ def get_advertisment_datetimes(advertisment, driver):
         history of publication datetimes
     """
     new_publication_date_time = convert_datetime_to_str(
-        extract_publication_datetime(scrape_publication_datetime(driver))
+        extract_publication_datetime(
+            scrape_publication_datetime(driver), reference_time
+        )
     )
     old_publication_date_time = convert_datetime_to_str(
         advertisment["publication_datetime"].item()
@@ -0,0 +1,359 @@
+"""Utility functions for a persistent, lease-based frontier of car advertisments.
+
+The frontier holds the links to car advertisments discovered on the result webpages
+together with their status. Workers, in one or several processes or on several
+hosts sharing the store, claim batches of links by taking a lease, process them and
+commit the result. A result is only accepted while the lease is held, so every link
+is committed exactly once, and leases of crashed workers expire and are reclaimed.
+
+The frontier is stored in SQLite. All access goes through the functions of this
+module, so the store can be replaced by a network database later on.
+"""
+import json
+import sqlite3
+import time
+
+# seconds a worker may process a claimed link before it is handed to another worker
+DEFAULT_LEASE_SECONDS = 600
+
+# number of failed attempts after which a link is not handed out anymore
+MAXIMUM_NUMBER_OF_ATTEMPTS = 3
+
+
+def connect_to_frontier(path_to_frontier):
+    """Connect to frontier and create its table if it does not exist yet.
+
+    Parameters
+    ----------
+    path_to_frontier : str
+        path to SQLite file of frontier
+
+    Returns
+    -------
+    connection : sqlite3.Connection
+        connection to frontier
+    """
+    connection = sqlite3.connect(path_to_frontier, timeout=30, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS frontier (
+            url TEXT PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'pending',
+            lease_owner TEXT,
+            lease_expiry REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            discovered REAL NOT NULL,
+            completed REAL,
+            outcome TEXT,
+            result TEXT,
+            error TEXT,
+            collected INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS frontier_status ON frontier (status, lease_expiry)"
+    )
+
+    return connection
+
+
+def add_urls_to_frontier(connection, urls, requeue_completed=False):
+    """Add discovered links to the frontier.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        connection to frontier
+    urls : list
+        urls of car advertisments
+    requeue_completed : boolean
+        links which have been completed before are handed out again, e.g. to check
+        whether the car advertisment has been uploaded again
+
+    Returns
+    -------
+     : int
+        number of links which have been added or requeued
+    """
+    now = time.time()
+    with connection:
+        connection.execute("BEGIN IMMEDIATE")
+        number_of_urls = connection.total_changes
+        connection.executemany(
+            "INSERT OR IGNORE INTO frontier (url, discovered) VALUES (?, ?)",
+            [(url, now) for url in urls],
+        )
+        if requeue_completed:
+            connection.executemany(
+                """
+                UPDATE frontier
+                SET status = 'pending', attempts = 0, collected = 0, outcome = NULL,
+                    result = NULL, error = NULL
+                WHERE url = ? AND status = 'done' AND collected = 1
+                """,
+                [(url,) for url in urls],
+            )
+
+    return connection.total_changes - number_of_urls
+
+
+def claim_batch(
+    connection, worker_id, batch_size=20, lease_seconds=DEFAULT_LEASE_SECONDS
+):
+    """Claim a batch of pending links by taking a lease on them.
+
+    Expired leases are reclaimed first.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        connection to frontier
+    worker_id : str
+        unique id of worker, e.g. host name and process id
+    batch_size : int
+        maximum number of links which are claimed
+    lease_seconds : float
+        seconds until the lease expires
+
+    Returns
+    -------
+     : list
+        claimed urls
+    """
+    now = time.time()
+    with connection:
+        # the write lock is taken immediately, so no two workers claim the same links
+        connection.execute("BEGIN IMMEDIATE")
+        reclaim_expired_leases(connection, now)
+        urls = [
+            row[0]
+            for row in connection.execute(
+                """
+                SELECT url FROM frontier WHERE status = 'pending'
+                ORDER BY attempts, discovered DESC LIMIT ?
+                """,
+                (batch_size,),
+            )
+        ]
+        connection.executemany(
+            """
+            UPDATE frontier SET status = 'leased', lease_owner = ?, lease_expiry = ?
+            WHERE url = ?
+            """,
+            [(worker_id, now + lease_seconds, url) for url in urls],
+        )
+
+    return urls
+
+
+def reclaim_expired_leases(connection, now=None):
+    """Hand links whose lease has expired back to the pending links.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        connection to frontier
+    now : float
+        current time as unix timestamp, now if None
+
+    Returns
+    -------
+     : int
+        number of reclaimed links
+    """
+    cursor = connection.execute(
+        """
+        UPDATE frontier SET status = 'pending', lease_owner = NULL, lease_expiry = NULL
+        WHERE status = 'leased' AND lease_expiry < ?
+        """,
+        (now or time.time(),),
+    )
+
+    return cursor.rowcount
+
+
+def extend_lease(connection, worker_id, url, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """Extend the lease on a link which takes longer to process.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        connection to frontier
+    worker_id : str
+        unique id of worker
+    url : str
+        url of car advertisment
+    lease_seconds : float
+        seconds from now until the lease expires
+
+    Returns
+    -------
+     : boolean
+        lease is still held by the worker and has been extended
+    """
+    cursor = connection.execute(
+        """
+        UPDATE frontier SET lease_expiry = ?
+        WHERE url = ? AND status = 'leased' AND lease_owner = ?
+        """,
+        (time.time() + lease_seconds, url, worker_id),
+    )
+
+    return cursor.rowcount == 1
+
+
+def commit_result(connection, worker_id, url, outcome, car=None):
+    """Commit the result of a processed link.
+
+    The result is only accepted while the worker holds the lease, otherwise the link
+    has been handed to another worker and the result is discarded.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        connection to frontier
+    worker_id : str
+        unique id of worker
+    url : str
+        url of car advertisment
+    outcome : str
+        outcome of processing, e.g. "new", "updated" or "known"
+    car : dict
+        data of new or updated car
+
+    Returns
+    -------
+     : boolean
+        result has been committed
+    """
+    cursor = connection.execute(
+        """
+        UPDATE frontier
+        SET status = 'done', lease_owner = NULL, lease_expiry = NULL, completed = ?,
+            outcome = ?, result = ?, collected = 0
+        WHERE url = ? AND status = 'leased' AND lease_owner = ?
+        """,
+        (
+            time.time(),
+            outcome,
+            json.dumps(car, default=str) if car is not None else None,
+            url,
+            worker_id,
+        ),
+    )
+
+    return cursor.rowcount == 1
+
+
+def commit_failure(connection, worker_id, url, error):
+    """Commit a failed attempt to process a link.
+
+    The link is handed out again until it failed `MAXIMUM_NUMBER_OF_ATTEMPTS` times.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        connection to frontier
+    worker_id : str
+        unique id of worker
+    url : str
+        url of car advertisment
+    error : str
+        description of error, e.g. type of exception
+
+    Returns
+    -------
+     : boolean
+        failure has been committed
+    """
+    cursor = connection.execute(
+        """
+        UPDATE frontier
+        SET status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END,
+            attempts = attempts + 1, lease_owner = NULL, lease_expiry = NULL,
+            error = ?
+        WHERE url = ? AND status = 'leased' AND lease_owner = ?
+        """,
+        (MAXIMUM_NUMBER_OF_ATTEMPTS, error, url, worker_id),
+    )
+
+    return cursor.rowcount == 1
+
+
+def collect_results(connection):
+    """Collect committed results which have not been collected yet.
+
+    Each result is collected exactly once, e.g. by the process owning the data set.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        connection to frontier
+
+    Returns
+    -------
+    results : list
+        url, outcome and data of car of each collected result
+    """
+    with connection:
+        connection.execute("BEGIN IMMEDIATE")
+        results = [
+            (url, outcome, json.loads(result) if result is not None else None)
+            for url, outcome, result in connection.execute(
+                """
+                SELECT url, outcome, result FROM frontier
+                WHERE status = 'done' AND collected = 0
+                ORDER BY completed
+                """
+            )
+        ]
+        connection.executemany(
+            "UPDATE frontier SET collected = 1 WHERE url = ?",
+            [(url,) for url, _, _ in results],
+        )
+
+    return results
+
+
+def get_frontier_statistics(connection):
+    """Count links in frontier per status.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        connection to frontier
+
+    Returns
+    -------
+     : dict
+        number of links per status
+    """
+    return dict(
+        connection.execute("SELECT status, COUNT(*) FROM frontier GROUP BY status")
+    )
+
+
+def compact_frontier(connection):
+    """Remove collected results from the frontier and shrink its file.
+
+    Removed links are added as new links when they are discovered again.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        connection to frontier
+
+    Returns
+    -------
+     : int
+        number of removed links
+    """
+    cursor = connection.execute(
+        "DELETE FROM frontier WHERE status = 'done' AND collected = 1"
+    )
+    connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    connection.execute("VACUUM")
+
+    return cursor.rowcount
@@ -1,13 +1,18 @@
 """Utility functions for website interaction, such as clicking buttons."""
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
+from utils_tracing import trace_span
 from utils_website_scraping import (
-    scrape_change_result_webpage_button,
     scrape_cookie_accept_button,
     scrape_detail_arcordeon_expansion_buttons,
     scrape_information_banner_close_button,
+    scrape_links_to_detailed_car_advertisement,
     scrape_pop_up_close_button,
 )
 
+# query parameter of the url of a result webpage which holds the number of the page
+RESULT_WEBPAGE_PARAMETER = "page"
+
 
 def open_webpage(driver, urlpage):
     """Open webpage.
@@ -19,7 +24,8 @@ def open_webpage(driver, urlpage):
     urlpage : str
         url of webpage to be opened
     """
-    driver.get(urlpage)
+    with trace_span("page load", "page_load", url=urlpage):
+        driver.get(urlpage)
     driver.implicitly_wait(0.5)
 
 
@@ -31,10 +37,11 @@ def accept_cookies(driver):
     driver : selenium.Webdriver
         webdriver for website interactions
     """
-    try:
-        scrape_cookie_accept_button(driver).click()
-    except Exception:
-        pass
+    with trace_span("accept cookies", "pop_up"):
+        try:
+            scrape_cookie_accept_button(driver).click()
+        except Exception:
+            pass
 
 
 def close_information_banner_and_pop_ups(driver):
@@ -45,15 +52,17 @@ def close_information_banner_and_pop_ups(driver):
     driver : selenium.Webdriver
         webdriver for website interactions
     """
-    try:
-        scrape_information_banner_close_button(driver).click()
-    except Exception:
-        pass
+    with trace_span("close information banner", "pop_up"):
+        try:
+            scrape_information_banner_close_button(driver).click()
+        except Exception:
+            pass
 
-    try:
-        scrape_pop_up_close_button(driver).click()
-    except Exception:
-        pass
+    with trace_span("close pop up", "pop_up"):
+        try:
+            scrape_pop_up_close_button(driver).click()
+        except Exception:
+            pass
 
 
 def expand_detailed_car_information_arcordeon(driver):
@@ -65,21 +74,77 @@ def expand_detailed_car_information_arcordeon(driver):
         webdriver for website interactions
     """
     for button in scrape_detail_arcordeon_expansion_buttons(driver):
-        try:
-            button.click()
-        except Exception:
-            pass
+        with trace_span("accordion click", "click"):
+            try:
+                button.click()
+            except Exception:
+                pass
+
+
+def build_result_webpage_url(urlpage, result_webpage):
+    """Build url of a result webpage, so any result webpage can be opened directly.
+
+    Parameters
+    ----------
+    urlpage : str
+        url of first result webpage of search query
+    result_webpage : int
+        number of result webpage, starting at 1
+
+    Returns
+    -------
+     : str
+        url of result webpage
+    """
+    scheme, netloc, path, query, fragment = urlsplit(urlpage)
+    query_parameters = [
+        (key, value)
+        for key, value in parse_qsl(query, keep_blank_values=True)
+        if key != RESULT_WEBPAGE_PARAMETER
+    ]
+    query_parameters.append((RESULT_WEBPAGE_PARAMETER, str(result_webpage)))
 
+    return urlunsplit((scheme, netloc, path, urlencode(query_parameters), fragment))
 
-def go_to_next_webpage_with_results(driver):
-    """Go to next webpage containing more car advertisments.
+
+def open_result_webpage(driver, urlpage, result_webpage):
+    """Open a result webpage of a search query directly by its url.
 
     Parameters
     ----------
     driver : selenium.Webdriver
         webdriver for website interactions
+    urlpage : str
+        url of first result webpage of search query
+    result_webpage : int
+        number of result webpage, starting at 1
+    """
+    open_webpage(driver, build_result_webpage_url(urlpage, result_webpage))
+    accept_cookies(driver)
+    close_information_banner_and_pop_ups(driver)
+
+
+def fetch_links_of_result_webpage(driver, urlpage, result_webpage):
+    """Open a result webpage and scrape the links to its car advertisments.
+
+    Used to prefetch the next result webpage in the background, while the car
+    advertisments of the current one are processed with another driver.
+
+    Parameters
+    ----------
+    driver : selenium.Webdriver
+        webdriver for the result webpages
+    urlpage : str
+        url of first result webpage of search query
+    result_webpage : int
+        number of result webpage, starting at 1
+
+    Returns
+    -------
+     : list
+        links to car advertisments
     """
-    # as there is a backward and forward button choose last, which corresponds to
-    # forward button
-    scrape_change_result_webpage_button(driver)[-1].click()
-    driver.implicitly_wait(3)
+    with trace_span("fetch result webpage", "result_webpage", page=result_webpage):
+        open_result_webpage(driver, urlpage, result_webpage)
+
+        return scrape_links_to_detailed_car_advertisement(driver)
@@ -1,28 +1,346 @@
 """Utility functions for scraping elements on webpage."""
 
+import json
+import os
+from os.path import exists, splitext
+
+from selenium.common.exceptions import NoSuchElementException
 from selenium.webdriver.common.by import By
 
+from utils_tracing import trace_span
+
+# candidate selectors per field of the webpage. The class names contain hashes which
+# change when the website is redeployed, hence the exact class names are followed by
+# selectors which only match the stable part of the class name.
+# Optional fields are not always shown, e.g. pop ups, so their absence is no drift.
+SELECTOR_REGISTRY = {
+    "information_banner_close_button": {
+        "optional": True,
+        "candidates": [
+            (By.CSS_SELECTOR, "button[class='IconButton__Button-slrzzc-2 XmByt']"),
+        ],
+    },
+    "pop_up_close_button": {
+        "optional": True,
+        "candidates": [(By.CSS_SELECTOR, "button[class='sg-b-p-c']")],
+    },
+    "cookie_accept_button": {
+        "optional": True,
+        "candidates": [(By.ID, "accept-ufti")],
+    },
+    "detail_arcordeon_expansion_buttons": {
+        "optional": True,
+        "candidates": [
+            (
+                By.CSS_SELECTOR,
+                "div[class='TextCallout2__TextCallout2Wrapper-sc-1bir8f0-0 dVkfPB Transportstyrelsen__AccordionTitle-sc-6tq5gz-3 hSRAnA']",  # noqa
+            ),
+            (By.CSS_SELECTOR, "div[class*='Transportstyrelsen__AccordionTitle']"),
+        ],
+    },
+    "publication_datetime": {
+        "optional": False,
+        "candidates": [
+            (
+                By.CSS_SELECTOR,
+                "span[class='TextCallout2__TextCallout2Wrapper-sc-1bir8f0-0 dVkfPB PublishedTime__StyledTime-sc-pjprkp-1 gaxNzF']",  # noqa
+            ),
+            (By.CSS_SELECTOR, "span[class*='PublishedTime__StyledTime']"),
+        ],
+    },
+    "location": {
+        "optional": True,
+        "candidates": [
+            (
+                By.CSS_SELECTOR,
+                "a[class='Link-sc-6wulv7-0 LocationInfo__StyledMapLink-sc-1op511s-3 kVcpUt bEePwY']",  # noqa
+            ),
+            (By.CSS_SELECTOR, "a[class*='LocationInfo__StyledMapLink']"),
+        ],
+    },
+    "car_manufacturer_and_model": {
+        "optional": False,
+        "candidates": [
+            (
+                By.CSS_SELECTOR,
+                "h1[class='TextHeadline1__TextHeadline1Wrapper-sc-1bi3cli-0 bIxKdL Hero__StyledSubject-sc-1mjgwl-4 dGnKKn']",  # noqa
+            ),
+            (By.CSS_SELECTOR, "h1[class*='Hero__StyledSubject']"),
+        ],
+    },
+    "price_of_car": {
+        "optional": True,
+        "candidates": [
+            (
+                By.CSS_SELECTOR,
+                "div[class='TextHeadline1__TextHeadline1Wrapper-sc-1bi3cli-0 bIxKdL Price__StyledPrice-sc-crp2x0-0 kIhjJa']",  # noqa
+            ),
+            (By.CSS_SELECTOR, "div[class*='Price__StyledPrice']"),
+        ],
+    },
+    "provider": {
+        "optional": False,
+        "candidates": [
+            (
+                By.CSS_SELECTOR,
+                "div[class='TextSubHeading__TextSubHeadingWrapper-sc-1c6hp2-0 gQCEZy styled__AdvertiserName-sc-1f8y0be-7 wJamH']",  # noqa
+            ),
+            (By.CSS_SELECTOR, "div[class*='styled__AdvertiserName']"),
+        ],
+    },
+    "general_car_characteristic_keys": {
+        "optional": False,
+        "candidates": [
+            (
+                By.CSS_SELECTOR,
+                "div[class='TextCallout2__TextCallout2Wrapper-sc-1bir8f0-0 dVkfPB ParamsWithIcons__StyledLabel-sc-hanfos-2 eSsBiw']",  # noqa
+            ),
+            (By.CSS_SELECTOR, "div[class*='ParamsWithIcons__StyledLabel']"),
+        ],
+    },
+    "general_car_characteristic_parameters": {
+        "optional": False,
+        "candidates": [
+            (
+                By.CSS_SELECTOR,
+                "div[class='TextCallout1__TextCallout1Wrapper-swd73-0 juCWPZ ParamsWithIcons__StyledParamValue-sc-hanfos-3 kvNStP']",  # noqa
+            ),
+            (By.CSS_SELECTOR, "div[class*='ParamsWithIcons__StyledParamValue']"),
+        ],
+    },
+    "detailed_car_characteristic_keys_and_parameters": {
+        "optional": True,
+        "candidates": [
+            (
+                By.CSS_SELECTOR,
+                "div[class='TextCallout2__TextCallout2Wrapper-sc-1bir8f0-0 dVkfPB Transportstyrelsen__AccordionContentRow-sc-6tq5gz-4 bxCoHS']",  # noqa
+            ),
+            (By.CSS_SELECTOR, "div[class*='Transportstyrelsen__AccordionContentRow']"),
+        ],
+    },
+    "links_to_car_advertisment": {
+        "optional": False,
+        "candidates": [
+            (
+                By.CSS_SELECTOR,
+                "a[class='Link-sc-6wulv7-0 styled__StyledTitleLink-sc-1kpvi4z-11 kVcpUt kbgaQK']",  # noqa
+            ),
+            (
+                By.CSS_SELECTOR,
+                "a[class='Link-sc-6wulv7-0 styled__StyledTitleLink-sc-1kpvi4z-11 kVcpUt gNDIDM']",  # noqa
+            ),
+            (
+                By.CSS_SELECTOR,
+                "a[class='Link-sc-6wulv7-0 styled__StyledTitleLink-sc-1kpvi4z-11 kVcpUt iqASGc']",  # noqa
+            ),
+            (By.CSS_SELECTOR, "a[class*='styled__StyledTitleLink']"),
+        ],
+    },
+    "all_providers": {
+        "optional": False,
+        "candidates": [
+            (
+                By.CSS_SELECTOR,
+                "div[class='TextCallout2__TextCallout2Wrapper-sc-1bir8f0-0 dVkfPB StoreInfo__StoreName-sc-t7web5-0 eAWtEJ']",  # noqa
+            ),
+            (By.CSS_SELECTOR, "div[class*='StoreInfo__StoreName']"),
+        ],
+    },
+    "number_of_result_webpages": {
+        "optional": False,
+        "candidates": [
+            (By.CSS_SELECTOR, "a[class='Pagination__Button-sc-uamu6s-1 gHhaEf']"),
+            (
+                By.CSS_SELECTOR,
+                "a[class*='Pagination__Button']:not([class*='Pagination__PrevNextButton'])",  # noqa
+            ),
+        ],
+    },
+}
+
+# number of consecutive lookups in which all candidates of a field failed, after
+# which a warning about a changed website is printed
+SELECTOR_DRIFT_THRESHOLD = 5
+
+# index of candidate which succeeded last and number of consecutive failures of all
+# candidates per field, updated while scraping
+SELECTOR_STATISTICS = {}
+
+
+def get_path_to_selector_statistics(path_to_dataset):
+    """Derive the path of the selector statistics which are kept next to the data set.
 
-def scrape_information_banner_close_button(driver):
-    """Scrape close button of information banner.
+    Parameters
+    ----------
+    path_to_dataset : str
+        path to data set
+
+    Returns
+    -------
+     : str
+        path to selector statistics
+    """
+    return splitext(path_to_dataset)[0] + "_selectors.json"
+
+
+def import_selector_statistics(path_to_selector_statistics):
+    """Import which selectors succeeded last in previous crawls.
+
+    Parameters
+    ----------
+    path_to_selector_statistics : str
+        path to selector statistics
+    """
+    if exists(path_to_selector_statistics):
+        with open(path_to_selector_statistics, encoding="utf-8") as file:
+            SELECTOR_STATISTICS.update(json.load(file))
+
+
+def save_selector_statistics(path_to_selector_statistics):
+    """Save which selectors succeeded last.
+
+    Parameters
+    ----------
+    path_to_selector_statistics : str
+        path to selector statistics
+    """
+    with open(path_to_selector_statistics + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(SELECTOR_STATISTICS, file, indent=2)
+    os.replace(path_to_selector_statistics + ".tmp", path_to_selector_statistics)
+
+
+def get_ordered_selector_candidates(field):
+    """Get candidate selectors of field, the one which succeeded last first.
+
+    Parameters
+    ----------
+    field : str
+        field of webpage, see `SELECTOR_REGISTRY`
+
+    Returns
+    -------
+     : list
+        indices and selectors of candidates
+    """
+    candidates = list(enumerate(SELECTOR_REGISTRY[field]["candidates"]))
+    last_successful = SELECTOR_STATISTICS.get(field, {}).get("last_successful", 0)
+    if 0 < last_successful < len(candidates):
+        candidates.insert(0, candidates.pop(last_successful))
+
+    return candidates
+
+
+def record_selector_lookup(field, successful_candidate):
+    """Record which candidate selector of a field succeeded.
+
+    Prints a warning if all candidates of a non-optional field failed repeatedly,
+    which indicates that the website has changed.
+
+    Parameters
+    ----------
+    field : str
+        field of webpage, see `SELECTOR_REGISTRY`
+    successful_candidate : int
+        index of candidate which succeeded, None if all candidates failed
+    """
+    statistics = SELECTOR_STATISTICS.setdefault(
+        field, {"last_successful": 0, "consecutive_failures": 0}
+    )
+    if successful_candidate is not None:
+        statistics["last_successful"] = successful_candidate
+        statistics["consecutive_failures"] = 0
+        return
+
+    statistics["consecutive_failures"] = statistics["consecutive_failures"] + 1
+    if (
+        not SELECTOR_REGISTRY[field]["optional"]
+        and statistics["consecutive_failures"] == SELECTOR_DRIFT_THRESHOLD
+    ):
+        print(
+            f"WARNING: no selector of {field} matched in the last",
+            f"{SELECTOR_DRIFT_THRESHOLD} lookups. The website might have changed.",
+        )
+
+
+def find_elements_with_registry(driver, field, single_element=False):
+    """Find elements of a field by trying its candidate selectors.
+
+    Only the first candidate waits for the implicit timeout of the driver. If it
+    fails, the page has been given time to load already, so the remaining candidates
+    are tried without waiting.
 
     Parameters
     ----------
     driver : selenium.Webdriver
         webdriver for website interactions
+    field : str
+        field of webpage, see `SELECTOR_REGISTRY`
+    single_element : boolean
+        only the first matching element is returned
 
     Returns
     -------
-    : selenium.WebElement
-        webelement with extracted information
+     : list or selenium.WebElement
+        matching webelements, or the first matching webelement if single_element
+
+    Raises
+    ------
+    NoSuchElementException
+        if single_element and no candidate matches
     """
-    return driver.find_element(
-        By.CSS_SELECTOR, "button[class='IconButton__Button-slrzzc-2 XmByt']"
-    )
+    implicit_wait = None
+    try:
+        for position, (candidate, (by, value)) in enumerate(
+            get_ordered_selector_candidates(field)
+        ):
+            if position == 1:
+                implicit_wait = driver.timeouts.implicit_wait
+                driver.implicitly_wait(0)
+
+            with trace_span(
+                f"find {field}", "find_element", selector=value
+            ) as span_arguments:
+                elements = driver.find_elements(by, value)
+                span_arguments["found"] = len(elements)
+            if elements:
+                record_selector_lookup(field, candidate)
+                return elements[0] if single_element else elements
+    finally:
+        if implicit_wait is not None:
+            driver.implicitly_wait(implicit_wait)
+
+    record_selector_lookup(field, None)
+    if single_element:
+        raise NoSuchElementException(f"No selector of {field} matched.")
+
+    return []
+
+
+def find_element_with_registry(driver, field):
+    """Find first element of a field by trying its candidate selectors.
 
+    Parameters
+    ----------
+    driver : selenium.Webdriver
+        webdriver for website interactions
+    field : str
+        field of webpage, see `SELECTOR_REGISTRY`
+
+    Returns
+    -------
+     : selenium.WebElement
+        first matching webelement
+
+    Raises
+    ------
+    NoSuchElementException
+        if no candidate matches
+    """
+    return find_elements_with_registry(driver, field, single_element=True)
 
-def scrape_pop_up_close_button(driver):
-    """Scrape close button of pop up windows.
+
+def scrape_information_banner_close_button(driver):
+    """Scrape close button of information banner.
 
     Parameters
     ----------
@@ -34,11 +352,11 @@ def scrape_pop_up_close_button(driver):
     : selenium.WebElement
         webelement with extracted information
     """
-    return driver.find_element(By.CSS_SELECTOR, "button[class='sg-b-p-c']")
+    return find_element_with_registry(driver, "information_banner_close_button")
 
 
-def scrape_cookie_accept_button(driver):
-    """Scrape accept button of cookie window.
+def scrape_pop_up_close_button(driver):
+    """Scrape close button of pop up windows.
 
     Parameters
     ----------
@@ -50,11 +368,11 @@ def scrape_cookie_accept_button(driver):
     : selenium.WebElement
         webelement with extracted information
     """
-    return driver.find_element(by=By.ID, value="accept-ufti")
+    return find_element_with_registry(driver, "pop_up_close_button")
 
 
-def scrape_detail_arcordeon_expansion_buttons(driver):
-    """Scrape expansion buttons of accoredon with detailed car information.
+def scrape_cookie_accept_button(driver):
+    """Scrape accept button of cookie window.
 
     Parameters
     ----------
@@ -66,14 +384,11 @@ def scrape_detail_arcordeon_expansion_buttons(driver):
     : selenium.WebElement
         webelement with extracted information
     """
-    return driver.find_elements(
-        By.CSS_SELECTOR,
-        "div[class='TextCallout2__TextCallout2Wrapper-sc-1bir8f0-0 dVkfPB Transportstyrelsen__AccordionTitle-sc-6tq5gz-3 hSRAnA']",  # noqa
-    )
+    return find_element_with_registry(driver, "cookie_accept_button")
 
 
-def scrape_change_result_webpage_button(driver):
-    """Scrape buttons for changing between result webpages.
+def scrape_detail_arcordeon_expansion_buttons(driver):
+    """Scrape expansion buttons of accoredon with detailed car information.
 
     Parameters
     ----------
@@ -82,13 +397,10 @@ def scrape_change_result_webpage_button(driver):
 
     Returns
     -------
-    : list
-        selenium.WebElements with extracted information
+    : selenium.WebElement
+        webelement with extracted information
     """
-    return driver.find_elements(
-        By.CSS_SELECTOR,
-        "a[class='Pagination__Button-sc-uamu6s-1 Pagination__PrevNextButton-sc-uamu6s-7 gHhaEf bXvjTf']",  # noqa
-    )
+    return find_elements_with_registry(driver, "detail_arcordeon_expansion_buttons")
 
 
 def scrape_links_to_detailed_car_advertisement(driver):
@@ -185,10 +497,7 @@ def scrape_publication_datetime(driver):
     : str
         extracted information
     """
-    return driver.find_element(
-        By.CSS_SELECTOR,
-        "span[class='TextCallout2__TextCallout2Wrapper-sc-1bir8f0-0 dVkfPB PublishedTime__StyledTime-sc-pjprkp-1 gaxNzF']",  # noqa
-    ).text
+    return find_element_with_registry(driver, "publication_datetime").text
 
 
 def scrape_location(driver):
@@ -205,10 +514,7 @@ def scrape_location(driver):
         extracted information
     """
     try:
-        return driver.find_element(
-            By.CSS_SELECTOR,
-            "a[class='Link-sc-6wulv7-0 LocationInfo__StyledMapLink-sc-1op511s-3 kVcpUt bEePwY']",  # noqa
-        ).text
+        return find_element_with_registry(driver, "location").text
     except Exception:
         # sometimes no location is given as car is provided by online provider
         return "online"
@@ -227,10 +533,7 @@ def scrape_car_manufacturer_and_model(driver):
     : selenium.WebElement
         webelement with extracted information
     """
-    return driver.find_element(
-        By.CSS_SELECTOR,
-        "h1[class='TextHeadline1__TextHeadline1Wrapper-sc-1bi3cli-0 bIxKdL Hero__StyledSubject-sc-1mjgwl-4 dGnKKn']",  # noqa
-    ).text
+    return find_element_with_registry(driver, "car_manufacturer_and_model").text
 
 
 def scrape_price_of_car(driver):
@@ -247,10 +550,7 @@ def scrape_price_of_car(driver):
         extracted information
     """
     try:
-        price = driver.find_element(
-            By.CSS_SELECTOR,
-            "div[class='TextHeadline1__TextHeadline1Wrapper-sc-1bi3cli-0 bIxKdL Price__StyledPrice-sc-crp2x0-0 kIhjJa']",  # noqa
-        ).text
+        price = find_element_with_registry(driver, "price_of_car").text
     except Exception:
         # sometimes no price is given with car
         price = ""
@@ -271,10 +571,7 @@ def scrape_provider(driver):
     : str
         extracted information
     """
-    return driver.find_element(
-        By.CSS_SELECTOR,
-        "div[class='TextSubHeading__TextSubHeadingWrapper-sc-1c6hp2-0 gQCEZy styled__AdvertiserName-sc-1f8y0be-7 wJamH']",  # noqa
-    ).text
+    return find_element_with_registry(driver, "provider").text
 
 
 def scrape_general_car_characteristic_keys(driver):
@@ -293,10 +590,7 @@ def scrape_general_car_characteristic_keys(driver):
     : list
         selenium.WebElements with extracted information
     """
-    elements = driver.find_elements(
-        By.CSS_SELECTOR,
-        "div[class='TextCallout2__TextCallout2Wrapper-sc-1bir8f0-0 dVkfPB ParamsWithIcons__StyledLabel-sc-hanfos-2 eSsBiw']",  # noqa
-    )
+    elements = find_elements_with_registry(driver, "general_car_characteristic_keys")
 
     return [element.text for element in elements]
 
@@ -314,9 +608,8 @@ def scrape_general_car_characteristic_parameters(driver):
     : list
         selenium.WebElements with extracted information
     """
-    elements = driver.find_elements(
-        By.CSS_SELECTOR,
-        "div[class='TextCallout1__TextCallout1Wrapper-swd73-0 juCWPZ ParamsWithIcons__StyledParamValue-sc-hanfos-3 kvNStP']",  # noqa
+    elements = find_elements_with_registry(
+        driver, "general_car_characteristic_parameters"
     )
 
     return [element.text for element in elements]
@@ -337,9 +630,8 @@ def scrape_detailed_car_characteristic_keys_and_parameters(driver):
     : list
         extracted information
     """
-    elements = driver.find_elements(
-        By.CSS_SELECTOR,
-        "div[class='TextCallout2__TextCallout2Wrapper-sc-1bir8f0-0 dVkfPB Transportstyrelsen__AccordionContentRow-sc-6tq5gz-4 bxCoHS']",  # noqa
+    elements = find_elements_with_registry(
+        driver, "detailed_car_characteristic_keys_and_parameters"
     )
 
     return [element.text for element in elements]
@@ -348,7 +640,8 @@ def scrape_detailed_car_characteristic_keys_and_parameters(driver):
 def scrape_links_to_car_advertisment(driver):
     """Scrape links to webpages with car advertisments.
 
-    # the clas-tags may be different from time to time. Hence, check different tags.
+    # the clas-tags may be different from time to time. Hence, different tags are
+    # registered as candidates in `SELECTOR_REGISTRY`.
 
     Parameters
     ----------
@@ -360,23 +653,10 @@ def scrape_links_to_car_advertisment(driver):
     : list
         selenium.WebElements with extracted information
     """
-    all_links_to_details = driver.find_elements(
-        By.CSS_SELECTOR,
-        "a[class='Link-sc-6wulv7-0 styled__StyledTitleLink-sc-1kpvi4z-11 kVcpUt kbgaQK']",  # noqa
+    all_links_to_details = find_elements_with_registry(
+        driver, "links_to_car_advertisment"
     )
 
-    if not all_links_to_details:
-        all_links_to_details = driver.find_elements(
-            By.CSS_SELECTOR,
-            "a[class='Link-sc-6wulv7-0 styled__StyledTitleLink-sc-1kpvi4z-11 kVcpUt gNDIDM']",  # noqa
-        )
-
-    if not all_links_to_details:
-        all_links_to_details = driver.find_elements(
-            By.CSS_SELECTOR,
-            "a[class='Link-sc-6wulv7-0 styled__StyledTitleLink-sc-1kpvi4z-11 kVcpUt iqASGc']",  # noqa
-        )
-
     return [link.get_attribute("href") for link in all_links_to_details]
 
 
@@ -393,10 +673,7 @@ def scrape_all_providers(driver):
     : list
         selenium.WebElements with extracted information
     """
-    return driver.find_elements(
-        By.CSS_SELECTOR,
-        "div[class='TextCallout2__TextCallout2Wrapper-sc-1bir8f0-0 dVkfPB StoreInfo__StoreName-sc-t7web5-0 eAWtEJ']",  # noqa
-    )
+    return find_elements_with_registry(driver, "all_providers")
 
 
 def scrape_number_of_result_webpages(driver):
@@ -412,8 +689,9 @@ def scrape_number_of_result_webpages(driver):
     : int
         number of result webpages
     """
-    total_number = driver.find_elements(
-        By.CSS_SELECTOR, "a[class='Pagination__Button-sc-uamu6s-1 gHhaEf']"
-    )[-1].text
+    pagination_buttons = find_elements_with_registry(
+        driver, "number_of_result_webpages"
+    )
+    total_number = pagination_buttons[-1].text
 
     return int(total_number)